@@ -1,37 +1,190 @@
 # agents/classifier.py
 from __future__ import annotations
-from typing import Literal
+import asyncio
+import concurrent.futures
+import os
+from dataclasses import dataclass
+from typing import Dict, List, Literal, Optional, Sequence
 from pydantic import BaseModel
 
+from agents.matcher import scan, scan_many
+from core import metrics
 from core.llm import LLMClient           # <— absolute
+from core.llm_async import AsyncLLMClient  # <— absolute
 from core.logging import log_info        # <— absolute
-from core.utils import rule_based_classify  # <— absolute
+from core.text_model import load_model
+from core.tracing import traced
 
 Label = Literal["positive_feedback", "negative_feedback", "query"]
+LABELS = ("positive_feedback", "negative_feedback", "query")
 
 SYSTEM = (
     "You are a banking inbox classifier. Given a user message, classify it as "
     "one of: positive_feedback, negative_feedback, or query. Answer with only the label."
 )
 
+def user_prompt(text: str) -> str:
+    return f"Message: {text}\nRespond with one label only."
+
+# Cascade (opt-in): with use_llm, keep local labels at or above these confidences and send the rest to the LLM
+CASCADE = os.getenv("SUPPORT_CLASSIFIER_CASCADE", "0") not in ("0", "false", "no")
+RULE_THRESHOLD = float(os.getenv("SUPPORT_CASCADE_RULE_THRESHOLD", "0.8"))
+MODEL_THRESHOLD = float(os.getenv("SUPPORT_CASCADE_MODEL_THRESHOLD", "0.9"))
+
+def label_from_reply(text: str, out: object) -> Label:
+    """Map an LLM reply to a label; anything unusable falls back to the rules."""
+    cand = out.strip().lower() if isinstance(out, str) else ""
+    if cand in LABELS:
+        return cand  # type: ignore[return-value]
+    return scan(text).label  # type: ignore[return-value]
+
+@dataclass
+class Decision:
+    """One classification and where it came from."""
+    label: str
+    source: str                        # "rules" | "model" | "llm"
+    confidence: Optional[float] = None  # local tiers only
+    escalated: bool = False
+    reason: str = ""                   # why it was escalated: "low_confidence" | "conflict"
+    local_label: Optional[str] = None
+
 class ClassifierAgent(BaseModel):
     use_llm: bool = True
+    # Local tier: the hashed n-gram model (core.text_model) instead of the keyword rules when its
+    # artifact exists; model_path defaults to SUPPORT_TEXT_MODEL_PATH
+    use_model: bool = False
+    model_path: Optional[str] = None
+    # With use_llm: accept confident local labels and escalate only the rest (False = LLM for everything)
+    cascade: bool = CASCADE
+    rule_threshold: float = RULE_THRESHOLD
+    model_threshold: float = MODEL_THRESHOLD
 
-    def classify(self, text: str) -> Label:
-        label: Label = "query"
+    def _local_many(self, texts: List[str]) -> List[Label]:
+        model = load_model(self.model_path) if self.use_model else None
+        if model is not None:
+            return model.predict(texts)  # type: ignore[return-value]
+        return [m.label for m in scan_many(texts)]  # type: ignore[misc]
+
+    def local_decisions(self, texts: Sequence[str]) -> List[Decision]:
+        """
+        Cascade policy for the local tiers, without calling the LLM. Rules: accept at
+        rule_threshold; keyword hits for more than one label are a conflict. Model (use_model
+        with an artifact): accept at model_threshold unless the rules matched keywords and
+        disagree, which is a conflict.
+        """
+        texts = list(texts)
+        matches = scan_many(texts)
+        model = load_model(self.model_path) if self.use_model else None
+        if model is None:
+            out = []
+            for m in matches:
+                conflict = sum(1 for v in m.label_scores.values() if v) > 1
+                ok = not conflict and m.label_confidence >= self.rule_threshold
+                out.append(Decision(m.label, "rules", m.label_confidence, not ok,
+                                    "" if ok else ("conflict" if conflict else "low_confidence"), m.label))
+            return out
+
+        out = []
+        for m, row in zip(matches, model.predict_proba(texts)):
+            j = int(row.argmax())
+            label, conf = model.labels[j], float(row[j])
+            conflict = label != m.label and any(m.label_scores.values())
+            ok = not conflict and conf >= self.model_threshold
+            out.append(Decision(label, "model", conf, not ok,
+                                "" if ok else ("conflict" if conflict else "low_confidence"), label))
+        return out
+
+    @staticmethod
+    def _count(decisions: List[Decision]) -> None:
+        escalated = sum(d.escalated for d in decisions)
+        if escalated:
+            metrics.incr("classifier.escalated", escalated)
+        if len(decisions) > escalated:
+            metrics.incr("classifier.local_accepted", len(decisions) - escalated)
+
+    def decide(self, text: str) -> Decision:
+        """classify() with provenance: the label, which tier produced it, and whether it was escalated."""
         if self.use_llm:
             llm = LLMClient()
             if llm.enabled:
-                out = llm.chat(SYSTEM, f"Message: {text}\nRespond with one label only.")
-                cand = (out or "").strip().lower()
-                if cand in {"positive_feedback", "negative_feedback", "query"}:
-                    label = cand  # type: ignore[assignment]
-                else:
-                    label = rule_based_classify(text)
-            else:
-                label = rule_based_classify(text)
-        else:
-            label = rule_based_classify(text)
+                local = self.local_decisions([text])[0] if self.cascade else None
+                if local is not None:
+                    self._count([local])
+                    if not local.escalated:
+                        return local
+                out = llm.chat(SYSTEM, user_prompt(text), temperature=0)
+                if local is None:
+                    return Decision(label_from_reply(text, out), "llm")
+                local.label, local.source, local.confidence = label_from_reply(text, out), "llm", None
+                return local
+        local = self.local_decisions([text])[0]
+        local.escalated, local.reason = False, ""  # nothing to escalate to
+        return local
 
-        log_info("Classifier", "classified", f"label={label}")
+    @traced("agent.classifier.classify")
+    def classify(self, text: str) -> Label:
+        d = self.decide(text)
+        label: Label = d.label  # type: ignore[assignment]
+
+        log_info("Classifier", "classified", f"label={label} source={d.source}"
+                 + (f" reason={d.reason}" if d.escalated else ""))
         return label
+
+    @traced("agent.classifier.classify_many")
+    def classify_many(self, texts: Sequence[str], max_concurrency: int = 8) -> List[Label]:
+        """
+        Classify a batch. With use_llm, requests go out concurrently through AsyncLLMClient
+        (bounded by max_concurrency) for the messages the cascade escalates (all of them with
+        cascade off); any message whose LLM call fails falls back to the rules.
+        Otherwise the local tier labels the whole batch in one vectorized call.
+        """
+        texts = list(texts)
+        labels: List[Label]
+        escalated = len(texts)
+        llm = AsyncLLMClient(max_concurrency=max_concurrency) if self.use_llm else None
+        if llm is not None and llm.enabled:
+            labels = [None] * len(texts)  # type: ignore[list-item]
+            todo = list(range(len(texts)))
+            if self.cascade:
+                decisions = self.local_decisions(texts)
+                self._count(decisions)
+                todo = [i for i, d in enumerate(decisions) if d.escalated]
+                for i, d in enumerate(decisions):
+                    labels[i] = d.label  # type: ignore[call-overload]
+            escalated = len(todo)
+            outs = _run_sync(self._aclassify_many(llm, [texts[i] for i in todo])) if todo else []
+            for i, out in zip(todo, outs):
+                labels[i] = label_from_reply(texts[i], out)
+        else:
+            labels = self._local_many(texts)
+            escalated = 0
+
+        log_info("Classifier", "classified_batch", f"n={len(labels)} escalated={escalated}")
+        return labels
+
+    def predict_proba(self, texts: Sequence[str]) -> List[Dict[str, float]]:
+        """Calibrated per-label probabilities from the local model (RuntimeError if no artifact)."""
+        model = load_model(self.model_path)
+        if model is None:
+            raise RuntimeError("no text model artifact; train one with `python -m eval.train_text_model`")
+        return [dict(zip(model.labels, map(float, row))) for row in model.predict_proba(list(texts))]
+
+    @staticmethod
+    async def _aclassify_many(llm: AsyncLLMClient, texts: List[str]):
+        try:
+            return await asyncio.gather(
+                *(llm.achat(SYSTEM, user_prompt(t), temperature=0) for t in texts),
+                return_exceptions=True,
+            )
+        finally:
+            await llm.aclose()
+
+
+def _run_sync(coro):
+    """asyncio.run, or run it on a helper thread when called from inside an event loop."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as pool:
+        return pool.submit(asyncio.run, coro).result()
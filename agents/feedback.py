@@ -3,46 +3,47 @@ from typing import Optional, Tuple
 from pydantic import BaseModel
 
 from core.llm import LLMClient                               # absolute (kept for future use)
-from core.db import (
-    get_conn,
-    insert_ticket,
-    log_event,
-    append_ticket_note,
-    add_ticket_action_flag,
-    update_ticket_status,
-)                                                            # absolute
+from core.db import get_conn                                  # absolute
 from core.logging import log_info                            # absolute
-from core.utils import generate_ticket_number                # absolute
-from agents.intent import classify_intent                    # new
+from core.storage import SQLiteStorage, Storage, get_storage
+from core.tracing import traced
+from agents.matcher import scan
 
 POS_SYSTEM = "You are a helpful banking assistant. Craft a warm, concise thank-you reply."
 NEG_SYSTEM = "You are an empathetic banking assistant. Acknowledge frustration and reassure with next steps."
 
 class FeedbackHandler:
-    def __init__(self, conn=None):
-        # Ensure we always have a valid connection
-        self.conn = conn or get_conn()
+    def __init__(self, conn=None, storage: Optional[Storage] = None):
+        # No conn = the configured engine (SUPPORT_STORAGE); SQLite then uses the calling
+        # thread's pooled connection, so one instance can serve many threads
+        self._conn = conn
+        self.storage = storage or (SQLiteStorage(conn) if conn is not None else get_storage())
+
+    @property
+    def conn(self):
+        return self._conn if self._conn is not None else get_conn()
 
     # ------------------------
     # Existing behavior
     # ------------------------
+    @traced("agent.feedback.handle_positive")
     def handle_positive(self, customer_name: str | None = None) -> str:
         name = (customer_name or "Customer").strip() or "Customer"
-        log_event(self.conn, level="INFO", agent="FeedbackHandler", event="positive_ack",
+        self.storage.log_event(level="INFO", agent="FeedbackHandler", event="positive_ack",
                   details={"customer_name": name})
         return f"Thank you for your kind words, {name}! We’re delighted to assist you."
 
+    @traced("agent.feedback.handle_negative")
     def handle_negative(self, customer_name: str | None, description: str) -> str:
         name = (customer_name or "Unknown").strip() or "Unknown"
-        ticket_no = generate_ticket_number()
-        insert_ticket(
-            self.conn,
+        ticket_no = self.storage.next_ticket_id()
+        self.storage.insert_ticket(
             ticket_id=ticket_no,
             customer_name=name,
             description=description or "",
             status="Open",
         )
-        log_event(self.conn, level="INFO", agent="FeedbackHandler", event="negative_ticket_created",
+        self.storage.log_event(level="INFO", agent="FeedbackHandler", event="negative_ticket_created",
                   details={"customer_name": name, "ticket_id": ticket_no})
         return (
             f"We apologize for the inconvenience. A new ticket #{ticket_no} has been generated, "
@@ -87,57 +88,58 @@ class FeedbackHandler:
                 f"and escalated it. Someone will reach out shortly to help you with this problem. "
                 f"Please provide the best phone number for a quick call-back.")
 
+    @traced("agent.feedback.handle_followup")
     def handle_followup(self, *, ticket_id: str, customer_name: Optional[str], user_text: str) -> Tuple[str, Optional[str]]:
         """
         Stores a note, applies intent-specific flags, sets status to 'In-Progress' when an action is taken,
-        and returns an empathetic, intent-aware message.
+        and returns an empathetic, intent-aware message. The writes commit together or not at all.
         """
         name = (customer_name or "Customer").strip() or "Customer"
 
         try:
-            detected = classify_intent(user_text or "")
-            # Always store the follow-up text as a note
-            append_ticket_note(self.conn, ticket_id=ticket_id, note=user_text or "", author=name)
-
-            took_action = False
-            if detected.name == "freeze_lost_stolen_card":
-                add_ticket_action_flag(self.conn, ticket_id=ticket_id, action="freeze_card_now")
-                add_ticket_action_flag(self.conn, ticket_id=ticket_id, action="queue_replacement_card")
-                took_action = True
-            elif detected.name == "replace_card":
-                add_ticket_action_flag(self.conn, ticket_id=ticket_id, action="queue_replacement_card")
-                took_action = True
-            elif detected.name == "fraud_charge_dispute":
-                add_ticket_action_flag(self.conn, ticket_id=ticket_id, action="investigate_fraud")
-                took_action = True
-            elif detected.name == "travel_notice":
-                add_ticket_action_flag(self.conn, ticket_id=ticket_id, action="add_travel_notice")
-                took_action = True
-            elif detected.name == "address_update":
-                add_ticket_action_flag(self.conn, ticket_id=ticket_id, action="verify_address")
-                took_action = True
-            elif detected.name == "app_access_issue":
-                add_ticket_action_flag(self.conn, ticket_id=ticket_id, action="reset_app_access")
-                took_action = True
-
-            if took_action:
-                update_ticket_status(self.conn, ticket_id=ticket_id, status="In-Progress")
-
-            msg = self._compose_followup_response(name, ticket_id, detected.name)
-
-            log_event(
-                self.conn,
-                level="INFO",
-                agent="FeedbackHandler",
-                event="followup_handled",
-                details={"ticket_id": ticket_id, "customer_name": name, "intent": detected.name, "took_action": took_action},
-            )
+            detected = scan(user_text or "").intent  # the classifier already scanned this text
+            # One atomic commit for the note, flags, status and log row (a savepoint when nested)
+            with self.storage.transaction():
+                # Always store the follow-up text as a note
+                self.storage.append_ticket_note(ticket_id=ticket_id, note=user_text or "", author=name)
+
+                took_action = False
+                if detected.name == "freeze_lost_stolen_card":
+                    self.storage.add_ticket_action_flag(ticket_id=ticket_id, action="freeze_card_now")
+                    self.storage.add_ticket_action_flag(ticket_id=ticket_id, action="queue_replacement_card")
+                    took_action = True
+                elif detected.name == "replace_card":
+                    self.storage.add_ticket_action_flag(ticket_id=ticket_id, action="queue_replacement_card")
+                    took_action = True
+                elif detected.name == "fraud_charge_dispute":
+                    self.storage.add_ticket_action_flag(ticket_id=ticket_id, action="investigate_fraud")
+                    took_action = True
+                elif detected.name == "travel_notice":
+                    self.storage.add_ticket_action_flag(ticket_id=ticket_id, action="add_travel_notice")
+                    took_action = True
+                elif detected.name == "address_update":
+                    self.storage.add_ticket_action_flag(ticket_id=ticket_id, action="verify_address")
+                    took_action = True
+                elif detected.name == "app_access_issue":
+                    self.storage.add_ticket_action_flag(ticket_id=ticket_id, action="reset_app_access")
+                    took_action = True
+
+                if took_action:
+                    self.storage.update_ticket_status(ticket_id=ticket_id, status="In-Progress")
+
+                msg = self._compose_followup_response(name, ticket_id, detected.name)
+
+                self.storage.log_event(
+                    level="INFO",
+                    agent="FeedbackHandler",
+                    event="followup_handled",
+                    details={"ticket_id": ticket_id, "customer_name": name, "intent": detected.name, "took_action": took_action},
+                )
 
             return msg, None
 
         except Exception as e:
-            log_event(
-                self.conn,
+            self.storage.log_event(
                 level="WARN",
                 agent="FeedbackHandler",
                 event="followup_error",
@@ -145,7 +147,7 @@ class FeedbackHandler:
             )
             # Safe fallback
             return (
-                "Thanks for the update. We’ve attached your message to the ticket and alerted our team. "
+                "Thanks for the update. We’ve received your message and alerted our team. "
                 "Someone will reach out shortly to help you with this problem. "
                 "Please provide the best phone number for a quick call-back."
             ), str(e)
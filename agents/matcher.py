@@ -0,0 +1,217 @@
+# agents/matcher.py
+"""
+Single-pass matcher for the keyword heuristics.
+
+`rule_based_classify`, `infer_issue_type` and `classify_intent` each lower-case
+the message and scan it separately. `MessageMatcher.scan` lower-cases once and
+finds every keyword from all three tables in one regex pass, then applies the
+same precedence rules to produce all three answers (plus hit counts).
+
+The literal scan is a prefix-factored (trie) alternation inside a lookahead, so
+each position reports the longest keyword starting there; shorter keywords that
+are prefixes of it are credited too, which makes the result identical to
+running `kw in text` for every keyword. Intent regexes only run when one of
+their anchor words was seen.
+
+The classifier, the follow-up handler and the status replies all read their
+answers from `scan()`, which remembers the last few messages, so one submit
+scans its text once. The core.utils / agents.intent functions stay as the
+reference implementation that bench.matcher checks this against.
+"""
+from __future__ import annotations
+import functools
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Set
+
+from agents.intent import INTENT_PATTERNS, DetectedIntent
+from core.utils import (
+    LOST_CARD_WORDS,
+    LOGIN_WORDS,
+    NEG_WORDS,
+    NOT_ARRIVED_WORDS,
+    PIN_ACTION_WORDS,
+    POS_WORDS,
+)
+
+SCAN_CACHE = int(os.getenv("SUPPORT_MATCHER_CACHE", "256"))
+
+# Literal decomposition of core.utils.QUERY_RE (r"\bticket\b|status|check|track|update")
+QUERY_WORDS = ["status", "check", "track", "update"]
+QUERY_BOUNDED_WORDS = ["ticket"]
+
+# Every alternative of each intent regex starts with one of these words, so an intent can
+# only match if one of them occurs. Intents missing from this table always run their regex.
+INTENT_ANCHORS: Dict[str, List[str]] = {
+    "freeze_lost_stolen_card": ["stolen", "lost", "shut", "freeze", "block"],
+    "replace_card": ["replace", "new"],
+    "fraud_charge_dispute": ["unauthorized", "fraud", "dispute"],
+    "travel_notice": ["travel", "out of", "trip"],
+    "address_update": ["address", "move"],
+    "app_access_issue": ["phone", "device", "app", "login", "signin", "sign in", "locked"],
+}
+
+
+@dataclass
+class MatchResult:
+    """All heuristic answers for one message, with the keyword hit counts behind them."""
+    label: str
+    issue_type: str
+    intent: DetectedIntent
+    intents: List[DetectedIntent] = field(default_factory=list)   # every matching intent, precedence order
+    label_scores: Dict[str, int] = field(default_factory=dict)    # query / positive_feedback / negative_feedback
+    issue_scores: Dict[str, int] = field(default_factory=dict)
+    label_confidence: float = 0.0                                 # see label_confidence()
+
+
+def label_confidence(label: str, scores: Dict[str, int]) -> float:
+    """
+    How much to trust the rule label, from its keyword hits:
+      - no hits (the default "query" guess)              → 0.35
+      - hits for the chosen label only                   → 0.85, +0.05 per extra hit, up to 0.97
+      - hits for other labels too (precedence decided)   → 0.3–0.7 by the chosen label's share of hits
+    Cascade thresholds are compared against this.
+    """
+    total = sum(scores.values())
+    if total == 0:
+        return 0.35
+    own = scores.get(label, 0)
+    if own == total:
+        return min(0.97, 0.85 + 0.05 * (own - 1))
+    return 0.3 + 0.4 * own / total
+
+
+def _trie_regex(words: Iterable[str]) -> str:
+    """Prefix-factored alternation; optional tails are greedy, so the longest word wins."""
+    trie: Dict[str, dict] = {}
+    for w in words:
+        node = trie
+        for ch in w:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node: Dict[str, dict]) -> str:
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        return f"(?:{body})?" if "" in node else body
+
+    return build(trie)
+
+
+def _is_word(ch: str) -> bool:
+    # Same definition re uses for \w on str patterns
+    return ch.isalnum() or ch == "_"
+
+
+class MessageMatcher:
+    def __init__(self) -> None:
+        groups: Dict[str, List[str]] = {
+            "query": QUERY_WORDS + QUERY_BOUNDED_WORDS,
+            "positive_feedback": POS_WORDS,
+            "negative_feedback": NEG_WORDS,
+            "lost_debit_card": LOST_CARD_WORDS,
+            "debit_card_not_arrived": NOT_ARRIVED_WORDS,
+            "pin": ["pin"],
+            "pin_action": PIN_ACTION_WORDS,
+            "login_issue": LOGIN_WORDS,
+        }
+        for name, anchors in INTENT_ANCHORS.items():
+            groups[f"intent:{name}"] = anchors
+
+        self._groups_of: Dict[str, List[str]] = {}
+        for group, words in groups.items():
+            for w in words:
+                self._groups_of.setdefault(w, []).append(group)
+        literals = sorted(self._groups_of)
+        # literal -> every literal that is a prefix of it (itself included)
+        self._prefixes: Dict[str, List[str]] = {
+            lit: [p for p in literals if lit.startswith(p)] for lit in literals
+        }
+        self._bounded: Set[str] = set(QUERY_BOUNDED_WORDS)
+        self._scan = re.compile("(?=(" + _trie_regex(literals) + "))")
+        self._intents = [(name, re.compile(pattern), conf) for name, pattern, conf in INTENT_PATTERNS]
+
+    def _hits(self, t: str) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for m in self._scan.finditer(t):
+            start = m.start()
+            for lit in self._prefixes[m.group(1)]:
+                if lit in self._bounded:
+                    end = start + len(lit)
+                    if (start > 0 and _is_word(t[start - 1])) or (end < len(t) and _is_word(t[end])):
+                        continue
+                for group in self._groups_of[lit]:
+                    counts[group] = counts.get(group, 0) + 1
+        return counts
+
+    def scan(self, text: Optional[str]) -> MatchResult:
+        t = (text or "").lower()
+        hits = self._hits(t)
+
+        # core.utils.rule_based_classify precedence: query > positive > negative > default query
+        if hits.get("query"):
+            label = "query"
+        elif hits.get("positive_feedback"):
+            label = "positive_feedback"
+        elif hits.get("negative_feedback"):
+            label = "negative_feedback"
+        else:
+            label = "query"
+
+        # core.utils.infer_issue_type precedence
+        if hits.get("lost_debit_card"):
+            issue = "lost_debit_card"
+        elif hits.get("debit_card_not_arrived"):
+            issue = "debit_card_not_arrived"
+        elif hits.get("pin") and hits.get("pin_action"):
+            issue = "pin_reset"
+        elif hits.get("login_issue"):
+            issue = "login_issue"
+        else:
+            issue = "generic"
+
+        label_scores = {k: hits.get(k, 0) for k in ("query", "positive_feedback", "negative_feedback")}
+
+        # agents.intent.classify_intent precedence: first pattern in table order
+        intents: List[DetectedIntent] = []
+        for name, rx, conf in self._intents:
+            if name in INTENT_ANCHORS and not hits.get(f"intent:{name}"):
+                continue
+            if rx.search(t):
+                intents.append(DetectedIntent(name=name, confidence=conf))
+
+        return MatchResult(
+            label=label,
+            issue_type=issue,
+            intent=intents[0] if intents else DetectedIntent(name="general_followup", confidence=0.5),
+            intents=intents,
+            label_scores=label_scores,
+            issue_scores={k: hits.get(k, 0) for k in ("lost_debit_card", "debit_card_not_arrived", "pin", "login_issue")},
+            label_confidence=label_confidence(label, label_scores),
+        )
+
+    def scan_many(self, texts: Iterable[Optional[str]]) -> List[MatchResult]:
+        return [self.scan(t) for t in texts]
+
+
+_MATCHER: Optional[MessageMatcher] = None
+
+
+def get_matcher() -> MessageMatcher:
+    global _MATCHER
+    if _MATCHER is None:
+        _MATCHER = MessageMatcher()
+    return _MATCHER
+
+
+@functools.lru_cache(maxsize=SCAN_CACHE)
+def scan(text: Optional[str]) -> MatchResult:
+    """MessageMatcher.scan, memoized per text; results are shared, so treat them as read-only."""
+    return get_matcher().scan(text)
+
+
+def scan_many(texts: Iterable[Optional[str]]) -> List[MatchResult]:
+    return [scan(t) for t in texts]
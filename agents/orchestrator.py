@@ -0,0 +1,194 @@
+# agents/orchestrator.py
+from __future__ import annotations
+import time
+from dataclasses import dataclass, field, asdict
+from typing import Any, Dict, List, Optional, Tuple
+
+from agents.classifier import ClassifierAgent
+from agents.feedback import FeedbackHandler
+from agents.matcher import scan
+from agents.query import QueryHandler
+from core.db import get_conn
+from core import tracing
+from core.storage import SQLiteStorage, Storage, get_storage
+from core.utils import normalize_phone
+
+STAGES = ("classify", "followup", "ticket", "route")
+
+
+@dataclass
+class OrchestratorResult:
+    """
+    Outcome of one message through the pipeline.
+    `messages` are (kind, text) pairs in display order; kind is 'success' | 'info' | 'warning'.
+    `timings` holds seconds spent per stage (see STAGES); `trace_id` tags this request's log rows.
+    """
+    label: str
+    ticket_id: Optional[str] = None
+    messages: List[Tuple[str, str]] = field(default_factory=list)
+    classifier_error: Optional[str] = None
+    followup_error: Optional[str] = None
+    timings: Dict[str, float] = field(default_factory=dict)
+    trace_id: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class Orchestrator:
+    """
+    Headless version of the submit flow: classify → follow-up → reuse/create ticket → route.
+    Reads and writes go through `storage` (core.storage), by default the engine SUPPORT_STORAGE
+    selects. With an explicit `conn` the instance is tied to that SQLite connection (one instance
+    per thread); without one, SQLite calls use the calling thread's pooled connection, so a single
+    instance can be shared (e.g. as a Streamlit cached resource).
+    """
+
+    def __init__(self, conn=None, use_llm: bool = False, storage: Optional[Storage] = None):
+        self._conn = conn
+        self.storage = storage or (SQLiteStorage(conn) if conn is not None else get_storage())
+        self.classifier = ClassifierAgent(use_llm=use_llm)
+        self.feedback_agent = FeedbackHandler(conn=conn, storage=self.storage)
+        self.query_agent = QueryHandler(conn=conn, storage=self.storage)
+
+    @property
+    def conn(self):
+        return self._conn if self._conn is not None else get_conn()
+
+    def process(self, text: str, customer_name: str = "", ticket_id: str = "", phone: str = "") -> OrchestratorResult:
+        with tracing.trace("submit") as trace_id:
+            result = self._process(text, customer_name, ticket_id, phone)
+        result.trace_id = trace_id
+        return result
+
+    def _process(self, text: str, customer_name: str, ticket_id: str, phone: str) -> OrchestratorResult:
+        store = self.storage
+        user_text = text or ""
+        customer_name = customer_name or ""
+        result = OrchestratorResult(label="query")
+        clock = time.perf_counter()
+        stages = iter(STAGES)
+        current = tracing.start_span(f"stage.{next(stages)}")
+
+        def lap(stage: str) -> None:
+            nonlocal clock, current
+            now = time.perf_counter()
+            result.timings[stage] = now - clock
+            clock = now
+            if current is not None:
+                current.end()
+            nxt = next(stages, None)
+            current = tracing.start_span(f"stage.{nxt}") if nxt else None
+
+        try:
+            # 1) Classify
+            try:
+                label = self.classifier.classify(user_text)
+            except Exception as e:
+                result.classifier_error = str(e)
+                label = "query"  # safe fallback
+            result.label = label
+            lap("classify")
+
+            # 2)–4) write stages: one atomic commit per message (no LLM calls in here, so the
+            # write lock is held only for local work). Ticket IDs are reserved up front because
+            # reserving needs the write lock on another connection.
+            store.reserve_ticket_ids(2)
+            with store.transaction():
+                # 2) If a ticket id is provided → treat as a FOLLOW-UP
+                ticket_field = (ticket_id or "").strip()
+                display_name = customer_name.strip() or "Customer"
+
+                if ticket_field:
+                    msg, err = self.feedback_agent.handle_followup(
+                        ticket_id=ticket_field,
+                        customer_name=display_name,
+                        user_text=user_text,
+                    )
+                    if (phone or "").strip():
+                        norm = normalize_phone(phone)
+                        if len(norm) >= 10:  # lenient; accepts 10+ digits
+                            store.append_ticket_note(ticket_id=ticket_field, note=f"callback_phone:{norm}", author=display_name)
+                            store.add_ticket_action_flag(ticket_id=ticket_field, action="preferred_phone_updated")
+                            store.resolve_customer(name=display_name, phone=norm)
+                    if err:
+                        result.followup_error = err
+                        result.messages.append(("warning", "We received your note, but ran into a small issue updating the ticket. Our team has been notified."))
+                    result.messages.append(("success", msg))
+                    store.log_event(level="INFO", agent="Orchestrator", event="followup_handled",
+                              details={"customer_name": display_name, "ticket_id": ticket_field, "label": label})
+                lap("followup")
+
+                # 3) Reuse or create a working ticket id
+                working_ticket_id = None
+                # Same customer despite case/spacing differences, or by phone when one was given
+                existing = (store.find_open_ticket_by_customer(customer_name, phone=phone)
+                            if customer_name.strip() or (phone or "").strip() else None)
+
+                if existing:
+                    working_ticket_id, _existing_status = existing
+                elif label == "negative_feedback":
+                    resp = self.feedback_agent.handle_negative(customer_name=customer_name, description=user_text)
+                    lookup_new = store.find_open_ticket_by_customer(customer_name)
+                    if lookup_new:
+                        working_ticket_id = lookup_new[0]
+                    result.messages.append(("success", resp))
+                    store.log_event(level="INFO", agent="Orchestrator", event="negative_feedback_new_ticket",
+                              details={"customer_name": customer_name, "ticket_id": working_ticket_id})
+                elif label == "query":
+                    new_tid = store.next_ticket_id()
+                    store.insert_ticket(ticket_id=new_tid,
+                                        customer_name=customer_name or "Unknown",
+                                        description=user_text,
+                                        status="Open",
+                                        phone=phone)
+                    working_ticket_id = new_tid
+                    store.log_event(level="INFO", agent="Orchestrator", event="query_new_ticket_created",
+                              details={"customer_name": customer_name, "ticket_id": working_ticket_id})
+                result.ticket_id = working_ticket_id
+                lap("ticket")
+
+                # 4) Route based on label
+                if label == "positive_feedback":
+                    # Never create a new ticket for purely positive feedback
+                    resp = self.feedback_agent.handle_positive(customer_name or "Customer")
+                    result.messages.append(("success", resp))
+                    store.log_event(level="INFO", agent="FeedbackHandler", event="positive_ack",
+                              details={"customer_name": customer_name})
+
+                elif label == "negative_feedback":
+                    if working_ticket_id:
+                        msg = (
+                            f"We apologize for the inconvenience, {customer_name or 'Customer'}. "
+                            f"Your existing ticket #{working_ticket_id} is active—our team will follow up shortly."
+                        )
+                        result.messages.append(("info", msg))
+                        store.log_event(level="INFO", agent="Orchestrator", event="negative_feedback_existing_ticket",
+                                  details={"customer_name": customer_name, "ticket_id": working_ticket_id})
+                    else:
+                        # Defensive fallback
+                        resp = self.feedback_agent.handle_negative(customer_name=customer_name, description=user_text)
+                        result.messages.append(("success", resp))
+
+                else:
+                    routed_text = user_text
+                    if working_ticket_id and ("ticket" not in user_text.lower()):
+                        routed_text = f"{user_text} (ticket {working_ticket_id})"
+
+                    status_resp = self.query_agent.handle(routed_text, match=scan(user_text))
+                    status_resp = f"**Hi {display_name},**\n\n{status_resp}"
+
+                    # If we created or reused a ticket (without user typing one), clarify the id
+                    if working_ticket_id:
+                        status_resp += f"\n\nA ticket #{working_ticket_id} is on file for this request."
+
+                    result.messages.append(("info", status_resp))
+                    store.log_event(level="INFO", agent="QueryHandler", event="query_routed",
+                              details={"customer_name": customer_name, "ticket_id": working_ticket_id})
+                lap("route")
+        except BaseException as e:
+            if current is not None:  # close the failing stage so the trace records where it broke
+                current.end(e)
+            raise
+
+        return result
@@ -1,7 +1,9 @@
 # agents/query.py
 from typing import Optional
-from core.db import get_ticket
-from core.utils import extract_ticket_number, infer_issue_type
+from core.storage import SQLiteStorage, Storage, get_storage
+from core.tracing import traced
+from agents.matcher import MatchResult, scan
+from core.utils import extract_ticket_number
 
 class QueryHandler:
     """
@@ -9,25 +11,29 @@ class QueryHandler:
     Still accepts a single 'text' input so existing call sites work.
     """
 
-    def __init__(self, conn=None):
-        self.conn = conn  # kept for future use if you decide to expand
+    def __init__(self, conn=None, storage: Optional[Storage] = None):
+        self.conn = conn  # None = the configured engine (SUPPORT_STORAGE)
+        self.storage = storage or (SQLiteStorage(conn) if conn is not None else get_storage())
 
-    def handle(self, text: str) -> str:
+    @traced("agent.query.handle")
+    def handle(self, text: str, match: Optional[MatchResult] = None) -> str:
+        """`match` is the matcher result for the customer's message, when the caller already has it."""
         # 1) Extract ticket number from the incoming text
         tno = extract_ticket_number(text)
         if not tno:
             return "I couldn’t find a 6-digit ticket number in your message. Please provide one, or uncheck the 'I already have a ticket' box so I can create or reuse one automatically."
 
-        # 2) Lookup the ticket (backward-compatible get_ticket handles both styles)
-        rec = get_ticket(tno)
+        # 2) Lookup the ticket (on SQLite, read-through core.ticket_cache, so repeat polls skip the file)
+        rec = self.storage.get_ticket(tno)
         if not rec:
             return f"I couldn’t find ticket #{tno}. Please double-check the number or reply without a ticket so I can create one for you."
 
         status = rec.get("status", "Open")
         description = (rec.get("description") or "").strip()
 
-        # 3) Infer intent from the user's message first, then fallback to the stored description
-        issue_type = infer_issue_type(text) or infer_issue_type(description)
+        # 3) Infer intent from the user's message (one matcher pass, shared with the classifier).
+        # "generic" is an answer too, so the stored description is not consulted, as before.
+        issue_type = (match or scan(text)).issue_type
 
         # 4) Build a richer, actionable reply
         base = f"Your ticket #{tno} is currently marked as: **{status}**."
@@ -2,20 +2,28 @@ from __future__ import annotations
 import streamlit as st
 import pandas as pd
 
-from agents.classifier import ClassifierAgent
-from agents.feedback import FeedbackHandler
-from agents.query import QueryHandler
-# ⬇️ add the two imports here
-from core.db import (
-    get_conn,
-    find_open_ticket_by_customer,
-    insert_ticket,
-    log_event,
-    list_tickets,          # NEW
-    list_logs,             # NEW
-)
+from agents.orchestrator import Orchestrator
+from core import metrics, tracing
+from core.feeds import DeltaFeed
+from core.storage import get_storage
+from service.client import API_URL, ServiceClient, ServiceError
+
+
+@st.cache_resource(show_spinner=False)
+def _database_ready() -> bool:
+    """Run migrations once per server process instead of probing on every rerun."""
+    get_storage().init()
+    return True
+
+
+@st.cache_resource
+def _orchestrator(use_llm: bool) -> Orchestrator:
+    """One set of agents for every session; each call uses the calling thread's pooled connection."""
+    return Orchestrator(use_llm=use_llm)
+
 
 st.set_page_config(page_title="Banking Support — Multi-Agent", page_icon="💬", layout="wide")
+_database_ready()  # after set_page_config: a slow first migration shows the cache spinner, a page delta
 st.title("💬 Banking Customer Support — Multi-Agent")
 st.caption("Classifier → Feedback Handler / Query Handler • Evaluation • Logs • DB Viewer")
 
@@ -63,157 +71,105 @@ if submitted:
     if not (user_text or "").strip():
         st.warning("Please enter a question or feedback.")
 
-    # Local imports to avoid circulars (same style you already use)
-    from agents.classifier import ClassifierAgent
-    from agents.feedback import FeedbackHandler
-    from agents.query import QueryHandler
-    from core.db import find_open_ticket_by_customer, insert_ticket, log_event
-    from core.utils import generate_ticket_number
-    import re
-    from core.db import append_ticket_note, add_ticket_action_flag
-
-    def _normalize_phone(p: str) -> str:
-        """Keep digits only; tolerant of formats like (206) 555-0199 ext 123."""
-        return re.sub(r"[^\d]", "", p or "")
-    
-    conn = get_conn()
-    classifier = ClassifierAgent(use_llm=False)  # hook to your sidebar toggle if desired
-    feedback_agent = FeedbackHandler(conn=conn)
-    query_agent = QueryHandler(conn=conn)
-
-    # 1) Classify (kept for transparency/metrics display)
-    try:
-        label = classifier.classify(user_text)
-    except Exception as e:
-        st.error(f"Classifier error: {e}")
-        label = "query"  # safe fallback
-
-    st.write("**Classification:**", label)
-
-    # 2) If a ticket id is provided → treat as a FOLLOW-UP (short-circuit)
-    ticket_field = (ticket_id_input or "").strip()
-    display_name = (customer_name or "").strip() or "Customer"
-
-    if ticket_field:
-        # NEW: intent-aware follow-up path that adds notes/actions and returns contextual copy
-        msg, err = feedback_agent.handle_followup(
-            ticket_id=ticket_field,
-            customer_name=display_name,
-            user_text=user_text
-        )
-        if (phone_input or "").strip():
-            norm = _normalize_phone(phone_input)
-            if len(norm) >= 10:  # lenient; accepts 10+ digits
-                append_ticket_note(conn, ticket_id=ticket_field, note=f"callback_phone:{norm}", author=display_name)
-                add_ticket_action_flag(conn, ticket_id=ticket_field, action="preferred_phone_updated")
-        if err:
-            st.warning("We saved your note, but ran into a small issue updating the ticket. Our team has been notified.")
-        st.success(msg)
-        log_event(conn, level="INFO", agent="Orchestrator", event="followup_handled",
-                  details={"customer_name": display_name, "ticket_id": ticket_field, "label": label})
-
-    # 3) No ticket id provided → reuse or create a working ticket id
-    working_ticket_id = None
-    existing = find_open_ticket_by_customer(conn, (customer_name or "").strip()) if (customer_name or "").strip() else None
-
-    if existing:
-        working_ticket_id, _existing_status = existing
-    else:
-        # Only create a ticket if NOT purely positive feedback
-        if label in ("negative_feedback", "query"):
-            if label == "negative_feedback":
-                # Reuse your existing “create + empathetic reply” flow
-                resp = feedback_agent.handle_negative(customer_name=customer_name, description=user_text)
-                # Grab the new ticket id we just created
-                lookup_new = find_open_ticket_by_customer(conn, customer_name)
-                if lookup_new:
-                    working_ticket_id = lookup_new[0]
-                st.success(resp)
-                log_event(conn, level="INFO", agent="Orchestrator", event="negative_feedback_new_ticket",
-                          details={"customer_name": customer_name, "ticket_id": working_ticket_id})
-            else:
-                # label == "query": create a new ticket for tracking
-                new_tid = generate_ticket_number()
-                insert_ticket(conn,
-                              ticket_id=new_tid,
-                              customer_name=customer_name or "Unknown",
-                              description=user_text,
-                              status="Open")
-                working_ticket_id = new_tid
-                log_event(conn, level="INFO", agent="Orchestrator", event="query_new_ticket_created",
-                          details={"customer_name": customer_name, "ticket_id": working_ticket_id})
-
-    # 4) Route based on label (kept consistent with your original behavior)
-    if label == "positive_feedback":
-        # Never create a new ticket for purely positive feedback
-        resp = feedback_agent.handle_positive(customer_name or "Customer")
-        st.success(resp)
-        log_event(conn, level="INFO", agent="FeedbackHandler", event="positive_ack",
-                  details={"customer_name": customer_name})
-
-    elif label == "negative_feedback":
-        # If we're here: user has or we found an existing ticket
-        if working_ticket_id:
-            msg = (
-                f"We apologize for the inconvenience, {customer_name or 'Customer'}. "
-                f"Your existing ticket #{working_ticket_id} is active—our team will follow up shortly."
-            )
-            st.info(msg)
-            log_event(conn, level="INFO", agent="Orchestrator", event="negative_feedback_existing_ticket",
-                      details={"customer_name": customer_name, "ticket_id": working_ticket_id})
-        else:
-            # Defensive fallback
-            resp = feedback_agent.handle_negative(customer_name=customer_name, description=user_text)
-            st.success(resp)
-
+    if API_URL:
+        # SUPPORT_API_URL: this page is a client of service.server instead of running the agents itself
+        try:
+            result = ServiceClient(API_URL).submit(user_text, customer_name=customer_name,
+                                                   ticket_id=ticket_id_input, phone=phone_input)
+        except (ServiceError, OSError) as e:
+            st.error(f"Support service unavailable: {e}")
+            st.stop()
     else:
-        # label == "query"
-        routed_text = user_text
-        if working_ticket_id and ("ticket" not in user_text.lower()):
-            routed_text = f"{user_text} (ticket {working_ticket_id})"
-
-        status_resp = query_agent.handle(routed_text)
-        status_resp = f"**Hi {display_name},**\n\n{status_resp}"
-
-        # If we created or reused a ticket (without user typing one), clarify the id
-        if working_ticket_id:
-            status_resp += f"\n\nA ticket #{working_ticket_id} is on file for this request."
-
-        st.info(status_resp)
-        log_event(conn, level="INFO", agent="QueryHandler", event="query_routed",
-                  details={"customer_name": customer_name, "ticket_id": working_ticket_id})
+        orchestrator = _orchestrator(use_llm=False)  # hook to your sidebar toggle if desired
+        result = orchestrator.process(
+            user_text,
+            customer_name=customer_name,
+            ticket_id=ticket_id_input,
+            phone=phone_input,
+        ).to_dict()
+
+    if result["classifier_error"]:
+        st.error(f"Classifier error: {result['classifier_error']}")
+    st.write("**Classification:**", result["label"])
+
+    for kind, message in result["messages"]:
+        getattr(st, kind)(message)
+    st.session_state.last_trace_id = result["trace_id"]
 
 # --- Evaluation (QA & Routing Accuracy) ---
 with st.expander("Evaluation (QA & Routing Accuracy)", expanded=False):
-    use_llm_eval = st.checkbox(
-        "Use LLM for classifier during evaluation",
-        value=False,
-        key="eval_use_llm",
-        help="Toggle to compare rule-based vs. LLM classification."
+    eval_mode = st.radio(
+        "Classifier during evaluation",
+        ["rules", "model", "llm"],
+        horizontal=True,
+        key="eval_mode",
+        help="Keyword rules, the local text model (needs a trained artifact), or the LLM."
     )
     limit_cases = st.number_input(
-        "Limit test cases (optional)", min_value=0, max_value=100, value=0, step=1,
-        help="0 means run all bundled tests."
+        "Limit test cases (optional)", min_value=0, max_value=10_000_000, value=0, step=1,
+        help="0 means run every case."
     )
+    eval_file = st.file_uploader("Labeled cases (JSONL or CSV with text + expected/label)",
+                                 type=["jsonl", "csv"], key="eval_file",
+                                 help="Leave empty to run the bundled tests.")
+    eval_workers = st.number_input("Workers (rules) / concurrent requests (LLM)", min_value=1, max_value=64,
+                                   value=8, step=1, key="eval_workers")
     run_eval = st.button("Run Benchmark", key="btn_eval")
     if run_eval:
-        from eval.evaluator import run_benchmark
-        import pandas as pd
-
-        correct, total, rows = run_benchmark(
-            use_llm=use_llm_eval,
-            limit=int(limit_cases) if int(limit_cases) > 0 else None
-        )
-        acc = (correct / total) if total else 0.0
-        st.markdown(f"**Accuracy:** {correct}/{total} &nbsp;&nbsp;(**{acc:.0%}**)")
-        df = pd.DataFrame(rows)
-        st.dataframe(df, use_container_width=True)
-
-        # Optional: quick confusion matrix for visibility
-        if not df.empty and "expected" in df and "predicted" in df:
-            cm = pd.crosstab(df["expected"], df["predicted"], dropna=False)
+        import io
+        from eval.evaluator import TESTS
+        from eval.streaming import iter_cases, run_stream
+
+        if eval_file is not None:
+            fmt = "csv" if eval_file.name.lower().endswith(".csv") else "jsonl"
+            cases = iter_cases(io.TextIOWrapper(eval_file, encoding="utf-8", newline=""), fmt)
+            expected_total = None
+        else:
+            cases = TESTS
+            expected_total = len(TESTS)
+        limit = int(limit_cases) if int(limit_cases) > 0 else None
+        if limit:
+            expected_total = min(expected_total, limit) if expected_total else limit
+
+        progress = st.progress(0.0, text="Starting…")
+
+        def _on_progress(r: dict) -> None:
+            done = r["total"]
+            frac = min(1.0, done / expected_total) if expected_total else 0.0
+            progress.progress(frac, text=f"{done:,} cases • {r['accuracy']:.1%} accurate • "
+                                         f"{r['throughput_per_s']:,.0f}/s")
+
+        try:
+            report = run_stream(
+                cases,
+                mode=eval_mode,
+                workers=int(eval_workers),
+                executor="thread" if eval_file is None else "process",
+                max_concurrency=int(eval_workers),
+                limit=limit,
+                on_progress=_on_progress,
+            ).report()
+        except Exception as e:
+            st.error(f"Evaluation error: {e}")
+            report = None
+
+        if report is not None:
+            progress.progress(1.0, text=f"Done: {report['total']:,} cases in {report['elapsed_s']:.1f}s")
+            lat = report["latency_s"]
+            st.markdown(
+                f"**Accuracy:** {report['correct']}/{report['total']} &nbsp;&nbsp;(**{report['accuracy']:.0%}**)"
+                f" &nbsp;•&nbsp; errors: {report['errors']}"
+                f" &nbsp;•&nbsp; {report['throughput_per_s']:,.0f} cases/s"
+                f" &nbsp;•&nbsp; p50 {lat['p50'] * 1e3:.2f} ms / p95 {lat['p95'] * 1e3:.2f} ms"
+                f" / p99 {lat['p99'] * 1e3:.2f} ms"
+            )
+            st.markdown("**Per-label precision / recall**")
+            st.dataframe(pd.DataFrame(report["per_label"]).T, use_container_width=True)
             st.markdown("**Confusion Matrix (Expected vs. Predicted)**")
-            st.dataframe(cm, use_container_width=True)
+            st.dataframe(pd.DataFrame(report["confusion"]).T, use_container_width=True)
+            if report["mismatches"]:
+                st.markdown("**Sample mismatches**")
+                st.dataframe(pd.DataFrame(report["mismatches"]), use_container_width=True)
 
 if "history" not in st.session_state:
     st.session_state.history = []
@@ -226,21 +182,91 @@ st.sidebar.subheader("Database & Logs")
 if st.sidebar.button("Refresh Tables"):
     st.rerun()
 
+with st.sidebar.expander("⏱ Stage latencies", expanded=False):
+    spans = tracing.span_summary()
+    if not spans:
+        st.caption("No traced requests yet." if tracing.enabled() else "Tracing is off (SUPPORT_TRACING=0).")
+    else:
+        sdf = pd.DataFrame(spans).T[["count", "errors", "p50", "p95", "p99", "max"]]
+        sdf[["p50", "p95", "p99", "max"]] = (sdf[["p50", "p95", "p99", "max"]] * 1000).round(2)
+        st.caption("Milliseconds per span since process start")
+        st.dataframe(sdf.sort_index(), use_container_width=True)
+        last = tracing.get_trace(st.session_state.get("last_trace_id") or "")
+        if last:
+            st.caption(f"Last submit · trace `{last['trace_id']}`")
+            st.text("\n".join(
+                f"{'  ' * sp['depth']}{sp['name']}  {sp['duration_s'] * 1000:.2f} ms" + (" ✗" if sp["error"] else "")
+                for sp in last["spans"]
+            ))
+        st.download_button("Prometheus metrics", metrics.to_prometheus(), file_name="metrics.prom",
+                           mime="text/plain", key="btn_prom")
+
 tickets_tab, logs_tab = st.tabs(["📬 Tickets", "🪵 Logs"])
-conn = get_conn()
+storage = get_storage()  # the engine the orchestrator writes to (SUPPORT_STORAGE)
+db_version = storage.data_version()  # unchanged since the last rerun → the feeds skip their queries
+if API_URL and storage.name == "memory":
+    st.warning("SUPPORT_STORAGE=memory keeps data inside each process, so these tables cannot show "
+               "tickets written by the service at SUPPORT_API_URL.")
+
+
+def _feed(key: str, kind: str, filters: dict) -> DeltaFeed:
+    """Session-cached feed; a filter change starts a fresh one, otherwise only the delta is fetched."""
+    feed = st.session_state.get(key)
+    if feed is None or feed.filters != filters:
+        feed = st.session_state[key] = DeltaFeed(kind, filters)
+    feed.sync(storage, version=db_version)
+    return feed
+
+
+def _show_feed(feed: DeltaFeed, cols: list, empty: str, older_key: str) -> None:
+    df = pd.DataFrame(feed.records())
+    if df.empty:
+        st.info(empty)
+    else:
+        preferred_cols = [c for c in cols if c in df.columns]
+        st.dataframe(df[preferred_cols] if preferred_cols else df, use_container_width=True, height=520)
+    if feed.has_older and st.button("Load older", key=older_key):
+        feed.load_older(storage)
+        st.rerun()
+
+
+def _show_search(query: str, status: list) -> None:
+    """Ranked full-text results; re-run only when the query, filter or data changes."""
+    key = (query, tuple(status), db_version)
+    found = st.session_state.get("ticket_search")
+    if found is None or found["key"] != key:
+        rows, next_offset = storage.search_tickets(query, limit=50, status=status or None, highlight=("«", "»"))
+        found = st.session_state["ticket_search"] = {"key": key, "rows": rows, "next": next_offset}
+    if not found["rows"]:
+        st.info("No matching tickets.")
+    else:
+        df = pd.DataFrame(found["rows"])
+        st.dataframe(df[["ticket_id", "customer_name", "status", "matched", "snippet", "created_at"]],
+                     use_container_width=True, height=520)
+    if found["next"] is not None and st.button("More results", key="btn_more_search"):
+        rows, found["next"] = storage.search_tickets(query, limit=50, offset=found["next"],
+                                                     status=status or None, highlight=("«", "»"))
+        found["rows"] += rows
+        st.rerun()
+
 
 with tickets_tab:
     c1, c2 = st.columns([1, 5])
     with c1:
         if st.button("Refresh", key="btn_refresh_tickets"):
             pass
+    with c2:
+        f1, f2 = st.columns([2, 3])
+        t_query = f1.text_input("Search descriptions & notes", key="flt_ticket_search",
+                                placeholder='wire transfer, "card declined", merch…').strip()
+        t_status = f2.multiselect("Status", ["Open", "In-Progress", "Resolved", "Closed"], key="flt_ticket_status")
     try:
-        tdf = pd.DataFrame(list_tickets(conn, limit=200))
-        if tdf.empty:
-            st.info("No tickets yet.")
+        if t_query:
+            _show_search(t_query, t_status)
         else:
-            preferred_cols = [c for c in ["created_at","ticket_id","customer_name","status","description"] if c in tdf.columns]
-            st.dataframe(tdf[preferred_cols] if preferred_cols else tdf, use_container_width=True, height=520)
+            feed = _feed("feed_tickets", "tickets", {"status": t_status or None})
+            _show_feed(feed, ["created_at","ticket_id","customer_name","status","description"],
+                       "No tickets yet.", "btn_older_tickets")
     except Exception as e:
         st.error(f"Tickets error: {e}")
 
@@ -249,13 +275,17 @@ with logs_tab:
     with c1:
         if st.button("Refresh", key="btn_refresh_logs"):
             pass
+    with c2:
+        f1, f2, f3 = st.columns(3)
+        l_level = f1.multiselect("Level", ["DEBUG", "INFO", "WARN", "ERROR"], key="flt_log_level")
+        l_agent = f2.text_input("Agent", key="flt_log_agent").strip()
+        l_since = f3.date_input("Since", value=None, key="flt_log_since")
     try:
-        ldf = pd.DataFrame(list_logs(conn, limit=200))
-        if ldf.empty:
-            st.info("No logs yet.")
-        else:
-            preferred_cols = [c for c in ["ts","level","agent","event","details"] if c in ldf.columns]
-            st.dataframe(ldf[preferred_cols] if preferred_cols else ldf, use_container_width=True, height=520)
+        feed = _feed("feed_logs", "logs", {
+            "level": l_level or None,
+            "agent": l_agent or None,
+            "since": l_since.isoformat() if l_since else None,
+        })
+        _show_feed(feed, ["ts","level","agent","event","details"], "No logs yet.", "btn_older_logs")
     except Exception as e:
         st.error(f"Logs error: {e}")
-
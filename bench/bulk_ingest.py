@@ -0,0 +1,64 @@
+# bench/bulk_ingest.py
+"""
+Single-row insert_ticket vs. insert_tickets_bulk (executemany, chunked transactions).
+
+    python -m bench.bulk_ingest
+    python -m bench.bulk_ingest --n 200000 --chunks 100,1000,10000
+"""
+from __future__ import annotations
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+from typing import Dict, Iterator
+
+from core.db import _configure_conn, insert_ticket, insert_tickets_bulk
+from core.migrations import migrate
+
+
+def _rows(n: int, offset: int = 0) -> Iterator[Dict[str, str]]:
+    for i in range(offset, offset + n):
+        yield {"ticket_id": f"L{i:09d}", "customer_name": f"Customer {i % 5000}",
+               "description": "Migrated from legacy system", "status": "Open"}
+
+
+def _fresh(tmp: str, name: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(os.path.join(tmp, name))
+    conn.row_factory = sqlite3.Row
+    _configure_conn(conn)
+    migrate(conn)
+    return conn
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=20_000, help="tickets per run")
+    parser.add_argument("--single-n", type=int, default=None, help="tickets for the single-row run (default n)")
+    parser.add_argument("--chunks", default="100,1000,10000")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        single_n = args.single_n or args.n
+        conn = _fresh(tmp, "single.db")
+        start = time.perf_counter()
+        for row in _rows(single_n):
+            insert_ticket(conn, **row)
+        single = single_n / (time.perf_counter() - start)
+        conn.close()
+        print(f"{'insert_ticket (1 commit/row)':<34} {single:>12,.0f} rows/s")
+
+        for chunk in [int(c) for c in args.chunks.split(",") if c.strip()]:
+            conn = _fresh(tmp, f"bulk_{chunk}.db")
+            start = time.perf_counter()
+            res = insert_tickets_bulk(conn, _rows(args.n), chunk_size=chunk)
+            rate = res.inserted / (time.perf_counter() - start)
+            # re-ingesting the same rows exercises the skip path
+            dup = insert_tickets_bulk(conn, _rows(args.n // 10), chunk_size=chunk)
+            conn.close()
+            print(f"{f'insert_tickets_bulk chunk={chunk}':<34} {rate:>12,.0f} rows/s   "
+                  f"x{rate / single:,.0f}   (re-run: {dup.skipped} skipped)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+# bench/db_lookup.py
+"""
+Lookup latency for the ticket/log hot paths, with and without the v2 indexes.
+
+    python -m bench.db_lookup                       # 10k, 1M and 10M tickets
+    python -m bench.db_lookup --sizes 10000,100000  # quicker run
+
+Each size is generated once into a temporary SQLite file (10M tickets is ~1.5 GB
+and takes a few minutes to build), then timed at schema v1 (no indexes) and
+after migrating to the latest version (v8 links tickets to customers, so the
+latest lookup goes through the customers table).
+"""
+from __future__ import annotations
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List
+
+from core.db import find_open_ticket_by_customer, list_tickets, list_logs
+from core.migrations import migrate
+
+STATUSES = ("Open", "In-Progress", "Resolved", "Closed")
+EPOCH = datetime(2024, 1, 1)
+
+
+def _ts(i: int) -> str:
+    return (EPOCH + timedelta(seconds=3 * i)).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _build(path: str, n_tickets: int, n_customers: int, seed: int = 7) -> None:
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+    migrate(conn, target=1)
+    rnd = random.Random(seed)
+
+    def tickets():
+        for i in range(n_tickets):
+            yield (
+                f"{i:08d}",
+                f"Customer {rnd.randrange(n_customers)}",
+                "Benchmark ticket",
+                rnd.choice(STATUSES),
+                _ts(i),
+            )
+
+    def logs():
+        for i in range(n_tickets):
+            yield (_ts(i), "INFO", "Bench", "event", "{}")
+
+    with conn:
+        conn.executemany(
+            "INSERT INTO support_tickets (ticket_id, customer_name, description, status, created_at) VALUES (?, ?, ?, ?, ?)",
+            tickets(),
+        )
+        conn.executemany("INSERT INTO app_logs (ts, level, agent, event, details) VALUES (?, ?, ?, ?, ?)", logs())
+    conn.close()
+
+
+def _find_open_v1(conn: sqlite3.Connection, name: str) -> object:
+    # the v1-era lookup: exact customer_name match (schema v1 has no customers table)
+    return conn.execute("SELECT ticket_id, status FROM support_tickets WHERE customer_name = ? "
+                        "AND status IN ('Open', 'In-Progress') ORDER BY created_at DESC LIMIT 1", (name,)).fetchone()
+
+
+def _time(fn: Callable[[], object], repeat: int) -> Dict[str, float]:
+    samples: List[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {"median_ms": statistics.median(samples), "p95_ms": samples[int(0.95 * (len(samples) - 1))]}
+
+
+def run(sizes: List[int], repeat: int = 50) -> List[Dict[str, object]]:
+    rows: List[Dict[str, object]] = []
+    for n in sizes:
+        n_customers = max(10, n // 5)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "bench.db")
+            _build(path, n, n_customers)
+            conn = sqlite3.connect(path)
+            conn.row_factory = sqlite3.Row
+            rnd = random.Random(11)
+            cases = {
+                "find_open_ticket_by_customer": lambda: _find_open_v1(conn, f"Customer {rnd.randrange(n_customers)}"),
+                "list_tickets(limit=200)": lambda: list_tickets(conn, 200),
+                "list_logs(limit=200)": lambda: list_logs(conn, limit=200),
+            }
+            for schema in ("v1 (no indexes)", "latest"):
+                if schema == "latest":
+                    migrate(conn)
+                    conn.execute("ANALYZE")
+                    cases["find_open_ticket_by_customer"] = lambda: find_open_ticket_by_customer(
+                        conn, f"Customer {rnd.randrange(n_customers)}")
+                for name, fn in cases.items():
+                    # full scans at 10M rows take seconds each; keep the run bounded
+                    reps = repeat if schema == "latest" or n <= 100_000 else max(3, repeat // 10)
+                    rows.append({"tickets": n, "schema": schema, "query": name, **_time(fn, reps)})
+            conn.close()
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,1000000,10000000", help="comma-separated ticket counts")
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    print(f"{'tickets':>10}  {'schema':<16} {'query':<30} {'median ms':>10} {'p95 ms':>10}")
+    for r in run(sizes, args.repeat):
+        print(f"{r['tickets']:>10}  {r['schema']:<16} {r['query']:<30} {r['median_ms']:>10.3f} {r['p95_ms']:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
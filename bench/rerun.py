@@ -0,0 +1,113 @@
+# bench/rerun.py
+"""
+Wall time of one dashboard rerun that changes no data, before and after caching.
+
+Streamlit runs each rerun on a new thread. "before" replays what app.py did per
+rerun: open a connection, build the three agents, re-query both tables.
+"after" uses the cached orchestrator, the idle-connection pool and the
+data_version gate on the session feeds. With streamlit installed, --app also
+times real reruns of app.py through streamlit.testing.
+
+    python -m bench.rerun
+    python -m bench.rerun --tickets 50000 --reruns 200 --app
+"""
+from __future__ import annotations
+import argparse
+import os
+import statistics
+import tempfile
+import threading
+import time
+from typing import Callable, List
+
+
+def _on_fresh_thread(fn: Callable[[], None]) -> float:
+    elapsed: List[float] = []
+
+    def run() -> None:
+        start = time.perf_counter()
+        fn()
+        elapsed.append(time.perf_counter() - start)
+
+    t = threading.Thread(target=run)
+    t.start()
+    t.join()
+    return elapsed[0]
+
+
+def _report(label: str, times: List[float]) -> float:
+    times = sorted(times)
+    p50 = statistics.median(times)
+    p95 = times[min(len(times) - 1, int(len(times) * 0.95))]
+    print(f"{label:<34} p50={p50 * 1e3:8.3f} ms   p95={p95 * 1e3:8.3f} ms")
+    return p50
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tickets", type=int, default=10_000)
+    parser.add_argument("--logs", type=int, default=50_000)
+    parser.add_argument("--reruns", type=int, default=100)
+    parser.add_argument("--app", action="store_true", help="also time app.py via streamlit.testing (needs streamlit)")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ["SUPPORT_DB_PATH"] = os.path.join(tmp, "support.db")  # before core.db reads it
+
+    from agents.classifier import ClassifierAgent
+    from agents.feedback import FeedbackHandler
+    from agents.orchestrator import Orchestrator
+    from agents.query import QueryHandler
+    from core import db
+    from core.feeds import DeltaFeed
+    from core.storage import SQLiteStorage
+
+    conn = db.get_conn()
+    db.insert_tickets_bulk(conn, ({"ticket_id": f"B{i:09d}", "customer_name": f"Customer {i % 500}",
+                                   "description": "seeded", "status": "Open"} for i in range(args.tickets)))
+    with conn:
+        conn.executemany("INSERT INTO app_logs (level, agent, event, details) VALUES ('INFO', 'Bench', 'seed', '{}')",
+                         ([] for _ in range(args.logs)))
+
+    def before() -> None:
+        c = db._open_conn()  # what get_conn() did on every new thread
+        ClassifierAgent(use_llm=False), FeedbackHandler(conn=c), QueryHandler(conn=c)
+        db.list_tickets(c, limit=200)
+        db.list_logs(c, limit=200)
+        c.close()
+
+    cached = Orchestrator(use_llm=False)  # st.cache_resource
+    feeds = {"tickets": DeltaFeed("tickets", {"status": None}), "logs": DeltaFeed("logs", {"level": None})}
+
+    storage = SQLiteStorage()  # the engine app.py reads through, on the calling thread's connection
+
+    def after() -> None:
+        _ = cached.classifier
+        version = storage.data_version()
+        for feed in feeds.values():
+            feed.sync(storage, version=version)
+            feed.records()
+
+    _on_fresh_thread(after)  # first load fills the feeds, as the first page view would
+    b = _report("before (per-rerun setup + queries)", [_on_fresh_thread(before) for _ in range(args.reruns)])
+    a = _report("after (cached, version-gated)", [_on_fresh_thread(after) for _ in range(args.reruns)])
+    print(f"{'speedup':<34} x{b / a:,.1f}")
+
+    if args.app:
+        try:
+            from streamlit.testing.v1 import AppTest
+        except ImportError:
+            print("streamlit not installed; skipping --app")
+            return
+        at = AppTest.from_file("app.py", default_timeout=60)
+        at.run()
+        times = []
+        for _ in range(min(args.reruns, 30)):
+            start = time.perf_counter()
+            at.run()
+            times.append(time.perf_counter() - start)
+        _report("app.py rerun (streamlit.testing)", times)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+# bench/search.py
+"""
+Ticket search: LIKE '%...%' scans vs the v7 FTS5 index, at up to a million tickets.
+
+    python -m bench.search                          # 100k and 1M tickets
+    python -m bench.search --sizes 20000 --repeat 5 # quick run
+
+Each size is generated into a temporary file at schema v6 (one note per five tickets),
+timed with LIKE scans (unranked: they stop at the first 20 hits, so only the rare
+term, present in eight tickets, pays for the full scan), then migrated to the latest schema, which builds the index
+(its time is reported), and timed again through search_tickets. The last rows show what
+the sync triggers add to bulk ingestion.
+"""
+from __future__ import annotations
+import argparse
+import itertools
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+from core.db import _configure_conn, insert_tickets_bulk, search_tickets
+from core.migrations import migrate
+
+WORDS = ("card declined charge refund wire transfer branch loan mortgage overdraft fee statement pin "
+         "replacement address travel abroad fraud dispute merchant balance savings account interest "
+         "payment late online banking login password locked cheque deposit atm withdrawal limit").split()
+VOCAB = WORDS + [f"term{i}" for i in range(20_000)]  # Zipf tail, so term frequencies look like real text
+ZIPF = list(itertools.accumulate(1.0 / (rank + 1) for rank in range(len(VOCAB))))
+RARE = ("Zanzibar", "Quixotic", "Brouhaha", "Kerfuffle")
+QUERIES = {  # name -> (text, prefix-match the last word)
+    "rare word": ("zanzibar", False),
+    "common word": ("card", False),
+    "common+pfx": ("card", True),
+    "two words": ("wire transfer", False),
+    "prefix": ("mortg", True),
+    "phrase": ('"card declined"', False),
+}
+
+
+def _text(rnd: random.Random, n_words: int, rare: bool = False) -> str:
+    words = rnd.choices(VOCAB, cum_weights=ZIPF, k=n_words)
+    if rare:
+        words.insert(rnd.randrange(len(words)), rnd.choice(RARE))
+    return " ".join(words).capitalize()
+
+
+def _build(path: str, n: int, seed: int = 5) -> sqlite3.Connection:
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+    migrate(conn, target=6)
+    rnd = random.Random(seed)
+    with conn:
+        conn.executemany(
+            "INSERT INTO support_tickets (ticket_id, customer_name, description, status) VALUES (?, ?, ?, ?)",
+            ((f"S{i:09d}", f"Customer {i % 5000}", _text(rnd, rnd.randint(6, 30), rare=(i % (n // 8) == 7)), "Open")
+             for i in range(n)))
+        conn.executemany(
+            "INSERT INTO ticket_notes (ticket_id, note) VALUES (?, ?)",
+            ((f"S{i:09d}", _text(rnd, rnd.randint(4, 20))) for i in range(0, n, 5)))
+    return conn
+
+
+def _like(conn: sqlite3.Connection, text: str) -> Callable[[], object]:
+    words = [w.strip('"') for w in text.split()]
+    clause = " AND ".join("(t.description LIKE ? OR EXISTS (SELECT 1 FROM ticket_notes n "
+                          "WHERE n.ticket_id = t.ticket_id AND n.note LIKE ?))" for _ in words)
+    params = [p for w in words for p in (f"%{w}%", f"%{w}%")]
+    sql = f"SELECT * FROM support_tickets t WHERE {clause} ORDER BY created_at DESC LIMIT 20"
+    return lambda: conn.execute(sql, params).fetchall()
+
+
+def _time(fn: Callable[[], object], repeat: int) -> Dict[str, float]:
+    samples: List[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {"median_ms": statistics.median(samples), "p95_ms": samples[int(0.95 * (len(samples) - 1))]}
+
+
+def _ingest(tmp: str, name: str, target: int, n: int = 20_000) -> float:
+    conn = sqlite3.connect(os.path.join(tmp, name))
+    conn.row_factory = sqlite3.Row
+    _configure_conn(conn)
+    migrate(conn, target=target)
+    rnd = random.Random(9)
+    rows = ({"ticket_id": f"I{i:09d}", "customer_name": "Ingest", "description": _text(rnd, 20)} for i in range(n))
+    start = time.perf_counter()
+    insert_tickets_bulk(conn, rows)
+    elapsed = time.perf_counter() - start
+    conn.close()
+    return n / elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="100000,1000000", help="comma-separated ticket counts")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'tickets':>9}  {'method':<6} {'query':<12} {'median ms':>10} {'p95 ms':>10}")
+    for n in (int(s) for s in args.sizes.split(",") if s.strip()):
+        with tempfile.TemporaryDirectory() as tmp:
+            conn = _build(os.path.join(tmp, "bench.db"), n)
+            for name, (text, _prefix) in QUERIES.items():
+                r = _time(_like(conn, text), max(3, args.repeat // 4))
+                print(f"{n:>9}  {'LIKE':<6} {name:<12} {r['median_ms']:>10.2f} {r['p95_ms']:>10.2f}")
+            start = time.perf_counter()
+            migrate(conn)
+            print(f"{n:>9}  index build (migration v7): {time.perf_counter() - start:.1f}s")
+            for name, (text, prefix) in QUERIES.items():
+                r = _time(lambda: search_tickets(conn, text, prefix=prefix), args.repeat)
+                print(f"{n:>9}  {'FTS5':<6} {name:<12} {r['median_ms']:>10.2f} {r['p95_ms']:>10.2f}")
+            conn.close()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        before, after = _ingest(tmp, "v6.db", 6), _ingest(tmp, "latest.db", None)
+        print(f"bulk ingest: {before:,.0f} rows/s without triggers, {after:,.0f} rows/s with ({after / before:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# bench/shards.py
+"""
+Write throughput with tickets sharded over 1, 4 and 8 SQLite files.
+
+Each run starts `--workers` processes on a fresh database. Every process
+writes `--n` tickets, each as one unit of work: insert_ticket, a note and an
+action flag (core.db.transaction()). With --log each ticket also writes a
+synchronous log_event, which all go to the single log file.
+
+    python -m bench.shards
+    python -m bench.shards --workers 16 --n 2000 --shards 1,2,4,8 --log
+"""
+from __future__ import annotations
+import argparse
+import multiprocessing as mp
+import os
+import tempfile
+import time
+from typing import Dict, List, Tuple
+
+
+def _init(db_path: str, shards: int) -> None:
+    os.environ["SUPPORT_DB_PATH"] = db_path
+    os.environ["SUPPORT_DB_SHARDS"] = str(shards)
+    from core import db
+    db.init_db()
+    db.close_all()
+
+
+def _worker(db_path: str, shards: int, worker: int, n: int, log: bool, ready, start, out) -> None:
+    os.environ["SUPPORT_DB_PATH"] = db_path  # before core.db reads them
+    os.environ["SUPPORT_DB_SHARDS"] = str(shards)
+    os.environ.setdefault("SUPPORT_TRACING", "0")
+    from core import db
+
+    conn = db.init_db()
+    customers = [f"Customer {worker}-{c}" for c in range(20)]
+    for name in customers:  # customer creation is a one-off main-file write; keep it out of the timing
+        db.resolve_customer(conn, name=name)
+    ready.put(worker)
+    start.wait()
+    began = time.perf_counter()
+    errors = 0
+    for i in range(n):
+        ticket_id = f"W{worker:02d}-{i:07d}"
+        try:
+            with db.transaction(conn):
+                db.insert_ticket(conn, ticket_id=ticket_id, customer_name=customers[i % len(customers)],
+                                 description="Card declined at checkout")
+                db.append_ticket_note(conn, ticket_id=ticket_id, note="customer called back")
+                db.add_ticket_action_flag(conn, ticket_id=ticket_id, action="review")
+            if log:
+                db.log_event(conn, level="INFO", agent="Bench", event="ticket_written", details={"id": ticket_id})
+        except Exception:  # busy timeouts under contention count as failed units of work
+            errors += 1
+    out.put((worker, time.perf_counter() - began, errors))
+    db.close_all()
+
+
+def run(shards: int, workers: int, n: int, log: bool) -> Dict[str, float]:
+    ctx = mp.get_context("spawn")  # fresh interpreters, so each reads the env of this run
+    db_path = os.path.join(tempfile.mkdtemp(prefix=f"bench-shards{shards}-"), "support.db")
+    init = ctx.Process(target=_init, args=(db_path, shards))  # migrate every file once, before the workers race
+    init.start()
+    init.join()
+    ready, out, start = ctx.Queue(), ctx.Queue(), ctx.Event()
+    procs = [ctx.Process(target=_worker, args=(db_path, shards, w, n, log, ready, start, out))
+             for w in range(workers)]
+    for p in procs:
+        p.start()
+    for _ in procs:
+        ready.get()
+    wall = time.perf_counter()
+    start.set()
+    results: List[Tuple[int, float, int]] = [out.get() for _ in procs]
+    wall = time.perf_counter() - wall
+    for p in procs:
+        p.join()
+    errors = sum(r[2] for r in results)
+    done = workers * n - errors
+    return {"shards": shards, "tickets": done, "errors": errors, "seconds": wall,
+            "tickets_per_s": done / wall if wall else 0.0, "rows_per_s": 3 * done / wall if wall else 0.0}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=8, help="writer processes")
+    parser.add_argument("--n", type=int, default=1000, help="tickets per worker")
+    parser.add_argument("--shards", default="1,4,8")
+    parser.add_argument("--log", action="store_true", help="also log_event every ticket (one shared log file)")
+    args = parser.parse_args()
+
+    base = None
+    print(f"{args.workers} workers x {args.n} tickets (ticket + note + action per unit of work)"
+          f"{', plus a log row' if args.log else ''}")
+    for shards in (int(s) for s in args.shards.split(",")):
+        r = run(shards, args.workers, args.n, args.log)
+        base = base or r["tickets_per_s"]
+        print(f"shards={shards:<3} {r['tickets_per_s']:9.0f} tickets/s  {r['rows_per_s']:9.0f} rows/s  "
+              f"{r['seconds']:6.2f} s  errors={r['errors']:<4}  x{r['tickets_per_s'] / base:.2f}")
+
+
+if __name__ == "__main__":
+    main()
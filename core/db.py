@@ -1,51 +1,498 @@
 # core/db.py
 import os
+import re
 import sqlite3
 import json
-from typing import Optional, Tuple, Dict, Any, List
+import threading
+import time
+import weakref
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import Optional, Tuple, Dict, Any, List, Iterator, Iterable, Mapping, Sequence, Set, Union
+
+from core import metrics, shards, ticket_cache, tracing
+from core.log_writer import BufferedLogWriter
+from core.migrations import SEARCH_INDEXES, create_search_index, link_ticket_customers, migrate, upsert_customer
+from core.utils import customer_name_key, customer_phone_key
 
 DB_PATH = os.getenv("SUPPORT_DB_PATH", "data/support.db")
-_CONN: Optional[sqlite3.Connection] = None
-
-def get_conn() -> sqlite3.Connection:
-    """Singleton SQLite connection with row dicts and thread-safe settings for Streamlit."""
-    global _CONN
-    if _CONN is None:
-        os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-        _CONN = sqlite3.connect(DB_PATH, check_same_thread=False)
-        _CONN.row_factory = sqlite3.Row
-        _init_db(_CONN)
-    return _CONN
+BUSY_TIMEOUT_MS = int(os.getenv("SUPPORT_DB_BUSY_TIMEOUT_MS", "5000"))
+MMAP_SIZE = int(os.getenv("SUPPORT_DB_MMAP_BYTES", str(256 * 1024 * 1024)))
+CACHE_KB = int(os.getenv("SUPPORT_DB_CACHE_KB", "16384"))
+IDLE_CONNS = int(os.getenv("SUPPORT_DB_IDLE_CONNS", "8"))
+SEARCH_RANK_WINDOW = int(os.getenv("SUPPORT_SEARCH_RANK_WINDOW", "5000"))  # newest matches ranked per index; 0 = all
+# Ticket shards (core.shards): 1 = everything in DB_PATH. Logs go to SUPPORT_DB_LOG_PATH, by default
+# DB_PATH when unsharded and <db>-logs.db otherwise. Change layouts with `python -m tools.reshard`.
+SHARDS = max(1, int(os.getenv("SUPPORT_DB_SHARDS", "1")))
+LOG_PATH = os.getenv("SUPPORT_DB_LOG_PATH", "")
+
+_LOCAL = threading.local()
+_INIT_LOCK = threading.Lock()
+_SCHEMA_READY: Set[str] = set()   # paths migrated by this process
+_OPEN_CONNS: "weakref.WeakSet[sqlite3.Connection]" = weakref.WeakSet()
+_LOG_WRITER: Optional[BufferedLogWriter] = None
+_IDLE: Dict[str, List[sqlite3.Connection]] = {}   # path -> connections released by finished threads
+_IDLE_LOCK = threading.Lock()
+_DATA_VERSION = 0
+_VERSION_LOCK = threading.Lock()
+_GENERATION = 0   # bumped by close_all(); threads drop handles cached under an older generation
+
+class _PooledConnection(sqlite3.Connection):
+    """Marks connections owned by the per-thread pool (and makes them weak-referenceable)."""
+    path: str = ""
+    seen_data_version: Optional[int] = None
+    cache_seen_version: Optional[int] = None  # PRAGMA data_version at the last ticket-cache poll
+    cache_polled_at: float = 0.0
+
+class _Lease:
+    """Lives in the thread-local; when the thread exits, its connection goes back to the idle list."""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def __del__(self):
+        _release(self.conn)
+
+def _release(conn: sqlite3.Connection) -> None:
+    if conn not in _OPEN_CONNS:
+        return
+    try:
+        if conn.in_transaction:
+            conn.rollback()
+    except sqlite3.Error:
+        return
+    with _IDLE_LOCK:
+        idle = _IDLE.setdefault(conn.path, [])
+        if len(idle) < IDLE_CONNS:
+            idle.append(conn)
+            return
+    _OPEN_CONNS.discard(conn)
+    conn.close()
+
+def _take_idle(path: str) -> Optional[sqlite3.Connection]:
+    with _IDLE_LOCK:
+        idle = _IDLE.get(path)
+        while idle:
+            conn = idle.pop()
+            if conn in _OPEN_CONNS:  # skip anything close_all() already closed
+                return conn
+    return None
+
+def get_conn(path: Optional[str] = None) -> sqlite3.Connection:
+    """
+    Per-thread SQLite connection (WAL mode, row dicts) to `path` (default DB_PATH; shards and
+    the log file get their own). Each Streamlit session / worker thread gets its own handle, so
+    readers never queue behind another thread's writer. The schema is created once per process.
+    When a thread exits its handles are parked (up to SUPPORT_DB_IDLE_CONNS per file) and handed
+    to the next new thread, so Streamlit's thread-per-rerun doesn't pay for fresh connections.
+    """
+    path = path or DB_PATH
+    if getattr(_LOCAL, "generation", _GENERATION) != _GENERATION:
+        _forget_local_conns()
+    if path == DB_PATH:
+        conn = getattr(_LOCAL, "conn", None)
+        if conn is not None:
+            return conn
+    else:
+        conn = getattr(_LOCAL, "conns", {}).get(path)
+        if conn is not None:
+            return conn
+    start = time.perf_counter()
+    conn = _take_idle(path)
+    if conn is None:
+        conn = _open_conn(path)
+        metrics.incr("db.conn_opened")
+    else:
+        metrics.incr("db.conn_reused")
+    _LOCAL.generation = _GENERATION
+    if path == DB_PATH:
+        _LOCAL.conn = conn
+        _LOCAL.lease = _Lease(conn)
+    else:
+        if not hasattr(_LOCAL, "conns"):
+            _LOCAL.conns, _LOCAL.leases = {}, []
+        _LOCAL.conns[path] = conn
+        _LOCAL.leases.append(_Lease(conn))
+    metrics.observe("db.pool_wait", time.perf_counter() - start)
+    metrics.set_gauge("db.open_connections", len(_OPEN_CONNS))
+    return conn
+
+def _open_conn(path: Optional[str] = None) -> sqlite3.Connection:
+    path = path or DB_PATH
+    if path != DB_PATH and DB_PATH not in _SCHEMA_READY:
+        get_conn()  # the main file first: it records the layout and starts the background workers
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path, check_same_thread=False, timeout=BUSY_TIMEOUT_MS / 1000.0,
+                           factory=_PooledConnection)
+    conn.row_factory = sqlite3.Row
+    conn.path = path
+    _configure_conn(conn)
+    _OPEN_CONNS.add(conn)
+    if path not in _SCHEMA_READY:
+        started = False
+        with _INIT_LOCK:
+            if path not in _SCHEMA_READY:
+                _init_db(conn)
+                if path == DB_PATH:
+                    _check_layout(conn)
+                elif path in shard_paths():
+                    shards.init_shard(conn, shard_paths().index(path), SHARDS)
+                _SCHEMA_READY.add(path)
+                started = path == DB_PATH
+        if started:  # outside the lock: these may open the log file
+            _async_logging_from_env()
+            _log_archiver_from_env()
+            tracing._snapshots_from_env()
+    return conn
+
+def _configure_conn(conn: sqlite3.Connection) -> None:
+    conn.execute("PRAGMA auto_vacuum=INCREMENTAL")  # only takes effect on a new file; see core.log_retention
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={int(BUSY_TIMEOUT_MS)}")
+    conn.execute(f"PRAGMA mmap_size={int(MMAP_SIZE)}")
+    conn.execute(f"PRAGMA cache_size={-int(CACHE_KB)}")
+
+def _is_pooled(conn: sqlite3.Connection) -> bool:
+    return isinstance(conn, _PooledConnection)
+
+def _forget_local_conns() -> None:
+    """Drop this thread's cached handles; close_all() has already closed them."""
+    for name in ("conn", "lease", "conns", "leases"):
+        _LOCAL.__dict__.pop(name, None)
+
+def close_all() -> None:
+    """
+    Close every pooled connection (tests, shutdown, or after changing DB_PATH). Other threads
+    notice the new generation on their next get_conn() and open fresh handles.
+    """
+    global _GENERATION
+    _GENERATION += 1
+    for conn in list(_OPEN_CONNS):
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+    _OPEN_CONNS.clear()
+    with _IDLE_LOCK:
+        _IDLE.clear()
+    ticket_cache.get_ticket_cache().clear()
+    _LOCAL.__dict__.clear()
+    _SCHEMA_READY.clear()
+
+# ---------- Shard routing ----------
+
+_PATHS: Dict[Tuple[str, int, str], Tuple[List[str], str]] = {}
+
+def _paths() -> Tuple[List[str], str]:
+    key = (DB_PATH, SHARDS, LOG_PATH)
+    paths = _PATHS.get(key)
+    if paths is None:
+        paths = _PATHS[key] = (shards.shard_paths(DB_PATH, SHARDS), LOG_PATH or shards.log_path(DB_PATH, SHARDS))
+    return paths
+
+def shard_paths() -> List[str]:
+    """Files holding tickets, notes and actions ([DB_PATH] when unsharded)."""
+    return _paths()[0]
+
+def log_db_path() -> str:
+    """File holding app_logs."""
+    return _paths()[1]
+
+def shard_path(ticket_id: str) -> str:
+    return _paths()[0][shards.shard_of(ticket_id, SHARDS)]
+
+def _tickets_conn(conn: Optional[sqlite3.Connection], ticket_id: str) -> sqlite3.Connection:
+    """Connection for one ticket's rows: the caller's when unsharded, else this thread's handle on its shard."""
+    if SHARDS == 1:
+        return _ensure_conn(conn)
+    return _shard_conns(conn)[shards.shard_of(ticket_id, SHARDS)]
+
+def _shard_conns(conn: Optional[sqlite3.Connection]) -> List[sqlite3.Connection]:
+    """
+    One connection per shard, for scatter-gather reads and per-shard maintenance. A thread opens
+    all of them together, before it can hold any shard's write lock: opening a handle reads the
+    file header, which would otherwise wait on another thread's transaction while holding ours.
+    """
+    if SHARDS == 1:
+        return [_ensure_conn(conn)]
+    return [get_conn(p) for p in shard_paths()]
+
+def logs_conn(conn: Optional[sqlite3.Connection] = None) -> sqlite3.Connection:
+    """Connection for app_logs: the caller's when logs share the main file."""
+    path = log_db_path()
+    if path == DB_PATH:
+        return _ensure_conn(conn)
+    return get_conn(path)
+
+def _check_layout(conn: sqlite3.Connection) -> None:
+    """Refuse to run with a shard count the data wasn't written with (tools.reshard moves it)."""
+    recorded = shards.get_layout(conn, "shards")
+    if recorded is None:
+        if SHARDS == 1:
+            return
+        if conn.execute("SELECT 1 FROM support_tickets LIMIT 1").fetchone():
+            raise RuntimeError(f"{DB_PATH} holds unsharded tickets; run `python -m tools.reshard --to {SHARDS}` "
+                               "before setting SUPPORT_DB_SHARDS")
+        with conn:
+            shards.set_layout(conn, role="main", shards=SHARDS)
+        return
+    if int(recorded) != SHARDS:
+        raise RuntimeError(f"{DB_PATH} is laid out for {recorded} shard(s) but SUPPORT_DB_SHARDS={SHARDS}; "
+                           f"run `python -m tools.reshard --to {SHARDS}` or set SUPPORT_DB_SHARDS={recorded}")
+
+@contextmanager
+def _write(conn: sqlite3.Connection) -> Iterator[sqlite3.Cursor]:
+    """
+    Write transaction for one helper: takes the write lock up front (BEGIN IMMEDIATE) so the
+    time spent waiting for it is measurable, commits on success and rolls back on error.
+    Inside transaction() it just adds its statement to the open unit of work; with shards, the
+    first write to each shard file inside the block enlists that file's connection. A transaction
+    the caller opened implicitly (raw DML outside transaction()) is committed along with the write.
+    """
+    if conn.in_transaction:
+        uow = _UOW.get(id(conn))
+        if uow is not None:
+            uow[0] += 1
+            yield conn.cursor()
+            return
+        try:
+            yield conn.cursor()
+        except BaseException:
+            conn.rollback()
+            _flush_invalidations(conn)
+            raise
+        _commit(conn, statements=1)
+        return
+    scope = getattr(_LOCAL, "uow", None)
+    if scope is not None and _is_pooled(conn) and conn.path in shard_paths():
+        _enlist(conn, scope)
+        _UOW[id(conn)][0] += 1
+        yield conn.cursor()
+        return
+    _begin(conn)
+    try:
+        yield conn.cursor()
+    except BaseException:
+        conn.rollback()
+        _flush_invalidations(conn)
+        raise
+    _commit(conn, statements=1)
+
+def _begin(conn: sqlite3.Connection) -> None:
+    start = time.perf_counter()
+    conn.execute("BEGIN IMMEDIATE")
+    metrics.observe("db.lock_wait", time.perf_counter() - start)
+
+def _commit(conn: sqlite3.Connection, statements: int) -> None:
+    try:
+        conn.commit()
+    finally:
+        _flush_invalidations(conn)
+    metrics.incr("db.commits")
+    metrics.incr("db.statements_committed", statements)  # a counter: histograms are exported as seconds
+    _bump_data_version()
+
+# id(conn) -> [write statements so far, savepoint depth] for connections inside transaction()
+_UOW: Dict[int, List[int]] = {}
+
+@contextmanager
+def transaction(conn: Optional[sqlite3.Connection] = None) -> Iterator[sqlite3.Connection]:
+    """
+    Unit of work: every core.db write inside the block lands in one atomic commit.
+
+        with transaction(conn):
+            append_ticket_note(conn, ...)
+            add_ticket_action_flag(conn, ...)
+            update_ticket_status(conn, ...)
+
+    Any exception rolls the whole block back and propagates. Nested blocks become savepoints,
+    so an inner failure that the caller catches only undoes the inner block's writes.
+    log_event rows written inside are part of the transaction even with async logging on.
+    Commits add their statement count to the `db.statements_committed` counter in core.metrics.
+
+    With SUPPORT_DB_SHARDS > 1 each shard the block writes to joins the unit of work on its
+    first write and they all commit at the end, one after another: atomic per shard, not
+    across shards. Customer and log rows commit on their own as they are written, so no
+    block holds the main or log file's write lock. Two blocks that write the same two shards
+    in opposite orders wait on each other until the busy timeout.
+    """
+    conn = _ensure_conn(conn)
+    if SHARDS > 1:
+        with _sharded_transaction():
+            yield conn
+        return
+    uow = _UOW.get(id(conn))
+    if uow is not None:
+        uow[1] += 1
+        name = f"uow_{uow[1]}"
+        conn.execute(f"SAVEPOINT {name}")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute(f"ROLLBACK TO {name}")
+            conn.execute(f"RELEASE {name}")
+            raise
+        finally:
+            uow[1] -= 1
+        conn.execute(f"RELEASE {name}")
+        return
+    if conn.in_transaction:
+        conn.commit()  # don't fold someone's implicit transaction into this unit of work
+    _begin(conn)
+    uow = _UOW[id(conn)] = [0, 0]
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        _flush_invalidations(conn)
+        metrics.incr("db.rollbacks")
+        raise
+    finally:
+        _UOW.pop(id(conn), None)
+    _commit(conn, statements=uow[0])
+
+def _enlist(conn: sqlite3.Connection, scope: Dict[str, Any]) -> None:
+    """Join `conn` to the thread's sharded unit of work, with savepoints up to its current depth."""
+    if conn.in_transaction:
+        conn.commit()
+    _begin(conn)
+    for depth in range(1, scope["depth"] + 1):
+        conn.execute(f"SAVEPOINT uow_{depth}")
+    _UOW[id(conn)] = [0, scope["depth"]]
+    scope["conns"].append(conn)
+
+@contextmanager
+def _sharded_transaction() -> Iterator[None]:
+    scope = getattr(_LOCAL, "uow", None)
+    if scope is not None:
+        scope["depth"] += 1
+        name = f"uow_{scope['depth']}"
+        enlisted = list(scope["conns"])  # connections enlisted later start with this savepoint already
+        for c in enlisted:
+            c.execute(f"SAVEPOINT {name}")
+        try:
+            yield
+        except BaseException:
+            for c in scope["conns"]:
+                c.execute(f"ROLLBACK TO {name}")
+                c.execute(f"RELEASE {name}")
+            raise
+        finally:
+            scope["depth"] -= 1
+        for c in scope["conns"]:
+            c.execute(f"RELEASE {name}")
+        return
+    scope = _LOCAL.uow = {"depth": 0, "conns": []}
+    try:
+        yield
+    except BaseException:
+        for c in scope["conns"]:
+            c.rollback()
+            _flush_invalidations(c)
+        if scope["conns"]:
+            metrics.incr("db.rollbacks")
+        raise
+    finally:
+        _LOCAL.uow = None
+        counts = [_UOW.pop(id(c), [0, 0])[0] for c in scope["conns"]]
+    for i, (c, statements) in enumerate(zip(scope["conns"], counts)):
+        try:
+            _commit(c, statements=statements)
+        except BaseException:
+            for rest in scope["conns"][i + 1:]:  # files committed so far stay committed
+                rest.rollback()
+                _flush_invalidations(rest)
+            raise
+
+def _in_transaction(conn: sqlite3.Connection) -> bool:
+    return conn.in_transaction or getattr(_LOCAL, "uow", None) is not None
+
+# ---------- Ticket cache (core.ticket_cache) ----------
+
+# id(conn) -> invalidations made inside its open transaction, repeated once it commits or rolls back
+_PENDING_INVALIDATIONS: Dict[int, List[Tuple[List[Tuple[Any, ...]], Tuple[str, ...]]]] = {}
+
+def _invalidate(conn: sqlite3.Connection, keys: Iterable[Tuple[Any, ...]] = (), kinds: Tuple[str, ...] = ()) -> None:
+    """
+    Drop cached entries a write is about to change. Called inside the write transaction, and
+    repeated after it ends, so no reader can cache the pre-commit value in between.
+    """
+    keys = list(keys)
+    ticket_cache.get_ticket_cache().invalidate(keys, kinds)
+    if conn.in_transaction:
+        _PENDING_INVALIDATIONS.setdefault(id(conn), []).append((keys, kinds))
+
+def _flush_invalidations(conn: sqlite3.Connection) -> None:
+    pending = _PENDING_INVALIDATIONS.pop(id(conn), None)
+    if pending:
+        cache = ticket_cache.get_ticket_cache()
+        for keys, kinds in pending:
+            cache.invalidate(keys, kinds)
+
+def _poll_foreign_commits(conn: sqlite3.Connection, cache: ticket_cache.TicketCache) -> None:
+    """Cross-process channel: clear the cache when PRAGMA data_version shows another connection committed."""
+    now = time.monotonic()
+    if not _is_pooled(conn) or now - conn.cache_polled_at < ticket_cache.POLL_SECONDS:
+        return
+    conn.cache_polled_at = now
+    seen = int(conn.execute("PRAGMA data_version").fetchone()[0])
+    if conn.cache_seen_version != seen:
+        # also clears on a handle's first poll: it has no baseline to compare against
+        metrics.incr("ticket_cache.foreign_commits")
+        cache.clear()
+        conn.cache_seen_version = seen
+
+def _cached(conn: sqlite3.Connection, key: Tuple[Any, ...], load, store=lambda value: True) -> Any:
+    """Read-through lookup: `load()` on a miss, cached unless `store(value)` says no or we are mid-transaction."""
+    if not ticket_cache.enabled():
+        return load()
+    cache = ticket_cache.get_ticket_cache()
+    if ticket_cache.POLL_SECONDS > 0:
+        for c in ([conn] if SHARDS == 1 else [get_conn(), *_shard_conns(None)]):
+            _poll_foreign_commits(c, cache)
+    value = cache.get(key)
+    if value is not ticket_cache.MISS:
+        return value
+    generation = cache.generation
+    value = load()
+    if not _in_transaction(conn) and store(value):  # never publish uncommitted rows to other threads
+        cache.put(key, value, generation)
+    return value
+
+def _bump_data_version() -> None:
+    global _DATA_VERSION
+    with _VERSION_LOCK:
+        _DATA_VERSION += 1
+
+def data_version(conn: Optional[sqlite3.Connection] = None) -> int:
+    """
+    Monotonic counter that moves whenever the database may have changed: every core.db write
+    bumps it, and commits from other connections or processes (async log writer, batch CLI,
+    archiver) are picked up through SQLite's PRAGMA data_version. Cheap enough to call on
+    every rerun; use it as a cache key for query results. With shards, every file is checked.
+    """
+    conn = _ensure_conn(conn)
+    conns = [conn] if SHARDS == 1 else [conn, *_shard_conns(conn), logs_conn(conn)]
+    for c in conns:
+        seen = int(c.execute("PRAGMA data_version").fetchone()[0])
+        if _is_pooled(c) and c.seen_data_version != seen:
+            # also bumps the first time a handle is seen: it has no baseline to compare against
+            _bump_data_version()
+            c.seen_data_version = seen
+    return _DATA_VERSION
 
 def init_db() -> sqlite3.Connection:
-    """Backwards-compatible: ensure DB exists and return a live connection."""
-    return get_conn()
+    """Backwards-compatible: ensure DB exists (with its shard and log files) and return a live connection."""
+    conn = get_conn()
+    if SHARDS > 1:
+        _shard_conns(conn)
+        logs_conn(conn)
+    return conn
 
 def _init_db(conn: sqlite3.Connection) -> None:
-    cur = conn.cursor()
-    # support_tickets table
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS support_tickets (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        ticket_id TEXT UNIQUE,
-        customer_name TEXT,
-        description TEXT,
-        status TEXT DEFAULT 'Open',
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )
-    """)
-    # app_logs table
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS app_logs (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        ts TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        level TEXT,
-        agent TEXT,
-        event TEXT,
-        details TEXT
-    )
-    """)
-    conn.commit()
+    migrate(conn)
 
 def _ensure_conn(conn: Optional[sqlite3.Connection]) -> sqlite3.Connection:
     if conn is None or not hasattr(conn, "cursor"):
@@ -54,22 +501,31 @@ def _ensure_conn(conn: Optional[sqlite3.Connection]) -> sqlite3.Connection:
 
 # ---------- Tickets ----------
 
-def insert_ticket(conn: Optional[sqlite3.Connection], *, ticket_id: str, customer_name: str, description: str, status: str = "Open") -> None:
+@tracing.traced("db.insert_ticket")
+def insert_ticket(conn: Optional[sqlite3.Connection], *, ticket_id: str, customer_name: str, description: str, status: str = "Open",
+                  customer_id: Optional[int] = None, phone: Optional[str] = None) -> None:
+    """Insert a ticket linked to its customer (resolved from name/phone, created if new, unless customer_id is given)."""
     conn = _ensure_conn(conn)
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT INTO support_tickets (ticket_id, customer_name, description, status) VALUES (?, ?, ?, ?)",
-        (ticket_id, customer_name, description, status),
-    )
-    conn.commit()
+    shard = _tickets_conn(conn, ticket_id)
+    if customer_id is None and shard is not conn:
+        customer_id = _main_customer_id(conn, customer_name, phone)
+    with _write(shard) as cur:
+        if customer_id is None:
+            customer_id = upsert_customer(cur, customer_name, phone)
+        cur.execute(
+            "INSERT INTO support_tickets (ticket_id, customer_name, description, status, customer_id) VALUES (?, ?, ?, ?, ?)",
+            (ticket_id, customer_name, description, status, customer_id),
+        )
+        _invalidate(shard, [("ticket", ticket_id), ("open", customer_id)])
 
+@tracing.traced("db.get_ticket")
 def get_ticket(*args, **kwargs) -> Optional[Dict[str, Any]]:
     """
     Backward-compatible getter:
       - get_ticket(ticket_id)
       - get_ticket(conn, ticket_id)
       - get_ticket(conn=<conn>, ticket_id=<id>)
-    Returns a dict or None.
+    Returns a dict or None. Reads through core.ticket_cache; unknown ids are cached as None.
     """
     if len(args) == 1 and not kwargs:
         conn = get_conn()
@@ -81,11 +537,16 @@ def get_ticket(*args, **kwargs) -> Optional[Dict[str, Any]]:
         # kwargs route
         conn = _ensure_conn(kwargs.get("conn"))
         ticket_id = kwargs["ticket_id"]
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM support_tickets WHERE ticket_id = ?", (ticket_id,))
-    row = cur.fetchone()
-    return dict(row) if row else None
+    conn = _tickets_conn(conn, ticket_id)
 
+    def load() -> Optional[Dict[str, Any]]:
+        row = conn.execute("SELECT * FROM support_tickets WHERE ticket_id = ?", (ticket_id,)).fetchone()
+        return dict(row) if row else None
+
+    rec = _cached(conn, ("ticket", ticket_id), load)
+    return dict(rec) if rec else None  # callers may mutate their copy
+
+@tracing.traced("db.list_tickets")
 def list_tickets(*args, **kwargs) -> List[Dict[str, Any]]:
     """
     Backward-compatible lister:
@@ -114,116 +575,701 @@ def list_tickets(*args, **kwargs) -> List[Dict[str, Any]]:
         conn = _ensure_conn(kwargs["conn"])
     if "limit" in kwargs:
         limit = int(kwargs["limit"])
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM support_tickets ORDER BY created_at DESC LIMIT ?", (limit,))
-    return [dict(r) for r in cur.fetchall()]
+    rows: List[Dict[str, Any]] = []
+    for shard in _shard_conns(conn):
+        cur = shard.cursor()
+        cur.execute("SELECT * FROM support_tickets ORDER BY created_at DESC, id DESC LIMIT ?", (limit,))
+        rows += [dict(r) for r in cur.fetchall()]
+    if SHARDS > 1:
+        rows.sort(key=lambda r: (r["created_at"], r["id"]), reverse=True)
+    return rows[:limit]
 
 # ---------- Logs ----------
 
+def enable_async_logging(**options) -> BufferedLogWriter:
+    """
+    Route log_event rows for the default database through a BufferedLogWriter.
+    Options: batch_size, flush_interval_ms, max_queue, overflow ('block' | 'drop_debug' | 'spill'), spill_path.
+    """
+    global _LOG_WRITER
+    logs_conn()  # make sure app_logs exists before the writer thread starts
+    if _LOG_WRITER is not None:
+        _LOG_WRITER.close()
+    _LOG_WRITER = BufferedLogWriter(log_db_path(), **options)
+    return _LOG_WRITER
+
+def disable_async_logging() -> None:
+    """Flush and stop the async writer; log_event goes back to synchronous commits."""
+    global _LOG_WRITER
+    if _LOG_WRITER is not None:
+        _LOG_WRITER.close()
+        _LOG_WRITER = None
+
+def flush_logs(timeout: Optional[float] = None) -> bool:
+    """Wait until queued log rows are committed (no-op when logging is synchronous)."""
+    return _LOG_WRITER.flush(timeout) if _LOG_WRITER is not None else True
+
+def _async_logging_from_env() -> None:
+    if os.getenv("SUPPORT_LOG_ASYNC", "").strip().lower() not in ("1", "true", "yes"):
+        return
+    enable_async_logging(
+        batch_size=int(os.getenv("SUPPORT_LOG_BATCH", "100")),
+        flush_interval_ms=int(os.getenv("SUPPORT_LOG_FLUSH_MS", "250")),
+        max_queue=int(os.getenv("SUPPORT_LOG_QUEUE", "10000")),
+        overflow=os.getenv("SUPPORT_LOG_OVERFLOW", "block"),
+        spill_path=os.getenv("SUPPORT_LOG_SPILL_PATH") or None,
+    )
+
+def _log_archiver_from_env() -> None:
+    from core.log_retention import _archiver_from_env  # local import: log_retention reads through core.db
+    _archiver_from_env()
+
+@tracing.traced("db.log_event")
 def log_event(*args, **kwargs) -> None:
     """
     Backward-compatible logger:
       - log_event(conn, level=..., agent=..., event=..., details=...)
       - log_event(level=..., agent=..., event=..., details=...)   # conn-less
+    Rows for the default database go through the async writer when it is enabled.
+    With shards, rows go to the log file (see logs_conn) and commit on their own.
     """
     if args and hasattr(args[0], "cursor"):
-        conn = _ensure_conn(args[0])
+        conn = logs_conn(args[0])
     else:
-        conn = get_conn()
+        conn = logs_conn()
     level = kwargs.get("level", "INFO")
     agent = kwargs.get("agent", "App")
     event = kwargs.get("event", "")
     details = kwargs.get("details", {})
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT INTO app_logs (level, agent, event, details) VALUES (?, ?, ?, ?)",
-        (level, agent, event, json.dumps(details or {})),
-    )
-    conn.commit()
+    trace_id = kwargs.get("trace_id") or tracing.current_trace_id()
+    if _LOG_WRITER is not None and _is_pooled(conn) and id(conn) not in _UOW:
+        _LOG_WRITER.submit(level, agent, event, details, trace_id)
+        return
+    with _write(conn) as cur:
+        cur.execute(
+            "INSERT INTO app_logs (level, agent, event, details, trace_id) VALUES (?, ?, ?, ?, ?)",
+            (level, agent, event, json.dumps(details or {}), trace_id),
+        )
 
+@tracing.traced("db.list_logs")
 def list_logs(conn: Optional[sqlite3.Connection], limit: int = 200):
-    conn = _ensure_conn(conn)
+    conn = logs_conn(conn)
+    flush_logs(timeout=2.0)
     cur = conn.cursor()
-    cur.execute("SELECT * FROM app_logs ORDER BY ts DESC LIMIT ?", (limit,))
+    cur.execute("SELECT * FROM app_logs ORDER BY ts DESC, id DESC LIMIT ?", (limit,))
     return [dict(r) for r in cur.fetchall()]
 
+# ---------- Keyset pagination & delta fetch ----------
+
+Cursor = Tuple[str, int]  # (created_at | ts, id) of the last row on the previous page
+
+def _filters(clauses: List[str], params: List[Any], column: str, value: Any) -> None:
+    """Append `column = ?` or `column IN (...)` for a scalar or sequence filter (None = no filter)."""
+    if value is None:
+        return
+    if isinstance(value, str):
+        clauses.append(f"{column} = ?")
+        params.append(value)
+        return
+    values = list(value)
+    if not values:
+        return
+    clauses.append(f"{column} IN ({', '.join('?' * len(values))})")
+    params.extend(values)
+
+def _page(conn: Optional[sqlite3.Connection], table: str, sort_col: str, clauses: List[str], params: List[Any],
+          cursor: Optional[Cursor], since: Optional[str], until: Optional[str],
+          limit: int) -> Tuple[List[Dict[str, Any]], Optional[Cursor]]:
+    conn = _ensure_conn(conn)
+    clauses, params = list(clauses), list(params)
+    if since is not None:
+        clauses.append(f"{sort_col} >= ?")
+        params.append(since)
+    if until is not None:
+        clauses.append(f"{sort_col} < ?")
+        params.append(until)
+    if cursor is not None:
+        clauses.append(f"({sort_col}, id) < (?, ?)")
+        params.extend([cursor[0], int(cursor[1])])
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    rows = conn.execute(
+        f"SELECT * FROM {table} {where} ORDER BY {sort_col} DESC, id DESC LIMIT ?",
+        (*params, int(limit)),
+    ).fetchall()
+    out = [dict(r) for r in rows]
+    next_cursor = (out[-1][sort_col], out[-1]["id"]) if len(out) == limit else None
+    return out, next_cursor
+
+@tracing.traced("db.page_tickets")
+def page_tickets(conn: Optional[sqlite3.Connection] = None, *, cursor: Optional[Cursor] = None, limit: int = 50,
+                 status: Any = None, customer_name: Optional[str] = None,
+                 since: Optional[str] = None, until: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[Cursor]]:
+    """
+    One page of tickets, newest first, keyed on (created_at, id) so every page costs the same.
+    Pass the returned cursor back for the next (older) page; it is None on the last page.
+    status may be a string or a list; since/until bound created_at ('YYYY-MM-DD[ HH:MM:SS]').
+    With shards, each shard returns its own next `limit` rows after the cursor and the pages merge.
+    """
+    clauses: List[str] = []
+    params: List[Any] = []
+    _filters(clauses, params, "status", status)
+    _filters(clauses, params, "customer_name", customer_name)
+    if SHARDS == 1:
+        return _page(conn, "support_tickets", "created_at", clauses, params, cursor, since, until, limit)
+    rows: List[Dict[str, Any]] = []
+    for shard in _shard_conns(conn):
+        rows += _page(shard, "support_tickets", "created_at", clauses, params, cursor, since, until, limit)[0]
+    rows.sort(key=lambda r: (r["created_at"], r["id"]), reverse=True)
+    out = rows[:limit]
+    return out, ((out[-1]["created_at"], out[-1]["id"]) if len(out) == limit else None)
+
+@tracing.traced("db.page_logs")
+def page_logs(conn: Optional[sqlite3.Connection] = None, *, cursor: Optional[Cursor] = None, limit: int = 50,
+              level: Any = None, agent: Any = None, trace_id: Optional[str] = None,
+              since: Optional[str] = None, until: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[Cursor]]:
+    """page_tickets for app_logs, keyed on (ts, id); level/agent may be strings or lists."""
+    flush_logs(timeout=2.0)
+    clauses: List[str] = []
+    params: List[Any] = []
+    _filters(clauses, params, "level", level)
+    _filters(clauses, params, "agent", agent)
+    _filters(clauses, params, "trace_id", trace_id)
+    return _page(logs_conn(conn), "app_logs", "ts", clauses, params, cursor, since, until, limit)
+
+@tracing.traced("db.tickets_since")
+def tickets_since(conn: Optional[sqlite3.Connection] = None, *, last_id: Union[int, Mapping[int, int]] = 0,
+                  updated_since: Optional[str] = None, limit: int = 1000, status: Any = None) -> List[Dict[str, Any]]:
+    """
+    Delta fetch: tickets with id > last_id, plus (when updated_since is given) tickets changed at or
+    after that time. Callers merge by id, so re-seeing a row from the same second is harmless.
+    With shards, pass last_id as {shard: last id seen there} (see max_row_ids); an int applies to every shard.
+    """
+    rows: List[Dict[str, Any]] = []
+    for i, shard in enumerate(_shard_conns(conn)):
+        floor = last_id.get(i, 0) if isinstance(last_id, Mapping) else last_id
+        rows += _tickets_since(shard, floor, updated_since, limit, status)
+    if SHARDS > 1:
+        rows.sort(key=lambda r: r["id"])
+    return rows[:limit]
+
+def _tickets_since(conn: sqlite3.Connection, last_id: int, updated_since: Optional[str], limit: int,
+                   status: Any) -> List[Dict[str, Any]]:
+    extra: List[str] = []
+    extra_params: List[Any] = []
+    _filters(extra, extra_params, "status", status)
+    cond = "".join(f" AND {c}" for c in extra)
+    sql = f"SELECT * FROM support_tickets WHERE id > ?{cond}"
+    params: List[Any] = [int(last_id), *extra_params]
+    if updated_since is not None:
+        # UNION keeps both halves on an index (rowid / idx_tickets_updated) instead of a full scan
+        sql += f" UNION SELECT * FROM support_tickets WHERE updated_at >= ?{cond}"
+        params += [updated_since, *extra_params]
+    rows = conn.execute(f"{sql} ORDER BY id LIMIT ?", (*params, int(limit))).fetchall()
+    return [dict(r) for r in rows]
+
+@tracing.traced("db.logs_since")
+def logs_since(conn: Optional[sqlite3.Connection] = None, *, last_id: int = 0, limit: int = 1000,
+               level: Any = None, agent: Any = None) -> List[Dict[str, Any]]:
+    """Delta fetch for the append-only log table: rows with id > last_id, oldest first."""
+    flush_logs(timeout=2.0)
+    conn = logs_conn(conn)
+    clauses = ["id > ?"]
+    params: List[Any] = [int(last_id)]
+    _filters(clauses, params, "level", level)
+    _filters(clauses, params, "agent", agent)
+    rows = conn.execute(
+        f"SELECT * FROM app_logs WHERE {' AND '.join(clauses)} ORDER BY id LIMIT ?",
+        (*params, int(limit)),
+    ).fetchall()
+    return [dict(r) for r in rows]
+
+def max_row_ids(conn: Optional[sqlite3.Connection] = None, kind: str = "tickets") -> Dict[int, int]:
+    """High-water marks for tickets_since / logs_since: {shard: MAX(id)} for tickets, {0: MAX(id)} for logs."""
+    if kind == "logs":
+        flush_logs(timeout=2.0)
+        return {0: int(logs_conn(conn).execute("SELECT COALESCE(MAX(id), 0) FROM app_logs").fetchone()[0])}
+    return {i: int(shard.execute("SELECT COALESCE(MAX(id), 0) FROM support_tickets").fetchone()[0])
+            for i, shard in enumerate(_shard_conns(conn))}
+
+# ---------- Full-text search ----------
+
+_FTS_TERMS = re.compile(r'"([^"]*)"|(\w+)')
+
+def _fts_query(text: str, prefix: bool) -> Optional[str]:
+    """
+    User text → FTS5 MATCH expression: words are ANDed, "quoted text" stays a phrase, and with
+    `prefix` a trailing bare word matches as a prefix (search-as-you-type; prefix scans cost more
+    than exact terms, so only the word being typed gets one). Operators and punctuation are plain text.
+    """
+    parts: List[str] = []
+    for phrase, word in _FTS_TERMS.findall(text or ""):
+        words = re.findall(r"\w+", phrase) if phrase else [word]
+        if words:
+            parts.append('"' + " ".join(words) + '"')
+    if not parts:
+        return None
+    if prefix and not text.rstrip().endswith('"'):
+        parts[-1] += "*"
+    return " ".join(parts)
+
+def _rank_floor(conn: sqlite3.Connection, fts: str, match: str) -> int:
+    """Lowest rowid among the newest SEARCH_RANK_WINDOW matches (0 = rank them all)."""
+    if SEARCH_RANK_WINDOW <= 0:
+        return 0
+    row = conn.execute(f"SELECT rowid FROM {fts} WHERE {fts} MATCH ? ORDER BY rowid DESC LIMIT 1 OFFSET ?",
+                       (match, SEARCH_RANK_WINDOW - 1)).fetchone()
+    return row[0] if row else 0
+
+def has_search_index(conn: Optional[sqlite3.Connection] = None) -> bool:
+    return all(_has_search_index(shard) for shard in _shard_conns(conn))
+
+def _has_search_index(conn: sqlite3.Connection) -> bool:
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'tickets_fts'").fetchone() is not None
+
+@tracing.traced("db.search_tickets")
+def search_tickets(conn: Optional[sqlite3.Connection] = None, query: str = "", *, limit: int = 20, offset: int = 0,
+                   status: Any = None, notes: bool = True, prefix: bool = True,
+                   highlight: Tuple[str, str] = ("**", "**")) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+    """
+    Tickets whose description (or, with `notes`, any follow-up note) matches `query`, best bm25
+    score first. Each row is the ticket plus `score` (lower is better), `matched`
+    ('description' | 'note') and `snippet` with hits wrapped in `highlight`.
+    Returns (rows, next_offset); next_offset is None on the last page. bm25 costs a few
+    microseconds per hit, so only the newest SEARCH_RANK_WINDOW matches of each index are ranked.
+    Without FTS5 this degrades to an unranked LIKE scan, newest first.
+    With shards, each shard answers the first offset+limit rows and the lists merge in that order.
+    """
+    conn = _ensure_conn(conn)
+    match = _fts_query(query, prefix)
+    if match is None:
+        return [], None
+    if SHARDS == 1:
+        return _search_shard(conn, query, match, limit=limit, offset=offset, status=status, notes=notes,
+                             highlight=highlight)
+    want = int(offset) + int(limit)
+    rows: List[Dict[str, Any]] = []
+    more = False
+    for shard in _shard_conns(conn):
+        part, next_offset = _search_shard(shard, query, match, limit=want, offset=0, status=status, notes=notes,
+                                          highlight=highlight)
+        rows += part
+        more = more or next_offset is not None
+    if any(r["score"] is None for r in rows):  # LIKE fallback on some shard: no comparable scores
+        rows.sort(key=lambda r: (r["created_at"], r["id"]), reverse=True)
+    else:
+        rows.sort(key=lambda r: (r["score"], r["id"]))
+    return rows[int(offset):want], (want if more or len(rows) > want else None)
+
+def _search_shard(conn: sqlite3.Connection, query: str, match: str, *, limit: int, offset: int, status: Any,
+                  notes: bool, highlight: Tuple[str, str]) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+    if not _has_search_index(conn):
+        return _search_like(conn, query, limit=limit, offset=offset, status=status, notes=notes)
+    # Top-k per index by bm25, merged per ticket on its best
+    # hit: a ticket in the overall top k is necessarily in the top k of the index it scored in.
+    k = int(offset) + int(limit) + 1
+    clauses: List[str] = []
+    status_params: List[Any] = []
+    _filters(clauses, status_params, "t.status", status)
+    cond = "".join(f" AND {c}" for c in clauses)
+    best: Dict[int, Tuple[float, str, int]] = {}  # ticket id -> (score, matched, fts rowid)
+
+    def merge(hits: Iterable[Tuple[int, float, int]], matched: str) -> int:
+        seen = set()
+        for tid, score, src in hits:
+            seen.add(tid)
+            if tid not in best or score < best[tid][0]:
+                best[tid] = (score, matched, src)
+        return len(seen)
+
+    join = " JOIN support_tickets t ON t.id = f.rowid" if clauses else ""
+    merge(conn.execute(
+        f"SELECT f.rowid, bm25(tickets_fts) AS score, f.rowid FROM tickets_fts f{join} "
+        f"WHERE tickets_fts MATCH ? AND f.rowid >= ?{cond} ORDER BY score LIMIT ?",
+        (match, _rank_floor(conn, "tickets_fts", match), *status_params, k)), "description")
+    if notes:
+        sql = ("SELECT t.id, bm25(notes_fts) AS score, f.rowid FROM notes_fts f JOIN ticket_notes n ON n.id = f.rowid "
+               f"JOIN support_tickets t ON t.ticket_id = n.ticket_id WHERE notes_fts MATCH ? AND f.rowid >= ?{cond} "
+               f"ORDER BY score")
+        params = (match, _rank_floor(conn, "notes_fts", match), *status_params)
+        cap = 4 * k  # a ticket can have several matching notes; overfetch, and go unbounded only if that was short
+        hits = conn.execute(f"{sql} LIMIT ?", (*params, cap)).fetchall()
+        if len(hits) == cap and len({h[0] for h in hits}) < k:
+            hits = conn.execute(sql, params).fetchall()
+        merge(hits, "note")
+
+    ranked = sorted(best.items(), key=lambda kv: (kv[1][0], kv[0]))[int(offset):k]
+    page = ranked[:limit]
+    if not page:
+        return [], None
+    tickets = {r["id"]: dict(r) for r in conn.execute(
+        f"SELECT * FROM support_tickets WHERE id IN ({', '.join('?' * len(page))})", [tid for tid, _ in page])}
+    out: List[Dict[str, Any]] = []
+    for tid, (score, matched, src) in page:
+        row = tickets[tid]
+        row.update(score=score, matched=matched, snippet=None, _src=src)
+        out.append(row)
+    # snippets are costly, so they are built only for the rows on this page
+    opened, closed = highlight
+    for matched, fts in (("description", "tickets_fts"), ("note", "notes_fts")):
+        src = {r["_src"]: r for r in out if r["matched"] == matched}
+        if src:
+            for rowid, snip in conn.execute(
+                f"SELECT rowid, snippet({fts}, 0, ?, ?, '…', 12) FROM {fts} "
+                f"WHERE {fts} MATCH ? AND rowid IN ({', '.join('?' * len(src))})",
+                (opened, closed, match, *src),
+            ):
+                src[rowid]["snippet"] = snip
+    for r in out:
+        del r["_src"]
+    return out, (offset + limit if len(ranked) > limit else None)
+
+def _search_like(conn: sqlite3.Connection, query: str, *, limit: int, offset: int, status: Any,
+                 notes: bool) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+    metrics.incr("db.search_like_fallback")
+    clauses: List[str] = []
+    params: List[Any] = []
+    for word in re.findall(r"\w+", query):
+        pattern = f"%{word}%"
+        if notes:
+            clauses.append("(t.description LIKE ? OR EXISTS (SELECT 1 FROM ticket_notes n "
+                           "WHERE n.ticket_id = t.ticket_id AND n.note LIKE ?))")
+            params += [pattern, pattern]
+        else:
+            clauses.append("t.description LIKE ?")
+            params.append(pattern)
+    _filters(clauses, params, "t.status", status)
+    rows = conn.execute(
+        f"SELECT t.*, NULL AS score, NULL AS matched, substr(t.description, 1, 120) AS snippet "
+        f"FROM support_tickets t WHERE {' AND '.join(clauses)} ORDER BY t.created_at DESC, t.id DESC LIMIT ? OFFSET ?",
+        (*params, int(limit) + 1, int(offset)),
+    ).fetchall()
+    out = [dict(r) for r in rows[:limit]]
+    return out, (offset + limit if len(rows) > limit else None)
+
+@tracing.traced("db.rebuild_search_index")
+def rebuild_search_index(conn: Optional[sqlite3.Connection] = None, *, optimize: bool = True) -> Dict[str, int]:
+    """
+    Recreate missing FTS tables/triggers and re-index every row from the base tables (after a
+    restore, bulk load with triggers dropped, or suspected drift). Returns rows indexed per table,
+    summed over shards.
+    """
+    counts: Dict[str, int] = {fts: 0 for fts in SEARCH_INDEXES}
+    for shard in _shard_conns(conn):
+        with _write(shard) as cur:
+            if not create_search_index(cur):
+                raise RuntimeError("this SQLite build has no FTS5 support")
+            for fts, (table, _column) in SEARCH_INDEXES.items():
+                cur.execute(f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')")
+                if optimize:
+                    cur.execute(f"INSERT INTO {fts} ({fts}) VALUES ('optimize')")  # merge b-tree segments
+                counts[fts] += cur.execute(f"SELECT count(*) FROM {table}").fetchone()[0]
+    return counts
+
+def check_search_index(conn: Optional[sqlite3.Connection] = None) -> Dict[str, Optional[str]]:
+    """FTS5 integrity-check of each index against its content table: None if consistent, else the error."""
+    out: Dict[str, Optional[str]] = {fts: None for fts in SEARCH_INDEXES}
+    shard_list = _shard_conns(conn)
+    for shard in shard_list:
+        for fts in SEARCH_INDEXES:
+            try:
+                with _write(shard) as cur:
+                    cur.execute(f"INSERT INTO {fts} ({fts}, rank) VALUES ('integrity-check', 1)")
+            except sqlite3.DatabaseError as e:
+                if out[fts] is None:
+                    out[fts] = str(e) if len(shard_list) == 1 else f"{shard.path}: {e}"
+    return out
+
 # ---------- Helpers ----------
 
-def find_open_ticket_by_customer(conn: Optional[sqlite3.Connection], customer_name: str) -> Optional[Tuple[str, str]]:
+@tracing.traced("db.find_open_ticket_by_customer")
+def find_open_ticket_by_customer(conn: Optional[sqlite3.Connection], customer_name: str, *,
+                                 phone: Optional[str] = None, customer_id: Optional[int] = None) -> Optional[Tuple[str, str]]:
     """
-    Return the most recent open/in-progress ticket for a customer name as (ticket_id, status),
-    or None if none exists.
+    Return the most recent open/in-progress ticket for a customer as (ticket_id, status), or None.
+    The customer is customer_id, else resolved from phone or normalized name (see find_customer),
+    so "Alex Chen", "alex chen " and "Alex  Chen" share tickets. Two index probes, no scan;
+    repeat lookups are served from core.ticket_cache.
     """
-    if not (customer_name or "").strip():
+    conn = _ensure_conn(conn)
+    if customer_id is None:
+        phone_key, name_key = customer_phone_key(phone or ""), customer_name_key(customer_name or "")
+
+        def load_customer() -> Optional[Dict[str, Any]]:
+            return find_customer(conn, name=customer_name, phone=phone)
+
+        # Only mappings that can't change later are cached: a phone match (phones are never
+        # reassigned) or a name-only lookup. A name match for an unknown phone is not, since
+        # that phone may be recorded on a different customer afterwards.
+        customer = _cached(conn, ("customer", phone_key, name_key), load_customer,
+                           store=lambda c: c is not None and (not phone_key or c["phone"] == phone_key))
+        if customer is None:
+            return None
+        customer_id = customer["id"]
+
+    def load() -> Optional[Tuple[str, str]]:
+        rows = [row for shard in _shard_conns(conn) for row in shard.execute(
+            """
+            SELECT ticket_id, status, created_at
+            FROM support_tickets
+            WHERE customer_id = ?
+              AND status IN ('Open', 'In-Progress')
+            ORDER BY created_at DESC
+            LIMIT 1
+            """,
+            (customer_id,),
+        ).fetchall()]
+        row = max(rows, key=lambda r: r["created_at"], default=None)  # newest across shards
+        return (row["ticket_id"], row["status"]) if row else None
+
+    return _cached(conn, ("open", customer_id), load)
+
+# ---------- Customers ----------
+
+@tracing.traced("db.find_customer")
+def find_customer(conn: Optional[sqlite3.Connection] = None, *, name: Optional[str] = None,
+                  phone: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    Customer row by phone (digits only, 10+) or normalized name; the phone wins when both are given
+    and match different customers. Blank and placeholder names ("Customer", "Unknown") match nobody.
+    """
+    conn = _ensure_conn(conn)
+    phone_key, name_key = customer_phone_key(phone or ""), customer_name_key(name or "")
+    row = None
+    if phone_key:
+        row = conn.execute("SELECT * FROM customers WHERE phone = ?", (phone_key,)).fetchone()
+    if row is None and name_key:
+        row = conn.execute("SELECT * FROM customers WHERE name_key = ?", (name_key,)).fetchone()
+    return dict(row) if row else None
+
+@tracing.traced("db.resolve_customer")
+def resolve_customer(conn: Optional[sqlite3.Connection] = None, *, name: Optional[str] = None,
+                     phone: Optional[str] = None) -> Optional[int]:
+    """find_customer, creating the customer when unknown (and recording a new phone on a name match)."""
+    conn = _ensure_conn(conn)
+    with _write(conn) as cur:
+        return upsert_customer(cur, name, phone)
+
+def _main_customer_id(conn: sqlite3.Connection, name: Optional[str], phone: Optional[str]) -> Optional[int]:
+    """
+    upsert_customer against the main file for a sharded ticket write. Known customers are a plain
+    read, so the common case never takes the main file's write lock.
+    """
+    found = find_customer(conn, name=name, phone=phone)
+    if found is not None and not (customer_phone_key(phone or "") and found["phone"] is None):
+        return found["id"]
+    if not (customer_name_key(name or "") or customer_phone_key(phone or "")):
         return None
+    with _write(conn) as cur:
+        return upsert_customer(cur, name, phone)
+
+@tracing.traced("db.link_customers")
+def link_customers(conn: Optional[sqlite3.Connection] = None) -> int:
+    """Attach tickets written without a customer_id (raw SQL, imports) to their customers."""
     conn = _ensure_conn(conn)
-    cur = conn.cursor()
-    cur.execute(
-        """
-        SELECT ticket_id, status
-        FROM support_tickets
-        WHERE customer_name = ?
-          AND status IN ('Open', 'In-Progress')
-        ORDER BY created_at DESC
-        LIMIT 1
-        """,
-        (customer_name,),
-    )
-    row = cur.fetchone()
-    return (row["ticket_id"], row["status"]) if row else None
+    linked = 0
+    for shard in _shard_conns(conn):
+        if shard is conn:
+            with _write(conn) as cur:
+                linked += link_ticket_customers(cur)
+            continue
+        # customers commit first, so a failed shard write leaves unused customers, never dangling ids
+        with _write(shard) as cur, _write(conn) as customers:
+            linked += link_ticket_customers(cur, customers)
+    if linked:
+        _invalidate(conn, kinds=("ticket", "open"))
+    return linked
 
 # ---------- Follow-up: ensure tables exist ----------
 
 def _ensure_followup_tables(conn: Optional[sqlite3.Connection]) -> None:
-    conn = _ensure_conn(conn)
-    cur = conn.cursor()
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS ticket_notes (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            ticket_id TEXT NOT NULL,
-            author TEXT DEFAULT 'customer',
-            note TEXT NOT NULL,
-            ts DATETIME DEFAULT CURRENT_TIMESTAMP
-        );
-    """)
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS ticket_actions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            ticket_id TEXT NOT NULL,
-            action TEXT NOT NULL,
-            ts DATETIME DEFAULT CURRENT_TIMESTAMP
-        );
-    """)
-    conn.commit()
+    """Kept for callers that used it directly; the tables now come from core.migrations."""
+    migrate(_ensure_conn(conn))
 
 # ---------- Follow-up helpers ----------
 
+@tracing.traced("db.append_ticket_note")
 def append_ticket_note(conn: Optional[sqlite3.Connection], *, ticket_id: str, note: str, author: str = "customer") -> None:
-    conn = _ensure_conn(conn)
-    _ensure_followup_tables(conn)
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT INTO ticket_notes (ticket_id, author, note) VALUES (?, ?, ?)",
-        (ticket_id, author, note),
-    )
-    conn.commit()
+    conn = _tickets_conn(conn, ticket_id)
+    with _write(conn) as cur:
+        cur.execute(
+            "INSERT INTO ticket_notes (ticket_id, author, note) VALUES (?, ?, ?)",
+            (ticket_id, author, note),
+        )
 
+@tracing.traced("db.add_ticket_action_flag")
 def add_ticket_action_flag(conn: Optional[sqlite3.Connection], *, ticket_id: str, action: str) -> None:
-    conn = _ensure_conn(conn)
-    _ensure_followup_tables(conn)
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT INTO ticket_actions (ticket_id, action) VALUES (?, ?)",
-        (ticket_id, action),
-    )
-    conn.commit()
+    conn = _tickets_conn(conn, ticket_id)
+    with _write(conn) as cur:
+        cur.execute(
+            "INSERT INTO ticket_actions (ticket_id, action) VALUES (?, ?)",
+            (ticket_id, action),
+        )
+
+@tracing.traced("db.get_ticket_notes")
+def get_ticket_notes(conn: Optional[sqlite3.Connection], ticket_id: str) -> List[Dict[str, Any]]:
+    """A ticket's follow-up notes, oldest first."""
+    rows = _tickets_conn(conn, ticket_id).execute(
+        "SELECT * FROM ticket_notes WHERE ticket_id = ? ORDER BY id", (ticket_id,)).fetchall()
+    return [dict(r) for r in rows]
 
+@tracing.traced("db.get_ticket_actions")
+def get_ticket_actions(conn: Optional[sqlite3.Connection], ticket_id: str) -> List[Dict[str, Any]]:
+    """A ticket's action flags, oldest first."""
+    rows = _tickets_conn(conn, ticket_id).execute(
+        "SELECT * FROM ticket_actions WHERE ticket_id = ? ORDER BY id", (ticket_id,)).fetchall()
+    return [dict(r) for r in rows]
+
+@tracing.traced("db.update_ticket_status")
 def update_ticket_status(conn: Optional[sqlite3.Connection], *, ticket_id: str, status: str) -> None:
+    """Set a ticket's status; drops its cached row and its customer's cached open ticket."""
+    conn = _tickets_conn(conn, ticket_id)
+    with _write(conn) as cur:
+        owners = cur.execute("SELECT customer_id FROM support_tickets WHERE ticket_id = ?", (ticket_id,)).fetchall()
+        cur.execute(
+            "UPDATE support_tickets SET status = ? WHERE ticket_id = ?",
+            (status, ticket_id),
+        )
+        _invalidate(conn, [("ticket", ticket_id)] + [("open", r[0]) for r in owners])
+
+# ---------- Bulk ingestion ----------
+
+CONFLICT_POLICIES = ("skip", "upsert", "fail")
+
+@dataclass
+class BulkResult:
+    """
+    Summary of a bulk write. `inserted` counts rows written (inserted, or updated under
+    on_conflict='upsert'); `skipped` are duplicates ignored under 'skip'; `failed` are malformed
+    rows plus, under 'fail', the chunk that hit a duplicate. `error` is set when a run stopped early.
+    """
+    inserted: int = 0
+    skipped: int = 0
+    failed: int = 0
+    chunks: int = 0
+    error: Optional[str] = None
+    failed_rows: List[Any] = field(default_factory=list)  # first few bad rows, for diagnostics
+
+    def _bad(self, row: Any) -> None:
+        self.failed += 1
+        if len(self.failed_rows) < 20:
+            self.failed_rows.append(row)
+
+def _chunks(rows: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    it = iter(rows)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+def _field(row: Any, name: str, pos: int, default: Any = None) -> Any:
+    if isinstance(row, Mapping):
+        return row.get(name, default)
+    if isinstance(row, Sequence) and not isinstance(row, str):
+        return row[pos] if len(row) > pos else default
+    raise TypeError(f"expected a mapping or sequence row, got {type(row).__name__}")
+
+def _bulk(conn: Optional[sqlite3.Connection], sql: str, rows: Iterable[Any], to_params,
+          chunk_size: int, stop_on_integrity_error: bool = False) -> BulkResult:
+    """
+    Every statement's first parameter is the ticket_id. With shards a chunk splits into one group per
+    shard, all written in one sharded unit of work, so a conflict rolls back the whole chunk.
+    """
     conn = _ensure_conn(conn)
-    cur = conn.cursor()
-    cur.execute(
-        "UPDATE support_tickets SET status = ? WHERE ticket_id = ?",
-        (status, ticket_id),
+    result = BulkResult()
+    for chunk in _chunks(rows, max(1, int(chunk_size))):
+        params = []
+        for row in chunk:
+            try:
+                params.append(to_params(row))
+            except (KeyError, IndexError, TypeError, ValueError):
+                result._bad(row)
+        if not params:
+            continue
+        groups: Dict[int, List[Tuple[Any, ...]]] = {}
+        for p in params:
+            groups.setdefault(shards.shard_of(p[0], SHARDS), []).append(p)
+        counts: List[Tuple[int, int]] = []  # (rows, rows written) per group
+        try:
+            with _sharded_transaction() if SHARDS > 1 else nullcontext():
+                for index, group in sorted(groups.items()):
+                    target = conn if SHARDS == 1 else get_conn(shard_paths()[index])
+                    with _write(target) as cur:
+                        cur.executemany(sql, group)
+                        # unlike total_changes, rowcount excludes rows written by triggers (FTS index)
+                        counts.append((len(group), cur.rowcount))
+        except sqlite3.IntegrityError as e:
+            if not stop_on_integrity_error:
+                raise
+            result.failed += len(params)
+            result.error = f"chunk {result.chunks + 1} rolled back: {e}"
+            return result
+        for n, written in counts:
+            result.inserted += written
+            result.skipped += n - written
+        result.chunks += 1
+    return result
+
+def _ticket_params(row: Any) -> Tuple[Any, ...]:
+    ticket_id = _field(row, "ticket_id", 0)
+    if not ticket_id:
+        raise ValueError("ticket_id is required")
+    return (
+        str(ticket_id),
+        _field(row, "customer_name", 1, ""),
+        _field(row, "description", 2, ""),
+        _field(row, "status", 3, None) or "Open",
+        _field(row, "created_at", 4, None),
     )
-    conn.commit()
 
+@tracing.traced("db.insert_tickets_bulk")
+def insert_tickets_bulk(conn: Optional[sqlite3.Connection], rows: Iterable[Any], *,
+                        chunk_size: int = 1000, on_conflict: str = "skip") -> BulkResult:
+    """
+    Insert many tickets with executemany, one transaction per `chunk_size` rows.
+    Rows are mappings (ticket_id, customer_name, description, status, created_at) or tuples in that
+    order; generators are consumed lazily. on_conflict for duplicate ticket_ids:
+      - 'skip'   keep the existing row
+      - 'upsert' overwrite customer_name, description and status
+      - 'fail'   roll back the offending chunk and stop (earlier chunks stay committed)
+    New rows are linked to their customers (link_customers) after the last chunk.
+    """
+    if on_conflict not in CONFLICT_POLICIES:
+        raise ValueError(f"on_conflict must be one of {CONFLICT_POLICIES}, got {on_conflict!r}")
+    sql = ("INSERT INTO support_tickets (ticket_id, customer_name, description, status, created_at) "
+           "VALUES (?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))")
+    if on_conflict == "skip":
+        sql += " ON CONFLICT(ticket_id) DO NOTHING"
+    elif on_conflict == "upsert":
+        sql += (" ON CONFLICT(ticket_id) DO UPDATE SET customer_name = excluded.customer_name, "
+                "description = excluded.description, status = excluded.status, "
+                "customer_id = CASE WHEN customer_name = excluded.customer_name THEN customer_id END")
+    result = _bulk(conn, sql, rows, _ticket_params, chunk_size, stop_on_integrity_error=(on_conflict == "fail"))
+    if result.inserted:
+        link_customers(conn)  # one pass per call: names are normalized in Python, not per row in SQL
+        _invalidate(conn, kinds=("ticket", "open"))
+    return result
+
+@tracing.traced("db.append_ticket_notes_bulk")
+def append_ticket_notes_bulk(conn: Optional[sqlite3.Connection], rows: Iterable[Any], *,
+                             chunk_size: int = 1000) -> BulkResult:
+    """Bulk append_ticket_note. Rows: mappings (ticket_id, note, author, ts) or tuples in that order."""
+    def params(row: Any) -> Tuple[Any, ...]:
+        ticket_id, note = _field(row, "ticket_id", 0), _field(row, "note", 1)
+        if not ticket_id or note is None:
+            raise ValueError("ticket_id and note are required")
+        return (str(ticket_id), _field(row, "author", 2, None) or "customer", note, _field(row, "ts", 3, None))
+    sql = "INSERT INTO ticket_notes (ticket_id, author, note, ts) VALUES (?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))"
+    return _bulk(conn, sql, rows, params, chunk_size)
+
+@tracing.traced("db.add_ticket_action_flags_bulk")
+def add_ticket_action_flags_bulk(conn: Optional[sqlite3.Connection], rows: Iterable[Any], *,
+                                 chunk_size: int = 1000) -> BulkResult:
+    """Bulk add_ticket_action_flag. Rows: mappings (ticket_id, action, ts) or tuples in that order."""
+    def params(row: Any) -> Tuple[Any, ...]:
+        ticket_id, action = _field(row, "ticket_id", 0), _field(row, "action", 1)
+        if not ticket_id or not action:
+            raise ValueError("ticket_id and action are required")
+        return (str(ticket_id), action, _field(row, "ts", 2, None))
+    sql = "INSERT INTO ticket_actions (ticket_id, action, ts) VALUES (?, ?, COALESCE(?, CURRENT_TIMESTAMP))"
+    return _bulk(conn, sql, rows, params, chunk_size)
@@ -0,0 +1,139 @@
+# core/feeds.py
+"""
+Incremental row feeds for the Tickets and Logs dashboards.
+
+A DeltaFeed loads the newest page once, then on every sync pulls only rows
+added since the last id it saw (and, for tickets, rows updated since the last
+sync). Older pages load on demand through the keyset cursor, up to `max_rows`
+retained rows; past that the oldest rows are dropped as new ones arrive. The feed is plain
+data, so Streamlit can keep it in st.session_state between reruns. Reads go
+through a core.storage engine (get_storage() by default). Passing its
+data_version() to sync() skips the queries entirely when nothing has been
+written since the previous sync.
+"""
+from __future__ import annotations
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+from core.shards import shard_of_row
+from core.storage import Cursor, Storage, get_storage
+
+MAX_ROWS = int(os.getenv("SUPPORT_FEED_MAX_ROWS", "5000"))  # rows a feed keeps per session
+DELTA_LIMIT = 10_000  # a sync that returns this many rows reloads instead of trusting a truncated delta
+
+# kind -> (sort column, filter keys pushed into SQL)
+KINDS = {
+    "tickets": ("created_at", ("status", "customer_name")),
+    "logs": ("ts", ("level", "agent")),
+}
+
+
+def _in(value: Any, wanted: Any) -> bool:
+    if wanted is None:
+        return True
+    if isinstance(wanted, str):
+        return value == wanted
+    wanted = list(wanted)
+    return not wanted or value in wanted
+
+
+class DeltaFeed:
+    def __init__(self, kind: str, filters: Optional[Dict[str, Any]] = None, page_size: int = 200,
+                 max_rows: int = MAX_ROWS):
+        if kind not in KINDS:
+            raise ValueError(f"kind must be one of {sorted(KINDS)}")
+        self.kind = kind
+        self.filters = dict(filters or {})
+        self.page_size = page_size
+        self.max_rows = max(page_size, max_rows)
+        self.rows: Dict[int, Dict[str, Any]] = {}
+        self.cursor: Optional[Cursor] = None
+        self.last_ids: Dict[int, int] = {}  # shard -> newest id seen (logs: shard 0 only)
+        self.synced_at: Optional[str] = None  # tickets: newest updated_at seen (the update cursor)
+        self.synced_version: Optional[int] = None
+        self.loaded = False
+
+    @property
+    def has_older(self) -> bool:
+        return self.cursor is not None and len(self.rows) < self.max_rows
+
+    def _matches(self, row: Dict[str, Any]) -> bool:
+        sort_col, keys = KINDS[self.kind]
+        if not all(_in(row.get(k), self.filters.get(k)) for k in keys):
+            return False
+        since, until = self.filters.get("since"), self.filters.get("until")
+        stamp = str(row.get(sort_col) or "")
+        return (since is None or stamp >= since) and (until is None or stamp < until)
+
+    def _page(self, storage: Storage, cursor: Optional[Cursor]):
+        fn = storage.page_tickets if self.kind == "tickets" else storage.page_logs
+        return fn(cursor=cursor, limit=self.page_size, **self.filters)
+
+    def sync(self, storage: Optional[Storage] = None, version: Optional[int] = None) -> int:
+        """
+        Pull new (and changed) rows; returns how many rows were added or replaced.
+        With `version` (the storage's data_version()), an unchanged version returns 0 without querying.
+        """
+        if version is not None and self.loaded and version == self.synced_version:
+            return 0
+        self.synced_version = version
+        storage = storage or get_storage()
+        if not self.loaded:
+            return self._reload(storage)
+
+        if self.kind == "tickets":
+            # unfiltered, so rows whose status moved out of the filter get dropped below
+            delta = storage.tickets_since(last_id=self.last_ids, updated_since=self.synced_at, limit=DELTA_LIMIT)
+        else:
+            delta = storage.logs_since(last_id=self.last_ids.get(0, 0), limit=DELTA_LIMIT,
+                                       level=self.filters.get("level"), agent=self.filters.get("agent"))
+        if self.kind == "tickets" and len(delta) >= DELTA_LIMIT:
+            # rows past the limit may include updates older than the newest one fetched
+            return self._reload(storage)
+        changed = 0
+        for r in delta:
+            shard = shard_of_row(r["id"]) if self.kind == "tickets" else 0
+            self.last_ids[shard] = max(self.last_ids.get(shard, 0), int(r["id"]))
+            if r.get("updated_at") and (self.synced_at is None or r["updated_at"] > self.synced_at):
+                self.synced_at = r["updated_at"]  # advance only as far as rows actually fetched
+            if self._matches(r):
+                self.rows[r["id"]] = r
+                changed += 1
+            elif self.rows.pop(r["id"], None) is not None:
+                changed += 1
+        self._trim()
+        return changed
+
+    def _reload(self, storage: Storage) -> int:
+        """Start over from the newest page (first sync, or a delta too large to apply)."""
+        self.synced_at = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())  # CURRENT_TIMESTAMP's format
+        self.last_ids = storage.max_row_ids(self.kind)
+        rows, self.cursor = self._page(storage, None)
+        self.rows = {r["id"]: r for r in rows}
+        self.loaded = True
+        return len(rows)
+
+    def _trim(self) -> None:
+        """Drop the oldest rows past max_rows; "Load older" resumes right after the oldest one kept."""
+        if len(self.rows) <= self.max_rows:
+            return
+        sort_col = KINDS[self.kind][0]
+        kept = self.records()[:self.max_rows]
+        self.rows = {r["id"]: r for r in kept}
+        self.cursor = (kept[-1][sort_col], kept[-1]["id"])
+
+    def load_older(self, storage: Optional[Storage] = None) -> int:
+        """Append the next older page (constant cost regardless of depth) while under max_rows."""
+        if not self.has_older:
+            return 0
+        rows, self.cursor = self._page(storage or get_storage(), self.cursor)
+        for r in rows:
+            self.rows.setdefault(r["id"], r)
+        self._trim()
+        return len(rows)
+
+    def records(self) -> List[Dict[str, Any]]:
+        """Rows newest first, ready for pd.DataFrame."""
+        sort_col = KINDS[self.kind][0]
+        return sorted(self.rows.values(), key=lambda r: (str(r.get(sort_col) or ""), r["id"]), reverse=True)
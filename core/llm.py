@@ -1,7 +1,12 @@
 # core/llm.py
 from __future__ import annotations
 import os
-from typing import Optional, Tuple
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from core import metrics, tracing
+from core.llm_cache import cache_key, get_response_cache
 
 # Optional (if running in Streamlit)
 try:
@@ -15,6 +20,22 @@ try:
 except Exception:  # pragma: no cover
     OpenAI = None  # type: ignore
 
+try:
+    import httpx  # installed with the openai SDK
+except Exception:  # pragma: no cover
+    httpx = None  # type: ignore
+
+# Connection pool / timeout settings shared by every registry client
+REQUEST_TIMEOUT = float(os.getenv("SUPPORT_LLM_TIMEOUT", "30"))
+MAX_CONNECTIONS = int(os.getenv("SUPPORT_LLM_MAX_CONNECTIONS", "20"))
+MAX_KEEPALIVE = int(os.getenv("SUPPORT_LLM_MAX_KEEPALIVE", "10"))
+KEEPALIVE_EXPIRY = float(os.getenv("SUPPORT_LLM_KEEPALIVE_EXPIRY", "60"))
+MAX_RETRIES = int(os.getenv("SUPPORT_LLM_MAX_RETRIES", "2"))
+
+_CLIENTS: Dict[Tuple[str, str, Optional[str]], Any] = {}
+_CLIENTS_LOCK = threading.Lock()
+_RESOLVED_KEY: Optional[str] = None
+
 
 def _from_secrets(name: str) -> Optional[str]:
     """Read from Streamlit secrets if available."""
@@ -38,6 +59,66 @@ def _load_api_key() -> Optional[str]:
     return key.strip()
 
 
+def _resolved_api_key() -> Optional[str]:
+    """
+    _load_api_key(), kept once found (st.secrets lookups are not free). A missing key is looked
+    up again on the next call, so one added to the environment or secrets later is picked up.
+    """
+    global _RESOLVED_KEY
+    if _RESOLVED_KEY is None:
+        _RESOLVED_KEY = _load_api_key()
+    return _RESOLVED_KEY
+
+
+def get_openai_client(api_key: str, model: str, base_url: Optional[str] = None):
+    """
+    Process-wide OpenAI client for (api_key, model, base_url). Clients keep their HTTP connection
+    pool alive across calls, so repeated LLMClient() construction costs a dict lookup.
+    """
+    reg_key = (api_key, model, base_url)
+    client = _CLIENTS.get(reg_key)
+    if client is not None:
+        metrics.incr("llm.client_reused")
+        return client
+    with _CLIENTS_LOCK:
+        client = _CLIENTS.get(reg_key)
+        if client is None:
+            start = time.perf_counter()
+            kwargs: Dict[str, Any] = {"api_key": api_key, "timeout": REQUEST_TIMEOUT, "max_retries": MAX_RETRIES}
+            if base_url:
+                kwargs["base_url"] = base_url
+            if httpx is not None:
+                kwargs["http_client"] = httpx.Client(
+                    timeout=REQUEST_TIMEOUT,
+                    limits=httpx.Limits(
+                        max_connections=MAX_CONNECTIONS,
+                        max_keepalive_connections=MAX_KEEPALIVE,
+                        keepalive_expiry=KEEPALIVE_EXPIRY,
+                    ),
+                )
+            client = _CLIENTS[reg_key] = OpenAI(**kwargs)
+            metrics.observe("llm.client_setup", time.perf_counter() - start)
+            metrics.incr("llm.client_created")
+        else:
+            metrics.incr("llm.client_reused")
+    return client
+
+
+def close_openai_clients() -> None:
+    """Close pooled connections (tests or shutdown)."""
+    with _CLIENTS_LOCK:
+        for client in _CLIENTS.values():
+            try:
+                client.close()
+            except Exception:
+                pass
+        _CLIENTS.clear()
+
+
+def _cache_enabled() -> bool:
+    return os.getenv("SUPPORT_LLM_CACHE", "1").strip().lower() not in ("0", "false", "no")
+
+
 def check_openai_ready() -> Tuple[bool, str]:
     """Return (ok, message) indicating whether OpenAI SDK and API key look usable."""
     if OpenAI is None:
@@ -53,51 +134,81 @@ class LLMClient:
 
     def __init__(self, api_key: Optional[str] = None, model: Optional[str] = None):
         # Prefer explicit key, then secrets/env
-        resolved_key = api_key or _load_api_key()
+        resolved_key = api_key or _resolved_api_key()
         self.model = model or os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+        self.base_url = os.getenv("OPENAI_BASE_URL") or None
         self.enabled = bool(resolved_key and OpenAI is not None)
-        self.client = OpenAI(api_key=resolved_key) if self.enabled else None
+        self.client = get_openai_client(resolved_key, self.model, self.base_url) if self.enabled else None
 
-    def chat(self, system: str, user: str, temperature: float = 0.2) -> str:
+    @tracing.traced("llm.chat")
+    def chat(
+        self,
+        system: str,
+        user: str,
+        temperature: float = 0.2,
+        max_tokens: int = 64,
+        cache: Optional[bool] = None,
+    ) -> str:
         """
         Generic chat wrapper.
         Returns a short string or raises RuntimeError if the LLM path fails.
+        `cache=None` caches deterministic (temperature=0) calls only; True/False force or bypass the cache.
         """
         if not self.enabled or not self.client:
             # Do not silently fake output; signal upstream to fall back.
             raise RuntimeError("LLM disabled (no valid API key or OpenAI SDK missing).")
 
+        use_cache = _cache_enabled() and (temperature == 0 if cache is None else cache)
+        key = cache_key(self.model, system, user, temperature, max_tokens, self.base_url) if use_cache else None
+        if key is not None:
+            hit = get_response_cache().get(key)
+            if hit is not None:
+                return hit
+
         try:
-            resp = self.client.chat.completions.create(
-                model=self.model,
-                temperature=temperature,
-                messages=[
-                    {"role": "system", "content": system},
-                    {"role": "user", "content": user},
-                ],
-                max_tokens=64,
-            )
-            return (resp.choices[0].message.content or "").strip()
+            start = time.perf_counter()
+            with tracing.span("llm.request"):
+                resp = self.client.chat.completions.create(
+                    model=self.model,
+                    temperature=temperature,
+                    messages=[
+                        {"role": "system", "content": system},
+                        {"role": "user", "content": user},
+                    ],
+                    max_tokens=max_tokens,
+                )
+            out = (resp.choices[0].message.content or "").strip()
         except Exception as e:
             # Surface a clear error so caller can fall back to rule-based
             raise RuntimeError(f"OpenAI call failed: {e}")
 
+        if key is not None:
+            get_response_cache().put(key, out, time.perf_counter() - start)
+        return out
+
     # Optional convenience for your ClassifierAgent
     def classify(self, text: str) -> str:
         """
         Return one of: 'positive_feedback', 'negative_feedback', 'query'.
         Raises RuntimeError if LLM path fails (so caller can fall back).
         """
-        system = (
-            "You are a short text classifier for banking support. "
-            "Given a user message, return exactly one label:\n"
-            " - positive_feedback\n - negative_feedback\n - query\n"
-            "Return only the label, no punctuation."
-        )
-        out = self.chat(system=system, user=text, temperature=0)
-        low = out.lower()
-        if "positive" in low:
-            return "positive_feedback"
-        if "negative" in low:
-            return "negative_feedback"
-        return "query"
+        out = self.chat(system=CLASSIFY_SYSTEM, user=text, temperature=0)
+        return parse_label(out)
+
+
+CLASSIFY_SYSTEM = (
+    "You are a short text classifier for banking support. "
+    "Given a user message, return exactly one label:\n"
+    " - positive_feedback\n - negative_feedback\n - query\n"
+    "Return only the label, no punctuation."
+)
+
+
+def parse_label(out: str) -> str:
+    """Map a free-form model answer onto one of the three routing labels."""
+    low = (out or "").lower()
+    if "positive" in low:
+        return "positive_feedback"
+    if "negative" in low:
+        return "negative_feedback"
+    return "query"
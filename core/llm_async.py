@@ -0,0 +1,221 @@
+# core/llm_async.py
+"""
+asyncio counterpart of core.llm.LLMClient for bulk work.
+
+Requests run concurrently under a semaphore, are paced by a requests/min and
+tokens/min limiter, retry 429/5xx/connection errors with jittered exponential
+backoff (honouring Retry-After), and each call has an overall deadline.
+Point `base_url` (or OPENAI_BASE_URL) at any OpenAI-compatible server to run
+offline.
+"""
+from __future__ import annotations
+import asyncio
+import os
+import random
+import time
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+from core import metrics
+from core.llm import CLASSIFY_SYSTEM, _cache_enabled, _resolved_api_key, parse_label
+from core.llm_cache import cache_key, get_response_cache
+
+try:
+    import openai
+    from openai import AsyncOpenAI  # SDK v1.x
+except Exception:  # pragma: no cover
+    openai = None  # type: ignore
+    AsyncOpenAI = None  # type: ignore
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+MAX_CONCURRENCY = int(os.getenv("SUPPORT_LLM_CONCURRENCY", "8"))
+
+
+class RateLimiter:
+    """
+    Token-bucket limiter for requests/min and tokens/min (either may be None = unlimited).
+    Buckets start full, so short bursts up to the per-minute budget go out immediately.
+    """
+
+    def __init__(self, requests_per_minute: Optional[float] = None, tokens_per_minute: Optional[float] = None):
+        self.rpm = requests_per_minute
+        self.tpm = tokens_per_minute
+        self._req = float(requests_per_minute or 0)
+        self._tok = float(tokens_per_minute or 0)
+        self._last = time.monotonic()
+        self._lock: Optional[asyncio.Lock] = None
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self._last
+        self._last = now
+        if self.rpm:
+            self._req = min(float(self.rpm), self._req + elapsed * self.rpm / 60.0)
+        if self.tpm:
+            self._tok = min(float(self.tpm), self._tok + elapsed * self.tpm / 60.0)
+
+    async def acquire(self, tokens: int = 0) -> None:
+        if not self.rpm and not self.tpm:
+            return
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:  # FIFO: one waiter drains the bucket at a time
+            while True:
+                self._refill()
+                need_req = 1.0 if self.rpm else 0.0
+                need_tok = float(min(tokens, self.tpm)) if self.tpm else 0.0
+                if self._req >= need_req and self._tok >= need_tok:
+                    self._req -= need_req
+                    self._tok -= need_tok
+                    return
+                wait = 0.0
+                if self.rpm and self._req < need_req:
+                    wait = max(wait, (need_req - self._req) * 60.0 / self.rpm)
+                if self.tpm and self._tok < need_tok:
+                    wait = max(wait, (need_tok - self._tok) * 60.0 / self.tpm)
+                start = time.perf_counter()
+                await asyncio.sleep(wait)
+                metrics.observe("llm.rate_limit_wait", time.perf_counter() - start)
+
+
+def estimate_tokens(*texts: str, max_tokens: int = 0) -> int:
+    """Rough prompt+completion size (≈4 chars/token) for tokens/min pacing."""
+    return sum(len(t or "") for t in texts) // 4 + 8 + max_tokens
+
+
+class AsyncLLMClient:
+    """Async OpenAI wrapper with bounded concurrency, rate limiting, retries and deadlines."""
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        model: Optional[str] = None,
+        *,
+        base_url: Optional[str] = None,
+        max_concurrency: int = MAX_CONCURRENCY,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+        max_retries: int = 4,
+        backoff_base: float = 0.5,
+        backoff_max: float = 20.0,
+        deadline: Optional[float] = 60.0,
+    ):
+        self.api_key = api_key or _resolved_api_key()
+        self.model = model or os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+        self.base_url = base_url or os.getenv("OPENAI_BASE_URL") or None
+        self.enabled = bool(self.api_key and AsyncOpenAI is not None)
+        self.max_concurrency = max(1, max_concurrency)
+        self.limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+        self.max_retries = max(0, max_retries)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.deadline = deadline
+        # AsyncOpenAI and Semaphore bind to the running loop; rebuild them if the loop changes
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._client: Any = None
+        self._sem: Optional[asyncio.Semaphore] = None
+
+    def _bind(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        kwargs: Dict[str, Any] = {"api_key": self.api_key, "max_retries": 0}
+        if self.base_url:
+            kwargs["base_url"] = self.base_url
+        self._client = AsyncOpenAI(**kwargs)
+        self._sem = asyncio.Semaphore(self.max_concurrency)
+        self.limiter._lock = None
+        self._loop = loop
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.close()
+        self._client = None
+        self._loop = None
+
+    async def achat(
+        self,
+        system: str,
+        user: str,
+        temperature: float = 0.2,
+        max_tokens: int = 64,
+        cache: Optional[bool] = None,
+        deadline: Optional[float] = None,
+    ) -> str:
+        """
+        Async chat call. Same contract as LLMClient.chat: returns the stripped reply or
+        raises RuntimeError (disabled, retries exhausted, or deadline exceeded).
+        """
+        if not self.enabled:
+            raise RuntimeError("LLM disabled (no valid API key or OpenAI SDK missing).")
+
+        use_cache = _cache_enabled() and (temperature == 0 if cache is None else cache)
+        key = cache_key(self.model, system, user, temperature, max_tokens, self.base_url) if use_cache else None
+        if key is not None:
+            hit = get_response_cache().get(key)
+            if hit is not None:
+                return hit
+
+        self._bind()
+        budget = self.deadline if deadline is None else deadline
+        start = time.perf_counter()
+        try:
+            out = await asyncio.wait_for(self._call_with_retries(system, user, temperature, max_tokens), budget)
+        except asyncio.TimeoutError:
+            metrics.incr("llm.deadline_exceeded")
+            raise RuntimeError(f"OpenAI call exceeded its {budget:.1f}s deadline")
+        metrics.observe("llm.achat", time.perf_counter() - start)
+
+        if key is not None:
+            get_response_cache().put(key, out, time.perf_counter() - start)
+        return out
+
+    async def _call_with_retries(self, system: str, user: str, temperature: float, max_tokens: int) -> str:
+        assert self._sem is not None
+        attempt = 0
+        while True:
+            await self.limiter.acquire(estimate_tokens(system, user, max_tokens=max_tokens))
+            try:
+                async with self._sem:
+                    resp = await self._client.chat.completions.create(
+                        model=self.model,
+                        temperature=temperature,
+                        messages=[
+                            {"role": "system", "content": system},
+                            {"role": "user", "content": user},
+                        ],
+                        max_tokens=max_tokens,
+                    )
+                return (resp.choices[0].message.content or "").strip()
+            except Exception as e:
+                retry_after = self._retry_after(e)
+                if retry_after is None or attempt >= self.max_retries:
+                    raise RuntimeError(f"OpenAI call failed: {e}")
+                attempt += 1
+                metrics.incr("llm.retries")
+                # full jitter, but never earlier than the server asked for
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+                await asyncio.sleep(max(delay, retry_after))
+
+    @staticmethod
+    def _retry_after(exc: Exception) -> Optional[float]:
+        """Seconds to wait before retrying `exc`, or None if it is not retryable."""
+        if openai is None:
+            return None
+        if isinstance(exc, (openai.APIConnectionError, openai.APITimeoutError)):
+            return 0.0
+        if isinstance(exc, openai.APIStatusError) and exc.status_code in RETRYABLE_STATUS:
+            header = exc.response.headers.get("retry-after") if exc.response is not None else None
+            try:
+                return min(float(header), 60.0) if header else 0.0
+            except ValueError:
+                return 0.0
+        return None
+
+    async def aclassify(self, text: str) -> str:
+        """Async LLMClient.classify: one of 'positive_feedback', 'negative_feedback', 'query'."""
+        out = await self.achat(system=CLASSIFY_SYSTEM, user=text, temperature=0)
+        return parse_label(out)
+
+    async def aclassify_many(self, texts: Sequence[str]) -> List[Union[str, Exception]]:
+        """Classify concurrently; failed items come back as the exception instead of a label."""
+        return await asyncio.gather(*(self.aclassify(t) for t in texts), return_exceptions=True)
@@ -0,0 +1,180 @@
+# core/llm_cache.py
+"""
+Two-tier cache for LLM responses: an in-process LRU in front of a SQLite store.
+
+Keys hash (endpoint, model, system prompt, user text, temperature, max_tokens),
+so replies from a local or fake OpenAI-compatible server never answer calls to
+another endpoint. Entries expire after `ttl_seconds`; each tier is trimmed to
+its own size bound, least recently used first. Disk hits only record their last_hit time in memory; the
+times are written in one batch with the next put, so a read never takes the
+SQLite write lock. Hits, misses and the upstream latency they saved are
+counted in core.metrics under `llm_cache.*`.
+"""
+from __future__ import annotations
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from core import metrics
+
+CACHE_PATH = os.getenv("SUPPORT_LLM_CACHE_PATH", "data/llm_cache.db")
+TTL_SECONDS = int(os.getenv("SUPPORT_LLM_CACHE_TTL", str(7 * 24 * 3600)))
+MEMORY_ENTRIES = int(os.getenv("SUPPORT_LLM_CACHE_MEMORY", "2048"))
+DISK_ENTRIES = int(os.getenv("SUPPORT_LLM_CACHE_DISK", "200000"))
+
+
+def cache_key(model: str, system: str, user: str, temperature: float, max_tokens: int,
+              base_url: Optional[str] = None) -> str:
+    """`base_url` is the endpoint the reply came from; None means the SDK default (api.openai.com)."""
+    endpoint = (base_url or "").rstrip("/")
+    raw = json.dumps([endpoint, model, system, user, round(float(temperature), 4), int(max_tokens)], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """LRU (memory) + SQLite (disk) response cache. Thread-safe."""
+
+    def __init__(
+        self,
+        path: Optional[str] = CACHE_PATH,
+        *,
+        ttl_seconds: int = TTL_SECONDS,
+        memory_entries: int = MEMORY_ENTRIES,
+        disk_entries: int = DISK_ENTRIES,
+    ):
+        self.ttl = ttl_seconds
+        self.memory_entries = max(1, memory_entries)
+        self.disk_entries = max(1, disk_entries)
+        self._lock = threading.Lock()
+        # key -> (response, upstream latency seconds, stored_at)
+        self._lru: "OrderedDict[str, Tuple[str, float, float]]" = OrderedDict()
+        self._puts = 0
+        self._touched: Dict[str, float] = {}  # key -> last disk hit not yet written to last_hit
+        self._db: Optional[sqlite3.Connection] = None
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False, timeout=5)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    response TEXT NOT NULL,
+                    latency REAL NOT NULL,
+                    stored_at REAL NOT NULL,
+                    last_hit REAL NOT NULL
+                )
+            """)
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_hit ON llm_cache (last_hit)")
+            self._db.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._lru.get(key)
+            if entry is not None and now - entry[2] <= self.ttl:
+                self._lru.move_to_end(key)
+                self._hit("memory", entry[1])
+                return entry[0]
+            if entry is not None:
+                del self._lru[key]
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT response, latency, stored_at FROM llm_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and now - row[2] <= self.ttl:
+                    self._touched[key] = now
+                    if len(self._touched) > self.memory_entries:  # bound the backlog when puts are rare
+                        self._flush_hits()
+                        self._db.commit()
+                    self._remember(key, (row[0], row[1], row[2]))
+                    self._hit("disk", row[1])
+                    return row[0]
+        metrics.incr("llm_cache.miss")
+        return None
+
+    def put(self, key: str, response: str, latency: float) -> None:
+        now = time.time()
+        with self._lock:
+            self._remember(key, (response, latency, now))
+            if self._db is None:
+                return
+            self._db.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, response, latency, stored_at, last_hit) VALUES (?, ?, ?, ?, ?)",
+                (key, response, latency, now, now),
+            )
+            self._touched.pop(key, None)
+            self._flush_hits()
+            self._puts += 1
+            if self._puts % 100 == 0:
+                self._evict_disk(now)
+            self._db.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._lru.clear()
+            self._touched.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM llm_cache")
+                self._db.commit()
+
+    def stats(self) -> Dict[str, float]:
+        c = metrics.snapshot()["counters"]
+        hits = c.get("llm_cache.hit_memory", 0) + c.get("llm_cache.hit_disk", 0)
+        misses = c.get("llm_cache.miss", 0)
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": (hits / (hits + misses)) if (hits + misses) else 0.0,
+            "latency_saved_s": c.get("llm_cache.latency_saved_s", 0.0),
+            "memory_entries": len(self._lru),
+        }
+
+    # ---------- internals (caller holds the lock) ----------
+
+    def _remember(self, key: str, entry: Tuple[str, float, float]) -> None:
+        self._lru[key] = entry
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.memory_entries:
+            self._lru.popitem(last=False)
+
+    def _hit(self, tier: str, latency: float) -> None:
+        metrics.incr(f"llm_cache.hit_{tier}")
+        metrics.incr("llm_cache.latency_saved_s", latency)
+
+    def _flush_hits(self) -> None:
+        """Write the batched last_hit times (the caller commits)."""
+        if not self._touched or self._db is None:
+            return
+        self._db.executemany("UPDATE llm_cache SET last_hit = MAX(last_hit, ?) WHERE key = ?",
+                             [(t, k) for k, t in self._touched.items()])
+        self._touched.clear()
+
+    def _evict_disk(self, now: float) -> None:
+        assert self._db is not None
+        self._db.execute("DELETE FROM llm_cache WHERE stored_at < ?", (now - self.ttl,))
+        (count,) = self._db.execute("SELECT COUNT(*) FROM llm_cache").fetchone()
+        if count > self.disk_entries:
+            self._db.execute(
+                "DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY last_hit LIMIT ?)",
+                (count - self.disk_entries,),
+            )
+
+
+_CACHE: Optional[ResponseCache] = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    """Process-wide cache instance (created on first use)."""
+    global _CACHE
+    if _CACHE is None:
+        with _CACHE_LOCK:
+            if _CACHE is None:
+                _CACHE = ResponseCache()
+    return _CACHE
@@ -0,0 +1,294 @@
+# core/log_retention.py
+"""
+Retention and archival for `app_logs`.
+
+Rows older than the retention window are moved out of the live table one UTC
+day at a time: each day is written to a gzip'd JSONL file under the archive
+directory, recorded in `log_archives`, and only then deleted from `app_logs`.
+Freed pages are returned to the OS with `PRAGMA incremental_vacuum`, so the
+database file, backups and WAL checkpoints stay proportional to the live window.
+
+`read_logs` answers the same filters as `core.db.page_logs` across the live
+table and the archived days, newest first.
+"""
+from __future__ import annotations
+import atexit
+import gzip
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import date, timedelta
+from typing import Any, Dict, Iterator, List, Optional
+
+from core import metrics
+
+RETENTION_DAYS = int(os.getenv("SUPPORT_LOG_RETENTION_DAYS", "0"))  # 0 = keep everything live
+ARCHIVE_DIR = os.getenv("SUPPORT_LOG_ARCHIVE_DIR", "data/log_archive")
+ARCHIVE_INTERVAL_S = float(os.getenv("SUPPORT_LOG_ARCHIVE_INTERVAL_S", "3600"))
+VACUUM_PAGES = int(os.getenv("SUPPORT_LOG_VACUUM_PAGES", "4096"))  # pages freed per vacuum step
+ARCHIVE_BATCH = int(os.getenv("SUPPORT_LOG_ARCHIVE_BATCH", "5000"))  # rows fetched per step while archiving
+
+COLUMNS = ("id", "ts", "level", "agent", "event", "details", "trace_id")
+
+
+def _default_conn() -> sqlite3.Connection:
+    from core.db import logs_conn  # local import: core.db starts the archiver from env
+    return logs_conn()
+
+
+def _cutoff_day(retention_days: int, today: Optional[date] = None) -> str:
+    return ((today or date.today()) - timedelta(days=retention_days)).isoformat()
+
+
+def _next_day(day: str) -> str:
+    return (date.fromisoformat(day) + timedelta(days=1)).isoformat()
+
+
+def _matches(row: Dict[str, Any], level: Any, agent: Any) -> bool:
+    for value, wanted in ((row.get("level"), level), (row.get("agent"), agent)):
+        if wanted is None:
+            continue
+        if isinstance(wanted, str):
+            if value != wanted:
+                return False
+        elif wanted and value not in wanted:
+            return False
+    return True
+
+
+# ---------- Archiving ----------
+
+def archive_day(conn: sqlite3.Connection, day: str, archive_dir: str = ARCHIVE_DIR) -> Optional[Dict[str, Any]]:
+    """
+    Move every app_logs row from UTC `day` ('YYYY-MM-DD') into one gzip'd JSONL file.
+    The file is fully written before the rows are deleted, so a crash can leave a duplicate
+    file but never loses rows. Returns the manifest entry, or None if the day was empty.
+    """
+    from core.db import _write
+    start = time.perf_counter()
+    rows = conn.execute(
+        f"SELECT {', '.join(COLUMNS)} FROM app_logs WHERE ts >= ? AND ts < ? ORDER BY id",
+        (day, _next_day(day)),
+    )
+    os.makedirs(archive_dir, exist_ok=True)
+    tmp = os.path.join(archive_dir, f"app_logs-{day}.jsonl.gz.tmp")  # final name needs max_id
+    count, min_id, max_id = 0, None, None
+    with gzip.open(tmp, "wt", encoding="utf-8") as fh:
+        while True:
+            batch = rows.fetchmany(ARCHIVE_BATCH)  # stream: a busy day never sits in memory whole
+            if not batch:
+                break
+            if min_id is None:
+                min_id = batch[0][0]
+            max_id = batch[-1][0]
+            count += len(batch)
+            for r in batch:
+                fh.write(json.dumps(dict(zip(COLUMNS, tuple(r)))) + "\n")
+    if not count:
+        os.remove(tmp)
+        return None
+    with open(tmp, "rb") as fh:
+        os.fsync(fh.fileno())
+    path = os.path.join(archive_dir, f"app_logs-{day}-{max_id}.jsonl.gz")
+    os.replace(tmp, path)
+    size = os.path.getsize(path)
+
+    with _write(conn) as cur:
+        cur.execute(
+            "INSERT OR REPLACE INTO log_archives (day, path, rows, min_id, max_id, bytes) VALUES (?, ?, ?, ?, ?, ?)",
+            (day, path, count, min_id, max_id, size),
+        )
+        cur.execute("DELETE FROM app_logs WHERE ts >= ? AND ts < ? AND id <= ?", (day, _next_day(day), max_id))
+    metrics.incr("log_retention.rows_archived", count)
+    metrics.observe("log_retention.archive_day", time.perf_counter() - start)
+    return {"day": day, "path": path, "rows": count, "min_id": min_id, "max_id": max_id, "bytes": size}
+
+
+def archive_expired(conn: Optional[sqlite3.Connection] = None, *, retention_days: int = RETENTION_DAYS,
+                    archive_dir: str = ARCHIVE_DIR, today: Optional[date] = None) -> List[Dict[str, Any]]:
+    """Archive every whole day older than `retention_days`, oldest first, then reclaim the space."""
+    if retention_days <= 0:
+        return []
+    conn = conn or _default_conn()
+    cutoff = _cutoff_day(retention_days, today)
+    days = [d for (d,) in conn.execute(
+        "SELECT DISTINCT substr(ts, 1, 10) FROM app_logs WHERE ts < ? ORDER BY 1", (cutoff,)
+    ).fetchall()]
+    archived = [entry for entry in (archive_day(conn, d, archive_dir) for d in days) if entry]
+    if archived:
+        reclaim_space(conn)
+    return archived
+
+
+# ---------- Space reclamation ----------
+
+def enable_incremental_vacuum(conn: Optional[sqlite3.Connection] = None) -> bool:
+    """
+    Switch an existing database to auto_vacuum=INCREMENTAL. This rewrites the file with a
+    full VACUUM, so run it once during a quiet period. New databases get the mode at creation.
+    """
+    conn = conn or _default_conn()
+    if int(conn.execute("PRAGMA auto_vacuum").fetchone()[0]) == 2:
+        return False
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    conn.execute("VACUUM")
+    return True
+
+
+def reclaim_space(conn: Optional[sqlite3.Connection] = None, *, step_pages: int = VACUUM_PAGES) -> int:
+    """
+    Release free pages in short incremental_vacuum steps (each holds the write lock briefly),
+    then truncate the WAL. Returns the number of pages released; 0 if the database is not in
+    incremental mode (see enable_incremental_vacuum).
+    """
+    conn = conn or _default_conn()
+    if int(conn.execute("PRAGMA auto_vacuum").fetchone()[0]) != 2:
+        return 0
+    if conn.in_transaction:
+        conn.commit()
+    start = time.perf_counter()
+    released = 0
+    while True:
+        free = int(conn.execute("PRAGMA freelist_count").fetchone()[0])
+        if free == 0:
+            break
+        conn.execute(f"PRAGMA incremental_vacuum({int(min(free, step_pages))})").fetchall()
+        after = int(conn.execute("PRAGMA freelist_count").fetchone()[0])
+        if after >= free:
+            break
+        released += free - after
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+    metrics.incr("log_retention.pages_released", released)
+    metrics.observe("log_retention.reclaim", time.perf_counter() - start)
+    return released
+
+
+# ---------- Reading across live + archived ----------
+
+def iter_archived_logs(conn: Optional[sqlite3.Connection] = None, *, since: Optional[str] = None,
+                       until: Optional[str] = None, level: Any = None,
+                       agent: Any = None) -> Iterator[Dict[str, Any]]:
+    """Archived rows in [since, until), newest first. Only files whose day overlaps the range are opened."""
+    conn = conn or _default_conn()
+    clauses, params = [], []
+    if since is not None:
+        clauses.append("day >= ?")
+        params.append(since[:10])
+    if until is not None:
+        clauses.append("day <= ?")
+        params.append(until[:10])
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    files = conn.execute(
+        f"SELECT path FROM log_archives {where} ORDER BY day DESC, max_id DESC", params
+    ).fetchall()
+    for (path,) in files:
+        if not os.path.exists(path):
+            metrics.incr("log_retention.missing_archive")
+            continue
+        with gzip.open(path, "rt", encoding="utf-8") as fh:
+            rows = [json.loads(line) for line in fh if line.strip()]
+        for row in reversed(rows):
+            ts = str(row.get("ts") or "")
+            if since is not None and ts < since:
+                continue
+            if until is not None and ts >= until:
+                continue
+            if _matches(row, level, agent):
+                yield row
+
+
+def read_logs(conn: Optional[sqlite3.Connection] = None, *, since: Optional[str] = None,
+              until: Optional[str] = None, level: Any = None, agent: Any = None,
+              limit: int = 200, include_archived: bool = True) -> List[Dict[str, Any]]:
+    """
+    Up to `limit` log rows, newest first, from app_logs and then (if more are needed) the archive.
+    Filters match core.db.page_logs: level/agent as a string or list, since/until bound ts.
+    """
+    from core.db import page_logs
+    conn = conn or _default_conn()
+    rows, _ = page_logs(conn, limit=limit, level=level, agent=agent, since=since, until=until)
+    if not include_archived or len(rows) >= limit:
+        return rows
+    # Archived rows are all older than live ones for the same day, except late arrivals; merge by (ts, id)
+    seen = {r["id"] for r in rows}
+    for row in iter_archived_logs(conn, since=since, until=until, level=level, agent=agent):
+        if row["id"] not in seen:
+            rows.append(row)
+            seen.add(row["id"])
+            if len(rows) >= limit * 2:
+                break
+    rows.sort(key=lambda r: (str(r.get("ts") or ""), r["id"]), reverse=True)
+    return rows[:limit]
+
+
+# ---------- Background archiver ----------
+
+class LogArchiver:
+    """Daemon thread that runs archive_expired every `interval_s` on its own connection."""
+
+    def __init__(self, db_path: str, *, retention_days: int = RETENTION_DAYS, archive_dir: str = ARCHIVE_DIR,
+                 interval_s: float = ARCHIVE_INTERVAL_S):
+        self.db_path = db_path
+        self.retention_days = retention_days
+        self.archive_dir = archive_dir
+        self.interval_s = max(1.0, interval_s)
+        self.stats: Dict[str, int] = {"runs": 0, "days": 0, "rows": 0, "errors": 0}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="log-archiver", daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def run_once(self, conn: sqlite3.Connection) -> List[Dict[str, Any]]:
+        from core.db import flush_logs
+        flush_logs(timeout=2.0)
+        archived = archive_expired(conn, retention_days=self.retention_days, archive_dir=self.archive_dir)
+        self.stats["runs"] += 1
+        self.stats["days"] += len(archived)
+        self.stats["rows"] += sum(a["rows"] for a in archived)
+        return archived
+
+    def _run(self) -> None:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            while not self._stop.is_set():
+                try:
+                    self.run_once(conn)
+                except sqlite3.Error:
+                    self.stats["errors"] += 1
+                    metrics.incr("log_retention.errors")
+                self._stop.wait(self.interval_s)
+        finally:
+            conn.close()
+
+    def stop(self, timeout: Optional[float] = 5.0) -> None:
+        self._stop.set()
+        if self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+
+_ARCHIVER: Optional[LogArchiver] = None
+
+
+def start_log_archiver(db_path: Optional[str] = None, **options) -> LogArchiver:
+    """Start (or restart) the process-wide archiver. Options: retention_days, archive_dir, interval_s."""
+    global _ARCHIVER
+    from core import db
+    stop_log_archiver()
+    _ARCHIVER = LogArchiver(db_path or db.log_db_path(), **options)
+    return _ARCHIVER
+
+
+def stop_log_archiver() -> None:
+    global _ARCHIVER
+    if _ARCHIVER is not None:
+        _ARCHIVER.stop()
+        _ARCHIVER = None
+
+
+def _archiver_from_env() -> None:
+    if RETENTION_DAYS > 0 and _ARCHIVER is None:
+        start_log_archiver()
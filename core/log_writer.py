@@ -0,0 +1,200 @@
+# core/log_writer.py
+"""
+Asynchronous, group-committing sink for `app_logs` rows.
+
+`core.db.log_event` hands rows to a `BufferedLogWriter` when async logging is
+enabled. A single background thread drains the bounded queue and writes rows in
+one transaction per `batch_size` rows or every `flush_interval_ms`, whichever
+comes first, so a burst of log calls costs one commit instead of one per row.
+"""
+from __future__ import annotations
+import atexit
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+OVERFLOW_POLICIES = ("block", "drop_debug", "spill")
+
+# (ts, level, agent, event, details_json, trace_id)
+LogRow = Tuple[str, str, str, str, str, Optional[str]]
+_INSERT = "INSERT INTO app_logs (ts, level, agent, event, details, trace_id) VALUES (?, ?, ?, ?, ?, ?)"
+
+_STOP = object()
+
+
+def utc_timestamp() -> str:
+    """Timestamp in the same format SQLite uses for CURRENT_TIMESTAMP."""
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+class BufferedLogWriter:
+    """Bounded queue + background writer that batches log rows into one commit."""
+
+    def __init__(
+        self,
+        db_path: str,
+        *,
+        batch_size: int = 100,
+        flush_interval_ms: int = 250,
+        max_queue: int = 10_000,
+        overflow: str = "block",
+        spill_path: Optional[str] = None,
+    ):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"overflow must be one of {OVERFLOW_POLICIES}, got {overflow!r}")
+        self.db_path = db_path
+        self.batch_size = max(1, int(batch_size))
+        self.flush_interval = max(1, int(flush_interval_ms)) / 1000.0
+        self.overflow = overflow
+        self.spill_path = spill_path or os.path.join(os.path.dirname(db_path) or ".", "app_logs.spill.jsonl")
+
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max(1, int(max_queue)))
+        self._spill_lock = threading.Lock()
+        self._stats_lock = threading.Lock()  # producers and the writer thread both count
+        self._state_lock = threading.Lock()  # orders submit() against close()
+        self._closed = False
+        self.stats: Dict[str, int] = {"enqueued": 0, "written": 0, "batches": 0, "dropped": 0, "spilled": 0, "errors": 0}
+
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    # ---------- producer side ----------
+
+    def submit(self, level: str, agent: str, event: str, details: Dict[str, Any] | None,
+               trace_id: Optional[str] = None) -> bool:
+        """Queue one row. Returns False if the row was dropped by the overflow policy."""
+        row: LogRow = (utc_timestamp(), level, agent, event, json.dumps(details or {}), trace_id)
+        with self._state_lock:  # close() flips _closed under this lock, so no row is queued behind _STOP
+            if not self._closed:
+                return self._enqueue(row, level)
+        self._write_batch([row])
+        return True
+
+    def _enqueue(self, row: LogRow, level: str) -> bool:
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            if self.overflow == "drop_debug" and str(level).upper() == "DEBUG":
+                self._count("dropped")
+                return False
+            if self.overflow == "spill":
+                self._spill(row)
+                return True
+            self._queue.put(row)  # block until the writer catches up
+        self._count("enqueued")
+        return True
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until every row queued so far is committed. Returns False on timeout."""
+        done = threading.Event()
+        with self._state_lock:
+            if self._closed or not self._thread.is_alive():
+                return True
+            self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout: Optional[float] = 5.0) -> None:
+        """Flush outstanding rows and stop the writer thread (also runs at interpreter exit)."""
+        with self._state_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def _count(self, key: str, n: int = 1) -> None:
+        with self._stats_lock:
+            self.stats[key] += n
+
+    # ---------- consumer side ----------
+
+    def _run(self) -> None:
+        conn = self._connect()
+        self._replay_spill(conn)
+        pending: List[LogRow] = []
+        waiters: List[threading.Event] = []
+        deadline = time.monotonic() + self.flush_interval
+        stop = False
+        while not stop:
+            try:
+                item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                item = None
+            if item is _STOP:
+                stop = True
+            elif isinstance(item, threading.Event):
+                waiters.append(item)
+            elif item is not None:
+                pending.append(item)
+
+            if stop or waiters or len(pending) >= self.batch_size or time.monotonic() >= deadline:
+                # Drain whatever is already queued so the batch is as large as possible
+                while len(pending) < self.batch_size * 4:
+                    try:
+                        extra = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if extra is _STOP:
+                        stop = True
+                    elif isinstance(extra, threading.Event):
+                        waiters.append(extra)
+                    else:
+                        pending.append(extra)
+                if pending:
+                    self._write_batch(pending, conn)
+                    pending = []
+                for w in waiters:
+                    w.set()
+                waiters = []
+                deadline = time.monotonic() + self.flush_interval
+        conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def _write_batch(self, rows: List[LogRow], conn: Optional[sqlite3.Connection] = None) -> None:
+        own = conn is None
+        conn = conn or self._connect()
+        try:
+            with conn:  # one transaction per batch
+                conn.executemany(_INSERT, rows)
+            self._count("written", len(rows))
+            self._count("batches")
+        except sqlite3.Error:
+            # Never lose log rows on a transient lock; park them in the spill file instead
+            self._count("errors")
+            for row in rows:
+                self._spill(row)
+        finally:
+            if own:
+                conn.close()
+
+    # ---------- spill file ----------
+
+    def _spill(self, row: LogRow) -> None:
+        with self._spill_lock:
+            os.makedirs(os.path.dirname(self.spill_path) or ".", exist_ok=True)
+            with open(self.spill_path, "a", encoding="utf-8") as fh:
+                fh.write(json.dumps(row) + "\n")
+            self._count("spilled")
+
+    def _replay_spill(self, conn: sqlite3.Connection) -> None:
+        """Load rows spilled by a previous run back into app_logs."""
+        with self._spill_lock:
+            if not os.path.exists(self.spill_path):
+                return
+            with open(self.spill_path, encoding="utf-8") as fh:
+                # rows spilled before trace ids existed have five fields
+                rows = [(tuple(json.loads(line)) + (None,))[:6] for line in fh if line.strip()]
+            try:
+                with conn:
+                    conn.executemany(_INSERT, rows)
+            except sqlite3.Error:
+                return
+            os.remove(self.spill_path)
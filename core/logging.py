@@ -1,10 +1,9 @@
 # core/logging.py
 from __future__ import annotations
-from core.db import log_event as db_log_event, get_conn
+from core.storage import get_storage
 
 def log_event(level="INFO", agent="App", event="", details=None):
-    conn = get_conn()
-    db_log_event(conn, level=level, agent=agent, event=event, details=details or {})
+    get_storage().log_event(level=level, agent=agent, event=event, details=details or {})
     
 def log_info(agent: str, event: str, details: str = "") -> None:
     """Log an informational event."""
@@ -0,0 +1,149 @@
+# core/metrics.py
+"""
+Tiny in-process metrics registry: counters, gauges and latency histograms.
+
+Histograms use fixed log-spaced buckets, so memory stays constant no matter how
+many observations are recorded and percentiles are approximate (within ~5%).
+"""
+from __future__ import annotations
+import bisect
+import math
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List
+
+# 1µs .. ~1000s, 48 buckets per decade (~5% relative width)
+_BUCKETS: List[float] = [10 ** (e / 48.0) * 1e-6 for e in range(0, 9 * 48 + 1)]
+
+
+class Histogram:
+    """Constant-memory latency histogram (seconds)."""
+
+    __slots__ = ("counts", "count", "total", "min", "max")
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(_BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(_BUCKETS, value)] += 1
+        self.count += 1
+        self.total += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, q: float) -> float:
+        """Approximate q-th percentile (0..100); 0.0 when empty."""
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(self.count * q / 100.0))
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank:
+                upper = _BUCKETS[i] if i < len(_BUCKETS) else self.max
+                return min(max(upper, self.min), self.max)
+        return self.max
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "sum": self.total,
+            "mean": (self.total / self.count) if self.count else 0.0,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "max": self.max,
+        }
+
+
+_LOCK = threading.Lock()
+_COUNTERS: Dict[str, float] = {}
+_GAUGES: Dict[str, float] = {}
+_HISTOGRAMS: Dict[str, Histogram] = {}
+
+
+def incr(name: str, value: float = 1) -> None:
+    with _LOCK:
+        _COUNTERS[name] = _COUNTERS.get(name, 0) + value
+
+
+def set_gauge(name: str, value: float) -> None:
+    with _LOCK:
+        _GAUGES[name] = value
+
+
+def observe(name: str, seconds: float) -> None:
+    with _LOCK:
+        h = _HISTOGRAMS.get(name)
+        if h is None:
+            h = _HISTOGRAMS[name] = Histogram()
+        h.observe(seconds)
+
+
+@contextmanager
+def timer(name: str) -> Iterator[None]:
+    """Record the wall time of the block into histogram `name`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start)
+
+
+def snapshot() -> Dict[str, Dict]:
+    """Point-in-time copy of every metric, suitable for json.dumps or a DataFrame."""
+    with _LOCK:
+        return {
+            "counters": dict(_COUNTERS),
+            "gauges": dict(_GAUGES),
+            "histograms": {k: h.summary() for k, h in _HISTOGRAMS.items()},
+        }
+
+
+def _prom_name(name: str) -> str:
+    return re.sub(r"[^a-zA-Z0-9_]", "_", name)
+
+
+def _prom_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def to_prometheus(prefix: str = "support_") -> str:
+    """
+    Prometheus text exposition of the registry. Counters become `<prefix><name>_total`, gauges
+    `<prefix><name>`, and every histogram one series of the `<prefix>latency_seconds` summary
+    labelled by name (quantiles 0.5/0.95/0.99 plus _sum and _count).
+    """
+    snap = snapshot()
+    lines: List[str] = []
+    for name, value in sorted(snap["counters"].items()):
+        metric = f"{prefix}{_prom_name(name)}_total"
+        lines += [f"# TYPE {metric} counter", f"{metric} {value:g}"]
+    for name, value in sorted(snap["gauges"].items()):
+        metric = f"{prefix}{_prom_name(name)}"
+        lines += [f"# TYPE {metric} gauge", f"{metric} {value:g}"]
+    if snap["histograms"]:
+        metric = f"{prefix}latency_seconds"
+        lines.append(f"# TYPE {metric} summary")
+        for name, h in sorted(snap["histograms"].items()):
+            label = f'name="{_prom_label(name)}"'
+            for q, key in (("0.5", "p50"), ("0.95", "p95"), ("0.99", "p99")):
+                lines.append(f'{metric}{{{label},quantile="{q}"}} {h[key]:.9g}')
+            lines.append(f"{metric}_sum{{{label}}} {h['sum']:.9g}")
+            lines.append(f"{metric}_count{{{label}}} {h['count']}")
+    return "\n".join(lines) + "\n"
+
+
+def reset() -> None:
+    with _LOCK:
+        _COUNTERS.clear()
+        _GAUGES.clear()
+        _HISTOGRAMS.clear()
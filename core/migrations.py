@@ -0,0 +1,308 @@
+# core/migrations.py
+"""
+Versioned schema migrations keyed on `PRAGMA user_version`.
+
+Each migration runs once, inside its own write transaction, and bumps
+user_version to its number. Add new steps at the bottom with the next number;
+never edit a migration that has shipped.
+"""
+from __future__ import annotations
+import secrets
+import sqlite3
+from typing import Callable, Dict, List, Optional, Tuple
+
+from core.utils import customer_name_key, customer_phone_key
+
+Migration = Tuple[int, str, Callable[[sqlite3.Cursor], None]]
+MIGRATIONS: List[Migration] = []
+
+
+def migration(version: int, name: str):
+    """Register `fn(cur)` as schema step `version`."""
+    def wrap(fn: Callable[[sqlite3.Cursor], None]) -> Callable[[sqlite3.Cursor], None]:
+        MIGRATIONS.append((version, name, fn))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return fn
+    return wrap
+
+
+def current_version(conn: sqlite3.Connection) -> int:
+    return int(conn.execute("PRAGMA user_version").fetchone()[0])
+
+
+def latest_version() -> int:
+    return MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+
+def migrate(conn: sqlite3.Connection, target: Optional[int] = None) -> int:
+    """Apply pending migrations up to `target` (default: latest). Returns the resulting version."""
+    target = latest_version() if target is None else target
+    if current_version(conn) >= target:
+        return current_version(conn)
+    for version, _name, fn in MIGRATIONS:
+        if version > target:
+            break
+        if conn.in_transaction:
+            conn.commit()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Re-check under the write lock: another process may have migrated meanwhile
+            if current_version(conn) >= version:
+                conn.rollback()
+                continue
+            fn(conn.cursor())
+            conn.execute(f"PRAGMA user_version = {int(version)}")
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+    return current_version(conn)
+
+
+# ---------- Migrations ----------
+
+@migration(1, "base schema")
+def _v1_base_schema(cur: sqlite3.Cursor) -> None:
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS support_tickets (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        ticket_id TEXT UNIQUE,
+        customer_name TEXT,
+        description TEXT,
+        status TEXT DEFAULT 'Open',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS app_logs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        ts TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        level TEXT,
+        agent TEXT,
+        event TEXT,
+        details TEXT
+    )
+    """)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS ticket_notes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        ticket_id TEXT NOT NULL,
+        author TEXT DEFAULT 'customer',
+        note TEXT NOT NULL,
+        ts DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS ticket_actions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        ticket_id TEXT NOT NULL,
+        action TEXT NOT NULL,
+        ts DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+
+
+@migration(2, "hot-path indexes")
+def _v2_hot_path_indexes(cur: sqlite3.Cursor) -> None:
+    # find_open_ticket_by_customer: equality on name + status, newest first
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_tickets_customer_status_created "
+                "ON support_tickets (customer_name, status, created_at)")
+    # list_tickets / list_logs: newest first
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_tickets_created ON support_tickets (created_at)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_logs_ts ON app_logs (ts)")
+    # per-ticket follow-up history
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_notes_ticket ON ticket_notes (ticket_id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_actions_ticket ON ticket_actions (ticket_id)")
+
+
+@migration(3, "ticket id allocator")
+def _v3_ticket_id_allocator(cur: sqlite3.Cursor) -> None:
+    # One row per ID width; next_index counts reserved positions in that width's permutation
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS ticket_id_allocator (
+        width INTEGER PRIMARY KEY,
+        next_index INTEGER NOT NULL DEFAULT 0,
+        perm_key TEXT NOT NULL
+    )
+    """)
+    cur.execute("INSERT OR IGNORE INTO ticket_id_allocator (width, next_index, perm_key) VALUES (6, 0, ?)",
+                (secrets.token_hex(16),))
+
+
+@migration(4, "keyset pagination and delta fetch")
+def _v4_pagination(cur: sqlite3.Cursor) -> None:
+    # updated_at lets dashboards pull status changes as well as new rows
+    cur.execute("ALTER TABLE support_tickets ADD COLUMN updated_at TIMESTAMP")
+    cur.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_tickets_touch
+    AFTER UPDATE OF customer_name, description, status ON support_tickets
+    BEGIN
+        UPDATE support_tickets SET updated_at = CURRENT_TIMESTAMP WHERE id = NEW.id;
+    END
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_tickets_updated ON support_tickets (updated_at)")
+    # filtered pages: equality column first, then the (created_at|ts, id) sort key
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_tickets_status_created ON support_tickets (status, created_at)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_logs_level_ts ON app_logs (level, ts)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_logs_agent_ts ON app_logs (agent, ts)")
+
+
+@migration(5, "log archive manifest")
+def _v5_log_archives(cur: sqlite3.Cursor) -> None:
+    # One row per archived file; a day can have several parts if late rows arrive after it was archived
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS log_archives (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        day TEXT NOT NULL,
+        path TEXT NOT NULL UNIQUE,
+        rows INTEGER NOT NULL,
+        min_id INTEGER NOT NULL,
+        max_id INTEGER NOT NULL,
+        bytes INTEGER NOT NULL,
+        archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_log_archives_day ON log_archives (day)")
+
+
+@migration(6, "trace id on log rows")
+def _v6_log_trace_id(cur: sqlite3.Cursor) -> None:
+    cur.execute("ALTER TABLE app_logs ADD COLUMN trace_id TEXT")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_logs_trace ON app_logs (trace_id)")
+
+
+# ---------- Full-text search ----------
+
+# FTS5 index → (content table, indexed column). External-content tables store only the index;
+# the triggers below keep them in step with the base rows. Prefix indexes up to six characters
+# keep search-as-you-type queries off the slow full-vocabulary prefix scan.
+SEARCH_INDEXES = {
+    "tickets_fts": ("support_tickets", "description"),
+    "notes_fts": ("ticket_notes", "note"),
+}
+
+
+def create_search_index(cur: sqlite3.Cursor) -> bool:
+    """Create the FTS5 tables and sync triggers if missing. False when SQLite lacks FTS5."""
+    for fts, (table, column) in SEARCH_INDEXES.items():
+        try:
+            cur.execute(f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(
+                {column}, content='{table}', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2', prefix='2 3 4 5 6'
+            )
+            """)
+        except sqlite3.OperationalError as e:
+            if "fts5" in str(e):
+                return False  # search falls back to LIKE scans
+            raise
+        cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{fts}_ai AFTER INSERT ON {table} BEGIN
+            INSERT INTO {fts} (rowid, {column}) VALUES (new.id, new.{column});
+        END
+        """)
+        cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{fts}_ad AFTER DELETE ON {table} BEGIN
+            INSERT INTO {fts} ({fts}, rowid, {column}) VALUES ('delete', old.id, old.{column});
+        END
+        """)
+        cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{fts}_au AFTER UPDATE OF {column} ON {table} BEGIN
+            INSERT INTO {fts} ({fts}, rowid, {column}) VALUES ('delete', old.id, old.{column});
+            INSERT INTO {fts} (rowid, {column}) VALUES (new.id, new.{column});
+        END
+        """)
+    return True
+
+
+@migration(7, "full-text search")
+def _v7_full_text_search(cur: sqlite3.Cursor) -> None:
+    if create_search_index(cur):
+        for fts in SEARCH_INDEXES:
+            cur.execute(f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')")  # index rows that predate the triggers
+
+
+# ---------- Customers ----------
+
+def upsert_customer(cur: sqlite3.Cursor, name: Optional[str], phone: Optional[str]) -> Optional[int]:
+    """
+    Customer id for a display name and/or phone, creating the customer if neither key is known.
+    The phone wins when both match different customers; a known name gains the phone if it had none.
+    """
+    name_key, phone_key = customer_name_key(name or ""), customer_phone_key(phone or "")
+    if phone_key:
+        row = cur.execute("SELECT id FROM customers WHERE phone = ?", (phone_key,)).fetchone()
+        if row:
+            return row[0]
+    if name_key:
+        row = cur.execute("SELECT id, phone FROM customers WHERE name_key = ?", (name_key,)).fetchone()
+        if row:
+            if phone_key and row[1] is None:
+                cur.execute("UPDATE customers SET phone = ? WHERE id = ?", (phone_key, row[0]))
+            return row[0]
+    if not (name_key or phone_key):
+        return None
+    cur.execute("INSERT INTO customers (name_key, display_name, phone) VALUES (?, ?, ?)",
+                (name_key, " ".join((name or "").split()) or None, phone_key))
+    return cur.lastrowid
+
+
+def link_ticket_customers(cur: sqlite3.Cursor, customers: Optional[sqlite3.Cursor] = None) -> int:
+    """
+    Set customer_id on tickets that lack one (placeholder names stay unlinked). Returns tickets linked.
+    `customers` is a cursor on the file holding the customers table, when tickets live in a shard.
+    """
+    ids: Dict[str, Optional[int]] = {}
+    names = [r[0] for r in cur.execute(
+        "SELECT DISTINCT customer_name FROM support_tickets WHERE customer_id IS NULL").fetchall()]
+    for name in names:
+        ids[name] = upsert_customer(customers or cur, name, None)
+    linked = [(cid, name) for name, cid in ids.items() if cid is not None]
+    if not linked:
+        return 0
+    cur.executemany("UPDATE support_tickets SET customer_id = ? WHERE customer_id IS NULL AND customer_name = ?", linked)
+    return cur.rowcount
+
+
+@migration(8, "customers")
+def _v8_customers(cur: sqlite3.Cursor) -> None:
+    # name_key / phone are the normalized lookup keys (core.utils.customer_name_key / customer_phone_key)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS customers (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name_key TEXT,
+        display_name TEXT,
+        phone TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_customers_name_key ON customers (name_key) WHERE name_key IS NOT NULL")
+    cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_customers_phone ON customers (phone) WHERE phone IS NOT NULL")
+    cur.execute("ALTER TABLE support_tickets ADD COLUMN customer_id INTEGER REFERENCES customers (id)")
+    # find_open_ticket_by_customer: equality on customer_id + status, newest first
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_tickets_customer_id_status_created "
+                "ON support_tickets (customer_id, status, created_at)")
+    link_ticket_customers(cur)
+    # callback numbers left on follow-ups become the customer's phone (first owner keeps a shared number)
+    cur.execute("""
+    UPDATE OR IGNORE customers SET phone = (
+        SELECT substr(n.note, length('callback_phone:') + 1)
+        FROM ticket_notes n JOIN support_tickets t ON t.ticket_id = n.ticket_id
+        WHERE t.customer_id = customers.id AND n.note LIKE 'callback_phone:%'
+          AND length(n.note) >= length('callback_phone:') + 10
+        ORDER BY n.id DESC LIMIT 1
+    )
+    WHERE phone IS NULL
+    """)
+
+
+@migration(9, "db layout")
+def _v9_db_layout(cur: sqlite3.Cursor) -> None:
+    # What this file holds when tickets are sharded (core.shards): role main | shard | logs,
+    # the shard count, and a shard's index. No rows = the unsharded single-file layout.
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS db_layout (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL
+    )
+    """)
@@ -0,0 +1,84 @@
+# core/shards.py
+"""
+Routing for sharded ticket storage (SUPPORT_DB_SHARDS > 1).
+
+Tickets, with their notes and actions, live in one of N SQLite files picked by a
+jump consistent hash of ticket_id, so growing from N to N+1 shards moves only
+about 1/(N+1) of the tickets. Logs get their own file, and the main database
+keeps customers and the ticket-ID allocator. With one shard everything stays
+in the main file, as before sharding existed.
+
+Row ids of shard i start at i << ROW_ID_BITS, so ids are unique across shards
+and (created_at, id) stays a total order for keyset paging; shard_of_row()
+recovers the shard from an id.
+"""
+from __future__ import annotations
+import hashlib
+import os
+import sqlite3
+from typing import List, Optional
+
+ROW_ID_BITS = 40
+SHARDED_TABLES = ("support_tickets", "ticket_notes", "ticket_actions")
+
+
+def jump_hash(key: int, buckets: int) -> int:
+    """Lamping & Veach jump consistent hash of a 64-bit key into [0, buckets)."""
+    b, j = -1, 0
+    while j < buckets:
+        b = j
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        j = int((b + 1) * (float(1 << 31) / float((key >> 33) + 1)))
+    return b
+
+
+def shard_of(ticket_id: str, shards: int) -> int:
+    if shards <= 1:
+        return 0
+    digest = hashlib.blake2b(str(ticket_id).encode("utf-8"), digest_size=8).digest()
+    return jump_hash(int.from_bytes(digest, "big"), shards)
+
+
+def shard_of_row(row_id: int) -> int:
+    return int(row_id) >> ROW_ID_BITS
+
+
+def shard_paths(db_path: str, shards: int) -> List[str]:
+    """Files holding ticket data: the main database itself when unsharded."""
+    if shards <= 1:
+        return [db_path]
+    stem, ext = os.path.splitext(db_path)
+    return [f"{stem}-shard{i:02d}{ext or '.db'}" for i in range(shards)]
+
+
+def log_path(db_path: str, shards: int) -> str:
+    if shards <= 1:
+        return db_path
+    stem, ext = os.path.splitext(db_path)
+    return f"{stem}-logs{ext or '.db'}"
+
+
+# ---------- Layout records (db_layout table, migration v9) ----------
+
+def get_layout(conn: sqlite3.Connection, key: str) -> Optional[str]:
+    row = conn.execute("SELECT value FROM db_layout WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else None
+
+
+def set_layout(conn: sqlite3.Connection, **values: object) -> None:
+    conn.executemany("INSERT OR REPLACE INTO db_layout (key, value) VALUES (?, ?)",
+                     [(k, str(v)) for k, v in values.items()])
+
+
+def init_shard(conn: sqlite3.Connection, index: int, shards: int) -> None:
+    """Label a migrated shard file and start its row ids at index << ROW_ID_BITS (idempotent)."""
+    with conn:
+        if get_layout(conn, "role") is None:
+            set_layout(conn, role="shard", shard_index=index, shards=shards)
+        base = index << ROW_ID_BITS
+        for table in SHARDED_TABLES:
+            row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (table,)).fetchone()
+            if row is None:
+                conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)", (table, base))
+            elif row[0] < base:
+                conn.execute("UPDATE sqlite_sequence SET seq = ? WHERE name = ?", (base, table))
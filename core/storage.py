@@ -0,0 +1,612 @@
+# core/storage.py
+"""
+Storage engines behind the agents.
+
+`Storage` is the set of ticket, note, action, customer and log operations the
+agents and the HTTP service use. Two engines implement it:
+
+  SQLiteStorage  the core.db functions (WAL SQLite, optional shards); the default
+  MemoryStorage  dicts plus the indexes those operations need, for tests,
+                 benchmarks, the batch CLI and load tests that don't need files
+
+SUPPORT_STORAGE=memory selects the in-memory engine for get_storage(). Both
+engines follow the same rules:
+  - ticket_id is unique, and a duplicate raises IntegrityError
+  - find_open_ticket_by_customer returns the newest Open or In-Progress ticket
+  - status changes stamp updated_at
+  - transaction() commits atomically, and nested blocks are savepoints
+  - data_version() moves after every write, so callers can skip re-reading unchanged data
+`python -m tools.storage_conformance` checks these rules against both engines.
+
+MemoryStorage.search_tickets is an unranked substring match, like core.db's LIKE
+fallback. Bulk imports, log retention and resharding stay SQLite-only (core.db).
+"""
+from __future__ import annotations
+import bisect
+import json
+import os
+import re
+import secrets
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, ContextManager, Dict, Iterator, List, Mapping, Optional, Protocol, Tuple, Union
+
+from core import tracing
+from core.utils import customer_name_key, customer_phone_key
+
+BACKEND = os.getenv("SUPPORT_STORAGE", "sqlite").strip().lower()
+BACKENDS = ("sqlite", "memory")
+OPEN_STATUSES = ("Open", "In-Progress")
+
+IntegrityError = sqlite3.IntegrityError  # raised by both engines, so existing except clauses keep working
+
+Cursor = Tuple[str, int]  # (created_at | ts, id), as in core.db
+
+
+class Storage(Protocol):
+    name: str
+
+    def init(self) -> None: ...
+    def ping(self) -> None: ...
+    def data_version(self) -> int: ...
+    def transaction(self) -> ContextManager[Any]: ...
+    def reserve_ticket_ids(self, n: int = 1) -> None: ...
+    def next_ticket_id(self) -> str: ...
+
+    def insert_ticket(self, *, ticket_id: str, customer_name: str, description: str, status: str = "Open",
+                      customer_id: Optional[int] = None, phone: Optional[str] = None) -> None: ...
+    def get_ticket(self, ticket_id: str) -> Optional[Dict[str, Any]]: ...
+    def list_tickets(self, limit: int = 200) -> List[Dict[str, Any]]: ...
+    def page_tickets(self, *, cursor: Optional[Cursor] = None, limit: int = 50, status: Any = None,
+                     customer_name: Optional[str] = None, since: Optional[str] = None,
+                     until: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[Cursor]]: ...
+    def tickets_since(self, *, last_id: Union[int, Mapping[int, int]] = 0, updated_since: Optional[str] = None,
+                      limit: int = 1000, status: Any = None) -> List[Dict[str, Any]]: ...
+    def max_row_ids(self, kind: str = "tickets") -> Dict[int, int]: ...
+    def search_tickets(self, query: str, *, limit: int = 20, offset: int = 0, status: Any = None,
+                       notes: bool = True,
+                       highlight: Tuple[str, str] = ("**", "**")) -> Tuple[List[Dict[str, Any]], Optional[int]]: ...
+    def update_ticket_status(self, *, ticket_id: str, status: str) -> None: ...
+    def find_open_ticket_by_customer(self, customer_name: str, *, phone: Optional[str] = None,
+                                     customer_id: Optional[int] = None) -> Optional[Tuple[str, str]]: ...
+
+    def find_customer(self, *, name: Optional[str] = None, phone: Optional[str] = None) -> Optional[Dict[str, Any]]: ...
+    def resolve_customer(self, *, name: Optional[str] = None, phone: Optional[str] = None) -> Optional[int]: ...
+
+    def append_ticket_note(self, *, ticket_id: str, note: str, author: str = "customer") -> None: ...
+    def add_ticket_action_flag(self, *, ticket_id: str, action: str) -> None: ...
+    def get_ticket_notes(self, ticket_id: str) -> List[Dict[str, Any]]: ...
+    def get_ticket_actions(self, ticket_id: str) -> List[Dict[str, Any]]: ...
+
+    def log_event(self, *, level: str = "INFO", agent: str = "App", event: str = "",
+                  details: Optional[Dict[str, Any]] = None, trace_id: Optional[str] = None) -> None: ...
+    def list_logs(self, limit: int = 200) -> List[Dict[str, Any]]: ...
+    def page_logs(self, *, cursor: Optional[Cursor] = None, limit: int = 50, level: Any = None, agent: Any = None,
+                  trace_id: Optional[str] = None, since: Optional[str] = None,
+                  until: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[Cursor]]: ...
+    def logs_since(self, *, last_id: int = 0, limit: int = 1000, level: Any = None,
+                   agent: Any = None) -> List[Dict[str, Any]]: ...
+
+
+# ---------- SQLite ----------
+
+class SQLiteStorage:
+    """
+    The core.db functions behind the Storage interface. With a `conn` every call uses it
+    (one instance per thread); without one, each call uses the calling thread's pooled connection.
+    """
+    name = "sqlite"
+
+    def __init__(self, conn: Optional[sqlite3.Connection] = None):
+        self.conn = conn
+
+    def init(self) -> None:
+        from core import db
+        db.init_db()  # opening the first connection runs pending migrations
+
+    def ping(self) -> None:
+        from core import db
+        db._ensure_conn(self.conn).execute("SELECT 1").fetchone()
+
+    def data_version(self) -> int:
+        from core import db
+        return db.data_version(self.conn)
+
+    def transaction(self) -> ContextManager[Any]:
+        from core import db
+        return db.transaction(self.conn)
+
+    def reserve_ticket_ids(self, n: int = 1) -> None:
+        from core.ticket_ids import prefetch_ticket_ids
+        prefetch_ticket_ids(n)
+
+    def next_ticket_id(self) -> str:
+        from core.ticket_ids import allocate_ticket_id
+        return allocate_ticket_id()
+
+    def insert_ticket(self, **fields: Any) -> None:
+        from core import db
+        db.insert_ticket(self.conn, **fields)
+
+    def get_ticket(self, ticket_id: str) -> Optional[Dict[str, Any]]:
+        from core import db
+        return db.get_ticket(self.conn, ticket_id)
+
+    def list_tickets(self, limit: int = 200) -> List[Dict[str, Any]]:
+        from core import db
+        return db.list_tickets(self.conn, limit)
+
+    def page_tickets(self, **kwargs: Any) -> Tuple[List[Dict[str, Any]], Optional[Cursor]]:
+        from core import db
+        return db.page_tickets(self.conn, **kwargs)
+
+    def tickets_since(self, **kwargs: Any) -> List[Dict[str, Any]]:
+        from core import db
+        return db.tickets_since(self.conn, **kwargs)
+
+    def max_row_ids(self, kind: str = "tickets") -> Dict[int, int]:
+        from core import db
+        return db.max_row_ids(self.conn, kind)
+
+    def search_tickets(self, query: str, **kwargs: Any) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        from core import db
+        return db.search_tickets(self.conn, query, **kwargs)
+
+    def update_ticket_status(self, *, ticket_id: str, status: str) -> None:
+        from core import db
+        db.update_ticket_status(self.conn, ticket_id=ticket_id, status=status)
+
+    def find_open_ticket_by_customer(self, customer_name: str, **kwargs: Any) -> Optional[Tuple[str, str]]:
+        from core import db
+        return db.find_open_ticket_by_customer(self.conn, customer_name, **kwargs)
+
+    def find_customer(self, **kwargs: Any) -> Optional[Dict[str, Any]]:
+        from core import db
+        return db.find_customer(self.conn, **kwargs)
+
+    def resolve_customer(self, **kwargs: Any) -> Optional[int]:
+        from core import db
+        return db.resolve_customer(self.conn, **kwargs)
+
+    def append_ticket_note(self, **fields: Any) -> None:
+        from core import db
+        db.append_ticket_note(self.conn, **fields)
+
+    def add_ticket_action_flag(self, **fields: Any) -> None:
+        from core import db
+        db.add_ticket_action_flag(self.conn, **fields)
+
+    def get_ticket_notes(self, ticket_id: str) -> List[Dict[str, Any]]:
+        from core import db
+        return db.get_ticket_notes(self.conn, ticket_id)
+
+    def get_ticket_actions(self, ticket_id: str) -> List[Dict[str, Any]]:
+        from core import db
+        return db.get_ticket_actions(self.conn, ticket_id)
+
+    def log_event(self, **fields: Any) -> None:
+        from core import db
+        db.log_event(self.conn, **fields)
+
+    def list_logs(self, limit: int = 200) -> List[Dict[str, Any]]:
+        from core import db
+        return db.list_logs(self.conn, limit)
+
+    def page_logs(self, **kwargs: Any) -> Tuple[List[Dict[str, Any]], Optional[Cursor]]:
+        from core import db
+        return db.page_logs(self.conn, **kwargs)
+
+    def logs_since(self, **kwargs: Any) -> List[Dict[str, Any]]:
+        from core import db
+        return db.logs_since(self.conn, **kwargs)
+
+
+# ---------- In-memory ----------
+
+def _now() -> str:
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())  # SQLite's CURRENT_TIMESTAMP
+
+
+def _matches(value: Any, wanted: Any) -> bool:
+    """core.db._filters for one value: None or an empty list matches anything."""
+    if wanted is None:
+        return True
+    if isinstance(wanted, str):
+        return value == wanted
+    wanted = list(wanted)
+    return not wanted or value in wanted
+
+
+class MemoryStorage:
+    """
+    Dict-backed engine with the same results as SQLiteStorage. The indexes are:
+    tickets by ticket_id, customers by name key and phone, open tickets per customer, and
+    (created_at, id) / (ts, id) orderings for keyset paging. A transaction holds the
+    engine's lock until it ends, like SQLite's single writer, so other threads wait for
+    it instead of reading the last committed state. Writes record undo steps, which
+    rollback replays newest first.
+    """
+    name = "memory"
+
+    def __init__(self) -> None:
+        self._lock = threading.RLock()
+        self._undo: Optional[List[Callable[[], None]]] = None  # open transaction's undo steps
+        self._tickets: Dict[int, Dict[str, Any]] = {}
+        self._by_ticket_id: Dict[str, int] = {}
+        self._ticket_ids: List[int] = []           # ascending row ids (tickets_since)
+        self._ticket_order: List[Cursor] = []      # ascending (created_at, id) (paging)
+        self._open: Dict[int, Dict[int, str]] = {}  # customer_id -> {row id: created_at} of open tickets
+        self._customers: Dict[int, Dict[str, Any]] = {}
+        self._by_name_key: Dict[str, int] = {}
+        self._by_phone: Dict[str, int] = {}
+        self._notes: Dict[str, List[Dict[str, Any]]] = {}
+        self._actions: Dict[str, List[Dict[str, Any]]] = {}
+        self._logs: Dict[int, Dict[str, Any]] = {}
+        self._log_ids: List[int] = []
+        self._log_order: List[Cursor] = []
+        self._seq: Dict[str, int] = {}
+        self._version = 0
+        self._id_width = 6
+        self._id_index = 0
+        self._id_perm = None
+
+    # ----- plumbing -----
+
+    def _next(self, table: str) -> int:
+        self._seq[table] = self._seq.get(table, 0) + 1  # AUTOINCREMENT: ids are never reused, even after rollback
+        return self._seq[table]
+
+    def _on_rollback(self, step: Callable[[], None]) -> None:
+        self._version += 1  # every write registers an undo step, so data_version moves here
+        if self._undo is not None:
+            self._undo.append(step)
+
+    def init(self) -> None:
+        return None
+
+    def ping(self) -> None:
+        return None
+
+    def data_version(self) -> int:
+        with self._lock:  # waits for an open transaction, so the version covers committed writes
+            return self._version
+
+    @contextmanager
+    def transaction(self) -> Iterator["MemoryStorage"]:
+        with self._lock:
+            outer = self._undo is None
+            if outer:
+                self._undo = []
+            mark = len(self._undo)  # nested blocks undo back to here, like ROLLBACK TO a savepoint
+            try:
+                yield self
+            except BaseException:
+                while len(self._undo) > mark:
+                    self._undo.pop()()
+                raise
+            finally:
+                if outer:
+                    self._undo = None
+
+    def reserve_ticket_ids(self, n: int = 1) -> None:
+        return None
+
+    def next_ticket_id(self) -> str:
+        """Same scheme as core.ticket_ids (keyed permutation of a counter, widening at 90%), kept in memory."""
+        from core.ticket_ids import WIDEN_AT, FeistelPermutation
+        with self._lock:
+            while True:
+                if self._id_perm is None or self._id_index >= 10 ** self._id_width * WIDEN_AT:
+                    if self._id_perm is not None:
+                        self._id_width, self._id_index = self._id_width + 1, 0
+                    self._id_perm = FeistelPermutation(10 ** self._id_width, secrets.token_hex(16))
+                candidate = f"{self._id_perm(self._id_index):0{self._id_width}d}"
+                self._id_index += 1
+                if candidate not in self._by_ticket_id:
+                    return candidate
+
+    # ----- customers -----
+
+    def _upsert_customer(self, name: Optional[str], phone: Optional[str]) -> Optional[int]:
+        """core.migrations.upsert_customer."""
+        name_key, phone_key = customer_name_key(name or ""), customer_phone_key(phone or "")
+        if phone_key and phone_key in self._by_phone:
+            return self._by_phone[phone_key]
+        if name_key and name_key in self._by_name_key:
+            cid = self._by_name_key[name_key]
+            row = self._customers[cid]
+            if phone_key and row["phone"] is None:
+                row["phone"] = phone_key
+                self._by_phone[phone_key] = cid
+
+                def undo_phone() -> None:
+                    row["phone"] = None
+                    del self._by_phone[phone_key]
+                self._on_rollback(undo_phone)
+            return cid
+        if not (name_key or phone_key):
+            return None
+        cid = self._next("customers")
+        self._customers[cid] = {"id": cid, "name_key": name_key or None,
+                                "display_name": " ".join((name or "").split()) or None,
+                                "phone": phone_key or None, "created_at": _now()}
+        if name_key:
+            self._by_name_key[name_key] = cid
+        if phone_key:
+            self._by_phone[phone_key] = cid
+
+        def undo_insert() -> None:
+            del self._customers[cid]
+            self._by_name_key.pop(name_key, None)
+            self._by_phone.pop(phone_key, None)
+        self._on_rollback(undo_insert)
+        return cid
+
+    def find_customer(self, *, name: Optional[str] = None, phone: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        phone_key, name_key = customer_phone_key(phone or ""), customer_name_key(name or "")
+        with self._lock:
+            cid = self._by_phone.get(phone_key) if phone_key else None
+            if cid is None and name_key:
+                cid = self._by_name_key.get(name_key)
+            return dict(self._customers[cid]) if cid is not None else None
+
+    def resolve_customer(self, *, name: Optional[str] = None, phone: Optional[str] = None) -> Optional[int]:
+        with self._lock:
+            return self._upsert_customer(name, phone)
+
+    # ----- tickets -----
+
+    def _set_open(self, row: Dict[str, Any]) -> None:
+        cid = row["customer_id"]
+        if cid is None:
+            return
+        if row["status"] in OPEN_STATUSES:
+            self._open.setdefault(cid, {})[row["id"]] = row["created_at"]
+        else:
+            self._open.get(cid, {}).pop(row["id"], None)
+
+    def insert_ticket(self, *, ticket_id: str, customer_name: str, description: str, status: str = "Open",
+                      customer_id: Optional[int] = None, phone: Optional[str] = None) -> None:
+        with self._lock:
+            if ticket_id in self._by_ticket_id:
+                raise IntegrityError("UNIQUE constraint failed: support_tickets.ticket_id")
+            if customer_id is None:
+                customer_id = self._upsert_customer(customer_name, phone)
+            rid = self._next("support_tickets")
+            row = {"id": rid, "ticket_id": ticket_id, "customer_name": customer_name, "description": description,
+                   "status": status, "created_at": _now(), "updated_at": None, "customer_id": customer_id}
+            self._tickets[rid] = row
+            self._by_ticket_id[ticket_id] = rid
+            self._ticket_ids.append(rid)
+            key = (row["created_at"], rid)
+            bisect.insort(self._ticket_order, key)
+            self._set_open(row)
+
+            def undo() -> None:
+                del self._tickets[rid]
+                del self._by_ticket_id[ticket_id]
+                self._ticket_ids.remove(rid)
+                self._ticket_order.remove(key)
+                if customer_id is not None:
+                    self._open.get(customer_id, {}).pop(rid, None)
+            self._on_rollback(undo)
+
+    def get_ticket(self, ticket_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            rid = self._by_ticket_id.get(ticket_id)
+            return dict(self._tickets[rid]) if rid is not None else None
+
+    def list_tickets(self, limit: int = 200) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [dict(self._tickets[rid]) for _, rid in reversed(self._ticket_order[-limit:] if limit > 0 else [])]
+
+    def page_tickets(self, *, cursor: Optional[Cursor] = None, limit: int = 50, status: Any = None,
+                     customer_name: Optional[str] = None, since: Optional[str] = None,
+                     until: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[Cursor]]:
+        def keep(row: Dict[str, Any]) -> bool:
+            return _matches(row["status"], status) and _matches(row["customer_name"], customer_name)
+        with self._lock:
+            return _page(self._ticket_order, self._tickets, "created_at", keep, cursor, since, until, limit)
+
+    def tickets_since(self, *, last_id: Union[int, Mapping[int, int]] = 0, updated_since: Optional[str] = None,
+                      limit: int = 1000, status: Any = None) -> List[Dict[str, Any]]:
+        if isinstance(last_id, Mapping):  # a per-shard cursor from SQLiteStorage; one id space here
+            last_id = max(last_id.values(), default=0)
+        with self._lock:
+            ids = set(self._ticket_ids[bisect.bisect_right(self._ticket_ids, int(last_id)):])
+            if updated_since is not None:
+                ids.update(rid for rid, row in self._tickets.items()
+                           if row["updated_at"] is not None and row["updated_at"] >= updated_since)
+            rows = [self._tickets[rid] for rid in sorted(ids) if _matches(self._tickets[rid]["status"], status)]
+            return [dict(r) for r in rows[:limit]]
+
+    def max_row_ids(self, kind: str = "tickets") -> Dict[int, int]:
+        with self._lock:
+            ids = self._ticket_ids if kind == "tickets" else self._log_ids
+            return {0: ids[-1] if ids else 0}
+
+    def search_tickets(self, query: str, *, limit: int = 20, offset: int = 0, status: Any = None,
+                       notes: bool = True,
+                       highlight: Tuple[str, str] = ("**", "**")) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """
+        core.db's LIKE fallback: tickets with every word in the description or a note, newest first,
+        unranked (score None). The snippet is the start of the matching text with hits highlighted.
+        """
+        words = [w.lower() for w in re.findall(r"\w+", query)]
+        if not words:
+            return [], None
+        hits = re.compile("|".join(re.escape(w) for w in words), re.IGNORECASE)
+        opened, closed = highlight
+
+        def mark(m: "re.Match[str]") -> str:
+            return f"{opened}{m.group(0)}{closed}"
+        out: List[Dict[str, Any]] = []
+        with self._lock:
+            skip = int(offset)
+            for _, rid in reversed(self._ticket_order):
+                row = self._tickets[rid]
+                if not _matches(row["status"], status):
+                    continue
+                description = row["description"].lower()
+                texts = [n["note"].lower() for n in self._notes.get(row["ticket_id"], [])] if notes else []
+                if not all(w in description or any(w in t for t in texts) for w in words):
+                    continue
+                if skip:
+                    skip -= 1
+                    continue
+                if len(out) == limit:
+                    return out, int(offset) + limit
+                if all(w in description for w in words):
+                    matched, text = "description", row["description"]
+                else:
+                    matched = "note"
+                    text = next(n["note"] for n in self._notes[row["ticket_id"]]
+                                if any(w in n["note"].lower() for w in words))
+                out.append({**row, "score": None, "matched": matched, "snippet": hits.sub(mark, text[:120])})
+        return out, None
+
+    def update_ticket_status(self, *, ticket_id: str, status: str) -> None:
+        with self._lock:
+            rid = self._by_ticket_id.get(ticket_id)
+            if rid is None:
+                return
+            row = self._tickets[rid]
+            before = (row["status"], row["updated_at"])
+            row["status"], row["updated_at"] = status, _now()  # trg_tickets_touch
+            self._set_open(row)
+
+            def undo() -> None:
+                row["status"], row["updated_at"] = before
+                self._set_open(row)
+            self._on_rollback(undo)
+
+    def find_open_ticket_by_customer(self, customer_name: str, *, phone: Optional[str] = None,
+                                     customer_id: Optional[int] = None) -> Optional[Tuple[str, str]]:
+        with self._lock:
+            if customer_id is None:
+                customer = self.find_customer(name=customer_name, phone=phone)
+                if customer is None:
+                    return None
+                customer_id = customer["id"]
+            open_rows = self._open.get(customer_id)
+            if not open_rows:
+                return None
+            _, rid = max((created, rid) for rid, created in open_rows.items())
+            row = self._tickets[rid]
+            return row["ticket_id"], row["status"]
+
+    # ----- notes & actions -----
+
+    def _append(self, table: str, index: Dict[str, List[Dict[str, Any]]], row: Dict[str, Any]) -> None:
+        with self._lock:
+            row = {"id": self._next(table), **row, "ts": _now()}
+            rows = index.setdefault(row["ticket_id"], [])
+            rows.append(row)
+            self._on_rollback(rows.pop)
+
+    def append_ticket_note(self, *, ticket_id: str, note: str, author: str = "customer") -> None:
+        self._append("ticket_notes", self._notes, {"ticket_id": ticket_id, "author": author, "note": note})
+
+    def add_ticket_action_flag(self, *, ticket_id: str, action: str) -> None:
+        self._append("ticket_actions", self._actions, {"ticket_id": ticket_id, "action": action})
+
+    def get_ticket_notes(self, ticket_id: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [dict(r) for r in self._notes.get(ticket_id, [])]
+
+    def get_ticket_actions(self, ticket_id: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [dict(r) for r in self._actions.get(ticket_id, [])]
+
+    # ----- logs -----
+
+    def log_event(self, *, level: str = "INFO", agent: str = "App", event: str = "",
+                  details: Optional[Dict[str, Any]] = None, trace_id: Optional[str] = None) -> None:
+        with self._lock:
+            lid = self._next("app_logs")
+            row = {"id": lid, "ts": _now(), "level": level, "agent": agent, "event": event,
+                   "details": json.dumps(details or {}), "trace_id": trace_id or tracing.current_trace_id()}
+            key = (row["ts"], lid)
+            self._logs[lid] = row
+            self._log_ids.append(lid)
+            bisect.insort(self._log_order, key)
+
+            def undo() -> None:
+                del self._logs[lid]
+                self._log_ids.remove(lid)
+                self._log_order.remove(key)
+            self._on_rollback(undo)
+
+    def list_logs(self, limit: int = 200) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [dict(self._logs[lid]) for _, lid in reversed(self._log_order[-limit:] if limit > 0 else [])]
+
+    def page_logs(self, *, cursor: Optional[Cursor] = None, limit: int = 50, level: Any = None, agent: Any = None,
+                  trace_id: Optional[str] = None, since: Optional[str] = None,
+                  until: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[Cursor]]:
+        def keep(row: Dict[str, Any]) -> bool:
+            return (_matches(row["level"], level) and _matches(row["agent"], agent)
+                    and _matches(row["trace_id"], trace_id))
+        with self._lock:
+            return _page(self._log_order, self._logs, "ts", keep, cursor, since, until, limit)
+
+    def logs_since(self, *, last_id: int = 0, limit: int = 1000, level: Any = None,
+                   agent: Any = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            out: List[Dict[str, Any]] = []
+            for lid in self._log_ids[bisect.bisect_right(self._log_ids, int(last_id)):]:
+                row = self._logs[lid]
+                if _matches(row["level"], level) and _matches(row["agent"], agent):
+                    out.append(dict(row))
+                    if len(out) >= limit:
+                        break
+            return out
+
+
+def _page(order: List[Cursor], rows: Dict[int, Dict[str, Any]], sort_col: str, keep: Callable[[Dict[str, Any]], bool],
+          cursor: Optional[Cursor], since: Optional[str], until: Optional[str],
+          limit: int) -> Tuple[List[Dict[str, Any]], Optional[Cursor]]:
+    """core.db._page over an ascending (sort value, id) list: walk back from the cursor (or until) to since."""
+    end = len(order)
+    if cursor is not None:
+        end = bisect.bisect_left(order, (cursor[0], int(cursor[1])))
+    if until is not None:
+        end = min(end, bisect.bisect_left(order, (until,)))
+    out: List[Dict[str, Any]] = []
+    for i in range(end - 1, -1, -1):
+        if len(out) >= limit:
+            break
+        stamp, rid = order[i]
+        if since is not None and stamp < since:
+            break
+        row = rows[rid]
+        if keep(row):
+            out.append(dict(row))
+    next_cursor = (out[-1][sort_col], out[-1]["id"]) if out and len(out) == limit else None
+    return out, next_cursor
+
+
+# ---------- Selection ----------
+
+_STORAGE: Optional[Storage] = None
+_STORAGE_LOCK = threading.Lock()
+
+
+def make_storage(backend: str = BACKEND) -> Storage:
+    if backend == "memory":
+        return MemoryStorage()
+    if backend == "sqlite":
+        return SQLiteStorage()
+    raise ValueError(f"SUPPORT_STORAGE must be one of {BACKENDS}, got {backend!r}")
+
+
+def get_storage() -> Storage:
+    """Process-wide engine chosen by SUPPORT_STORAGE (created on first use)."""
+    global _STORAGE
+    if _STORAGE is None:
+        with _STORAGE_LOCK:
+            if _STORAGE is None:
+                _STORAGE = make_storage()
+    return _STORAGE
@@ -0,0 +1,276 @@
+# core/text_model.py
+"""
+Hashed n-gram linear classifier: the local tier between the keyword rules and the LLM.
+
+Messages become sparse TF-IDF vectors over hashed word unigrams/bigrams and character
+3–5-grams (no vocabulary to store), scored by a multinomial logistic regression.
+Probabilities are temperature-scaled on held-out data, so `predict_proba` can be read
+as confidence. Inference is batched NumPy: featurize a list of texts once, then one
+sparse × dense product for the whole batch.
+
+Train with `python -m eval.train_text_model`; the artifact is a small .npz
+(SUPPORT_TEXT_MODEL_PATH, default data/text_model.npz) holding only the weight rows of
+features seen in training, stored as float16.
+"""
+from __future__ import annotations
+import json
+import math
+import os
+import re
+import threading
+import zlib
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from core import metrics
+
+MODEL_PATH = os.getenv("SUPPORT_TEXT_MODEL_PATH", "data/text_model.npz")
+FORMAT_VERSION = 1
+
+_WORD_RE = re.compile(r"[a-z0-9']+")
+Csr = Tuple[np.ndarray, np.ndarray, np.ndarray]  # (indptr, indices, data)
+
+
+def _words(text: str) -> List[str]:
+    return _WORD_RE.findall((text or "").lower().replace("’", "'"))
+
+
+_WORD_CACHE: Dict[Tuple[str, Tuple[int, int]], List[int]] = {}  # word -> its unigram + char n-gram hashes
+_WORD_CACHE_MAX = 200_000
+
+
+def _word_hashes(word: str, char_ngrams: Tuple[int, int]) -> List[int]:
+    key = (word, char_ngrams)
+    hit = _WORD_CACHE.get(key)
+    if hit is None:
+        lo, hi = char_ngrams
+        padded = f" {word} "
+        feats = [f"w:{word}"] + [f"c:{padded[i:i + n]}" for n in range(lo, hi + 1)
+                                 for i in range(len(padded) - n + 1)]
+        hit = [zlib.crc32(f.encode("utf-8")) for f in feats]
+        if len(_WORD_CACHE) >= _WORD_CACHE_MAX:
+            _WORD_CACHE.clear()
+        _WORD_CACHE[key] = hit
+    return hit
+
+
+def _hashes(text: str, char_ngrams: Tuple[int, int]) -> List[int]:
+    words = _words(text)
+    out: List[int] = []
+    for w in words:
+        out += _word_hashes(w, char_ngrams)
+    out += [zlib.crc32(f"b:{a} {b}".encode("utf-8")) for a, b in zip(words, words[1:])]
+    return out
+
+
+class HashedNgramModel:
+    """Multinomial logistic regression over signed, hashed TF-IDF n-gram features."""
+
+    def __init__(self, labels: Sequence[str], *, n_features: int = 1 << 18, char_ngrams: Tuple[int, int] = (3, 5)):
+        if n_features & (n_features - 1):
+            raise ValueError("n_features must be a power of two")
+        self.labels = list(labels)
+        self.n_features = n_features
+        self.char_ngrams = (int(char_ngrams[0]), int(char_ngrams[1]))
+        self.weights = np.zeros((n_features, len(self.labels)), dtype=np.float32)
+        self.bias = np.zeros(len(self.labels), dtype=np.float32)
+        self.idf = np.ones(n_features, dtype=np.float32)
+        self.temperature = 1.0
+
+    # ---------- Features ----------
+
+    def _raw(self, texts: Sequence[str]) -> Csr:
+        """Sublinear signed term counts per (text, bucket), as CSR with sorted, unique columns."""
+        flat: List[int] = []
+        lengths: List[int] = []
+        for text in texts:
+            h = _hashes(text, self.char_ngrams)
+            flat += h
+            lengths.append(len(h))
+        n = len(texts)
+        if not flat:
+            return np.zeros(n + 1, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        h_arr = np.array(flat, dtype=np.uint32)
+        row = np.repeat(np.arange(n, dtype=np.int64), lengths)
+        col = (h_arr & (self.n_features - 1)).astype(np.int64)
+        sign = np.where(h_arr >> 31, -1.0, 1.0)  # signed hashing: collisions tend to cancel
+        keys, inverse = np.unique(row * self.n_features + col, return_inverse=True)
+        tf = np.bincount(inverse, weights=sign, minlength=keys.size).astype(np.float32)
+        tf = np.sign(tf) * (1.0 + np.log(np.maximum(np.abs(tf), 1.0)))
+        key_rows = keys // self.n_features
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(key_rows, minlength=n), out=indptr[1:])
+        return indptr, (keys % self.n_features).astype(np.int64), tf
+
+    def featurize(self, texts: Sequence[str]) -> Csr:
+        """TF-IDF rows, L2-normalized, as CSR (indptr, indices, data)."""
+        indptr, indices, data = self._raw(texts)
+        data = data * self.idf[indices]
+        row_ids = np.repeat(np.arange(len(texts)), np.diff(indptr))
+        norms = np.sqrt(np.bincount(row_ids, weights=data * data, minlength=len(texts)))
+        data = data / np.maximum(norms, 1e-12)[row_ids]
+        return indptr, indices, data.astype(np.float32)
+
+    def _logits(self, x: Csr) -> np.ndarray:
+        indptr, indices, data = x
+        n = len(indptr) - 1
+        row_ids = np.repeat(np.arange(n), np.diff(indptr))
+        contrib = self.weights[indices] * data[:, None]
+        out = np.empty((n, len(self.labels)), dtype=np.float64)
+        for c in range(len(self.labels)):
+            out[:, c] = np.bincount(row_ids, weights=contrib[:, c], minlength=n)
+        return out + self.bias
+
+    # ---------- Inference ----------
+
+    def predict_proba(self, texts: Sequence[str]) -> np.ndarray:
+        """Calibrated class probabilities, shape (len(texts), len(labels)), columns in `labels` order."""
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, len(self.labels)))
+        with metrics.timer("text_model.predict_batch"):
+            return _softmax(self._logits(self.featurize(texts)) / self.temperature)
+
+    def predict(self, texts: Sequence[str]) -> List[str]:
+        return [label for label, _ in self.predict_with_confidence(texts)]
+
+    def predict_with_confidence(self, texts: Sequence[str]) -> List[Tuple[str, float]]:
+        """(label, probability of that label) per text."""
+        proba = self.predict_proba(texts)
+        best = proba.argmax(axis=1)
+        return [(self.labels[j], float(proba[i, j])) for i, j in enumerate(best)]
+
+    # ---------- Training ----------
+
+    @classmethod
+    def train(cls, texts: Sequence[str], labels: Sequence[str], *, valid_texts: Sequence[str] = (),
+              valid_labels: Sequence[str] = (), label_order: Optional[Sequence[str]] = None,
+              n_features: int = 1 << 18, epochs: int = 20, batch_size: int = 256, learning_rate: float = 0.05,
+              l2: float = 1e-6, seed: int = 0) -> "HashedNgramModel":
+        """
+        Fit with mini-batch Adam on the cross-entropy, then fit the temperature on the validation
+        set (if given) by minimizing its negative log-likelihood.
+        """
+        order = list(label_order or sorted(set(labels)))
+        model = cls(order, n_features=n_features)
+        index = {label: i for i, label in enumerate(order)}
+        y = np.array([index[label] for label in labels], dtype=np.int64)
+
+        # IDF from the training texts (document frequency per hashed bucket)
+        indptr, indices, _ = model._raw(texts)
+        df = np.bincount(indices, minlength=n_features)
+        model.idf = (np.log((1.0 + len(texts)) / (1.0 + df)) + 1.0).astype(np.float32)
+        x_indptr, x_indices, x_data = model.featurize(texts)
+
+        rng = np.random.default_rng(seed)
+        m_w, v_w = np.zeros_like(model.weights), np.zeros_like(model.weights)
+        m_b, v_b = np.zeros_like(model.bias), np.zeros_like(model.bias)
+        beta1, beta2, eps, step = 0.9, 0.999, 1e-8, 0
+        for _ in range(max(1, epochs)):
+            perm = rng.permutation(len(texts))
+            for start in range(0, len(perm), batch_size):
+                batch = perm[start:start + batch_size]
+                x = _take_rows((x_indptr, x_indices, x_data), batch)
+                g = _softmax(model._logits(x))
+                g[np.arange(len(batch)), y[batch]] -= 1.0
+                g /= len(batch)
+                b_indptr, b_indices, b_data = x
+                row_ids = np.repeat(np.arange(len(batch)), np.diff(b_indptr))
+                grad_w = np.empty_like(model.weights)
+                for c in range(len(order)):
+                    grad_w[:, c] = np.bincount(b_indices, weights=b_data * g[row_ids, c], minlength=n_features)
+                grad_w += l2 * model.weights
+                grad_b = g.sum(axis=0).astype(np.float32)
+                step += 1
+                for p, grad, m, v in ((model.weights, grad_w, m_w, v_w), (model.bias, grad_b, m_b, v_b)):
+                    m *= beta1
+                    m += (1 - beta1) * grad
+                    v *= beta2
+                    v += (1 - beta2) * grad * grad
+                    p -= learning_rate * (m / (1 - beta1 ** step)) / (np.sqrt(v / (1 - beta2 ** step)) + eps)
+
+        if len(valid_texts):
+            model.temperature = model._fit_temperature(valid_texts, [index[label] for label in valid_labels])
+        return model
+
+    def _fit_temperature(self, texts: Sequence[str], y: Sequence[int]) -> float:
+        logits = self._logits(self.featurize(texts))
+        y_arr = np.asarray(y)
+        best_t, best_nll = 1.0, math.inf
+        for t in np.exp(np.linspace(math.log(0.05), math.log(20.0), 121)):
+            p = _softmax(logits / t)[np.arange(len(y_arr)), y_arr]
+            nll = float(-np.log(np.maximum(p, 1e-12)).mean())
+            if nll < best_nll:
+                best_t, best_nll = float(t), nll
+        return best_t
+
+    # ---------- Serialization ----------
+
+    def save(self, path: str) -> int:
+        """Write the compact artifact; returns its size in bytes."""
+        seen = np.flatnonzero(np.any(self.weights != 0, axis=1)).astype(np.int32)
+        config = {"format": FORMAT_VERSION, "labels": self.labels, "n_features": self.n_features,
+                  "char_ngrams": list(self.char_ngrams), "temperature": self.temperature,
+                  "idf_unseen": float(self.idf.max())}
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = path + ".tmp.npz"
+        np.savez_compressed(tmp, config=np.frombuffer(json.dumps(config).encode("utf-8"), dtype=np.uint8),
+                            rows=seen, weights=self.weights[seen].astype(np.float16),
+                            idf=self.idf[seen].astype(np.float16), bias=self.bias)
+        os.replace(tmp, path)
+        return os.path.getsize(path)
+
+    @classmethod
+    def load(cls, path: str) -> "HashedNgramModel":
+        with np.load(path) as z:
+            config = json.loads(z["config"].tobytes().decode("utf-8"))
+            if config.get("format") != FORMAT_VERSION:
+                raise ValueError(f"{path}: unsupported text model format {config.get('format')!r}")
+            model = cls(config["labels"], n_features=config["n_features"], char_ngrams=tuple(config["char_ngrams"]))
+            rows = z["rows"]
+            model.weights[rows] = z["weights"].astype(np.float32)
+            model.idf[:] = config["idf_unseen"]  # buckets never seen in training: maximal idf, zero weight
+            model.idf[rows] = z["idf"].astype(np.float32)
+            model.bias[:] = z["bias"]
+        model.temperature = float(config["temperature"])
+        return model
+
+
+def _softmax(z: np.ndarray) -> np.ndarray:
+    z = z - z.max(axis=1, keepdims=True)
+    e = np.exp(z)
+    return e / e.sum(axis=1, keepdims=True)
+
+
+def _take_rows(x: Csr, rows: np.ndarray) -> Csr:
+    indptr, indices, data = x
+    starts, ends = indptr[rows], indptr[rows + 1]
+    lengths = ends - starts
+    out_indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=out_indptr[1:])
+    take = np.repeat(starts - out_indptr[:-1], lengths) + np.arange(out_indptr[-1])
+    return out_indptr, indices[take], data[take]
+
+
+# ---------- Process-wide artifact cache ----------
+
+_CACHE: Dict[str, Tuple[float, HashedNgramModel]] = {}
+_CACHE_LOCK = threading.Lock()
+
+
+def load_model(path: Optional[str] = None) -> Optional[HashedNgramModel]:
+    """The artifact at `path` (default SUPPORT_TEXT_MODEL_PATH), loaded once per file version; None if absent."""
+    path = path or MODEL_PATH
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    with _CACHE_LOCK:
+        hit = _CACHE.get(path)
+        if hit is not None and hit[0] == mtime:
+            return hit[1]
+        model = HashedNgramModel.load(path)
+        _CACHE[path] = (mtime, model)
+        metrics.incr("text_model.loads")
+        return model
@@ -0,0 +1,124 @@
+# core/ticket_cache.py
+"""
+In-process read-through cache for hot ticket lookups.
+
+core.db keeps three kinds of entries here:
+  ("ticket", ticket_id)              → get_ticket row (or None: unknown ids are cached too)
+  ("open", customer_id)              → find_open_ticket_by_customer result (or None)
+  ("customer", phone_key, name_key)  → customer id (hits only)
+
+Entries expire after `ttl_seconds` and the cache is trimmed to `max_entries`,
+least recently used first. core.db drops the affected keys on every write
+that can change them, so within one process the TTL only bounds staleness
+against writers outside core.db. Hits and misses per kind are counted in
+core.metrics under `ticket_cache.*`.
+"""
+from __future__ import annotations
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, Optional, Tuple
+
+from core import metrics
+
+MAX_ENTRIES = int(os.getenv("SUPPORT_TICKET_CACHE_ENTRIES", "10000"))
+TTL_SECONDS = float(os.getenv("SUPPORT_TICKET_CACHE_TTL", "30"))
+# Multi-worker deployments: seconds between PRAGMA data_version polls per connection; any
+# commit from another connection or process then clears the cache. 0 = off.
+POLL_SECONDS = float(os.getenv("SUPPORT_TICKET_CACHE_POLL_S", "0"))
+KINDS = ("ticket", "open", "customer")
+
+MISS = object()
+
+
+def enabled() -> bool:
+    return os.getenv("SUPPORT_TICKET_CACHE", "1").strip().lower() not in ("0", "false", "no")
+
+
+class TicketCache:
+    """Size-bounded LRU with a TTL. Thread-safe."""
+
+    def __init__(self, *, max_entries: int = MAX_ENTRIES, ttl_seconds: float = TTL_SECONDS):
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl_seconds
+        self._lock = threading.Lock()
+        self._lru: "OrderedDict[Tuple[Hashable, ...], Tuple[Any, float]]" = OrderedDict()
+        self._generation = 0
+
+    @property
+    def generation(self) -> int:
+        """Read before querying and pass to put(): a write in between makes the put a no-op."""
+        return self._generation
+
+    def get(self, key: Tuple[Hashable, ...]) -> Any:
+        """Cached value (which may be None), or MISS."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._lru.get(key)
+            if entry is not None and now - entry[1] <= self.ttl:
+                self._lru.move_to_end(key)
+                metrics.incr(f"ticket_cache.hit_{key[0]}")
+                return entry[0]
+            if entry is not None:
+                del self._lru[key]
+        metrics.incr(f"ticket_cache.miss_{key[0]}")
+        return MISS
+
+    def put(self, key: Tuple[Hashable, ...], value: Any, generation: int) -> None:
+        with self._lock:
+            if generation != self._generation:
+                return  # something was invalidated while the caller queried; its value may be stale
+            self._lru[key] = (value, time.monotonic())
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.max_entries:
+                self._lru.popitem(last=False)
+
+    def invalidate(self, keys: Iterable[Tuple[Hashable, ...]] = (), kinds: Iterable[str] = ()) -> None:
+        """Drop the given keys and every entry of the given kinds."""
+        kinds = tuple(kinds)
+        with self._lock:
+            self._generation += 1
+            dropped = 0
+            for key in keys:
+                dropped += self._lru.pop(key, None) is not None
+            if kinds:
+                stale = [k for k in self._lru if k[0] in kinds]
+                for k in stale:
+                    del self._lru[k]
+                dropped += len(stale)
+        metrics.incr("ticket_cache.invalidations")
+        if dropped:
+            metrics.incr("ticket_cache.dropped", dropped)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._lru.clear()
+        metrics.incr("ticket_cache.cleared")
+
+    def stats(self) -> Dict[str, Any]:
+        c = metrics.snapshot()["counters"]
+        out: Dict[str, Any] = {"entries": len(self._lru)}
+        hits = misses = 0.0
+        for kind in KINDS:
+            h, m = c.get(f"ticket_cache.hit_{kind}", 0), c.get(f"ticket_cache.miss_{kind}", 0)
+            out[kind] = {"hits": h, "misses": m, "hit_ratio": (h / (h + m)) if (h + m) else 0.0}
+            hits, misses = hits + h, misses + m
+        out.update(hits=hits, misses=misses, hit_ratio=(hits / (hits + misses)) if (hits + misses) else 0.0,
+                   invalidations=c.get("ticket_cache.invalidations", 0), cleared=c.get("ticket_cache.cleared", 0))
+        return out
+
+
+_CACHE: Optional[TicketCache] = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_ticket_cache() -> TicketCache:
+    """Process-wide cache instance (created on first use)."""
+    global _CACHE
+    if _CACHE is None:
+        with _CACHE_LOCK:
+            if _CACHE is None:
+                _CACHE = TicketCache()
+    return _CACHE
@@ -0,0 +1,192 @@
+# core/ticket_ids.py
+"""
+Collision-free ticket IDs.
+
+IDs are `permute(i)` for a DB-backed counter i, where `permute` is a keyed
+Feistel permutation over [0, 10**width). Distinct counters always give distinct
+IDs, and consecutive tickets don't look sequential. Each process reserves a
+block of counter values in one short transaction on its own connection, so
+there is no read-then-insert race and no retry on UNIQUE violations.
+
+When the reserved share of the current width passes `widen_at`, allocation
+moves to width+1 with a fresh key. Longer IDs can never equal shorter ones, so
+old IDs stay valid.
+"""
+from __future__ import annotations
+import hashlib
+import os
+import secrets
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from core.migrations import migrate
+
+BLOCK_SIZE = int(os.getenv("SUPPORT_TICKET_ID_BLOCK", "16"))
+WIDEN_AT = float(os.getenv("SUPPORT_TICKET_ID_WIDEN_AT", "0.9"))
+MIN_WIDTH = 6
+
+
+class FeistelPermutation:
+    """Keyed bijection on [0, n) built from a balanced Feistel network plus cycle-walking."""
+
+    def __init__(self, n: int, key: str, rounds: int = 4):
+        self.n = n
+        bits = max(2, (n - 1).bit_length())
+        bits += bits % 2
+        self.half = bits // 2
+        self.mask = (1 << self.half) - 1
+        self.key = key.encode("utf-8")
+        self.rounds = rounds
+
+    def _f(self, rnd: int, value: int) -> int:
+        digest = hashlib.blake2b(value.to_bytes(8, "big"), key=self.key[:64], person=rnd.to_bytes(16, "big"),
+                                 digest_size=8).digest()
+        return int.from_bytes(digest, "big") & self.mask
+
+    def _encrypt(self, x: int) -> int:
+        left, right = x >> self.half, x & self.mask
+        for r in range(self.rounds):
+            left, right = right, left ^ self._f(r, right)
+        return (left << self.half) | right
+
+    def __call__(self, i: int) -> int:
+        if not 0 <= i < self.n:
+            raise ValueError(f"index {i} outside [0, {self.n})")
+        x = self._encrypt(i)
+        while x >= self.n:  # cycle-walk back into the domain
+            x = self._encrypt(x)
+        return x
+
+
+class TicketIdAllocator:
+    """Hands out unique ticket IDs from blocks reserved in `ticket_id_allocator`."""
+
+    def __init__(self, db_path: str, *, block_size: int = BLOCK_SIZE, widen_at: float = WIDEN_AT):
+        self.db_path = db_path
+        self.block_size = max(1, block_size)
+        self.widen_at = widen_at
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._block: List[str] = []          # remaining reserved IDs, next one last
+        self._perm: Optional[FeistelPermutation] = None
+
+    def _db(self) -> sqlite3.Connection:
+        # Private connection: reservations must commit even if the caller's transaction rolls back
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30, isolation_level=None)
+            migrate(self._conn)
+        return self._conn
+
+    def _reserve(self) -> None:
+        _check_not_in_transaction(self.db_path)
+        conn = self._db()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            width, next_index, key = conn.execute(
+                "SELECT width, next_index, perm_key FROM ticket_id_allocator ORDER BY width DESC LIMIT 1"
+            ).fetchone()
+            capacity = 10 ** width
+            if next_index + self.block_size > capacity * self.widen_at:
+                width, next_index, key = width + 1, 0, secrets.token_hex(16)
+                conn.execute("INSERT INTO ticket_id_allocator (width, next_index, perm_key) VALUES (?, ?, ?)",
+                             (width, next_index, key))
+            conn.execute("UPDATE ticket_id_allocator SET next_index = ? WHERE width = ?",
+                         (next_index + self.block_size, width))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        if self._perm is None or self._perm.n != 10 ** width or self._perm.key != key.encode("utf-8"):
+            self._perm = FeistelPermutation(10 ** width, key)
+        fresh = [f"{self._perm(i):0{width}d}" for i in range(next_index + self.block_size - 1, next_index - 1, -1)]
+        self._block = fresh + self._block  # anything still reserved goes out first
+
+    def prefetch(self, n: int = 1) -> None:
+        """
+        Make sure at least `n` IDs are reserved in memory. Call this before opening a
+        core.db.transaction() that may create tickets: reserving takes the database write lock
+        on a separate connection, which would wait on the open transaction.
+        """
+        with self._lock:
+            while len(self._block) < n:
+                self._reserve()
+
+    def next_id(self) -> str:
+        with self._lock:
+            while True:
+                if not self._block:
+                    self._reserve()
+                candidate = self._block.pop()
+                # IDs minted by the old random generator may already occupy a slot; skip those
+                taken = self._tickets_db(candidate).execute(
+                    "SELECT 1 FROM support_tickets WHERE ticket_id = ?", (candidate,)
+                ).fetchone()
+                if not taken:
+                    return candidate
+
+    def _tickets_db(self, ticket_id: str) -> sqlite3.Connection:
+        """Where `ticket_id` would be stored: its shard when core.db shards tickets, else our own file."""
+        from core import db
+        if db.SHARDS > 1 and os.path.abspath(db.DB_PATH) == os.path.abspath(self.db_path):
+            return db.get_conn(db.shard_path(ticket_id))
+        return self._db()
+
+    def usage(self) -> Dict[str, Any]:
+        """How much of the ID space has been reserved, per width and for the current width."""
+        rows: List[Tuple[int, int]] = self._db().execute(
+            "SELECT width, next_index FROM ticket_id_allocator ORDER BY width"
+        ).fetchall()
+        width, used = rows[-1]
+        capacity = 10 ** width
+        return {
+            "width": width,
+            "reserved": used,
+            "capacity": capacity,
+            "used_fraction": used / capacity,
+            "widen_at": self.widen_at,
+            "widths": {w: {"reserved": n, "capacity": 10 ** w} for w, n in rows},
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def _check_not_in_transaction(db_path: str) -> None:
+    """Fail fast instead of waiting out the busy timeout on our own thread's write lock."""
+    from core import db
+    conn = getattr(db._LOCAL, "conn", None)
+    if conn is not None and id(conn) in db._UOW and os.path.abspath(db.DB_PATH) == os.path.abspath(db_path):
+        raise RuntimeError("ticket ID block exhausted inside core.db.transaction(); "
+                           "call get_allocator().prefetch(n) before opening the transaction")
+
+
+_ALLOCATORS: Dict[str, TicketIdAllocator] = {}
+_ALLOCATORS_LOCK = threading.Lock()
+
+
+def get_allocator(db_path: Optional[str] = None) -> TicketIdAllocator:
+    """Process-wide allocator for `db_path` (default: core.db.DB_PATH)."""
+    from core import db  # local import: keeps core.utils → core.ticket_ids cheap to import
+    path = db_path or db.DB_PATH
+    with _ALLOCATORS_LOCK:
+        alloc = _ALLOCATORS.get(path)
+        if alloc is None:
+            alloc = _ALLOCATORS[path] = TicketIdAllocator(path)
+    return alloc
+
+
+def prefetch_ticket_ids(n: int = 1, db_path: Optional[str] = None) -> None:
+    get_allocator(db_path).prefetch(n)
+
+
+def allocate_ticket_id(db_path: Optional[str] = None) -> str:
+    return get_allocator(db_path).next_id()
+
+
+def id_space_usage(db_path: Optional[str] = None) -> Dict[str, Any]:
+    return get_allocator(db_path).usage()
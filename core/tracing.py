@@ -0,0 +1,278 @@
+# core/tracing.py
+"""
+Lightweight request tracing on top of core.metrics.
+
+`trace("submit")` starts a request with a fresh trace id; `span(name)` and the
+`@traced(name)` decorator time nested work inside it. Every finished span feeds
+the `span.<name>` histogram (and `span.<name>.errors` on exceptions), and the
+spans of recent traces are kept in a small ring buffer for inspection. The
+current trace id is stamped on every `log_event` row.
+
+With SUPPORT_TRACING=0 `span`/`traced` reduce to a flag check.
+"""
+from __future__ import annotations
+import atexit
+import functools
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, TypeVar
+
+from core import metrics
+
+_ENABLED = os.getenv("SUPPORT_TRACING", "1").strip().lower() not in ("0", "false", "no")
+TRACE_BUFFER = int(os.getenv("SUPPORT_TRACE_BUFFER", "200"))  # recent traces kept in memory
+MAX_SPANS_PER_TRACE = 500
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+class Span:
+    __slots__ = ("name", "parent", "trace", "depth", "start", "duration", "error", "_token")
+
+    def __init__(self, name: str, parent: Optional["Span"], trace: Optional["Trace"]):
+        self.name = name
+        self.parent = parent
+        self.trace = trace
+        self.depth = parent.depth + 1 if parent is not None else 0
+        self.start = time.perf_counter()
+        self.duration: Optional[float] = None
+        self.error: Optional[str] = None
+        self._token: Any = None
+
+    def end(self, error: Optional[BaseException] = None) -> float:
+        """Close the span (idempotent) and make its parent current again."""
+        if self.duration is not None:
+            return self.duration
+        self.duration = time.perf_counter() - self.start
+        metrics.observe(f"span.{self.name}", self.duration)
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+            metrics.incr(f"span.{self.name}.errors")
+        if self.trace is not None:
+            self.trace.add(self)
+        if self._token is not None:
+            try:
+                _SPAN.reset(self._token)
+            except ValueError:  # ended from another context; just restore the parent
+                _SPAN.set(self.parent)
+            self._token = None
+        return self.duration
+
+
+class Trace:
+    """One request: its id and the spans finished so far (bounded)."""
+
+    def __init__(self, name: str, trace_id: Optional[str] = None):
+        self.name = name
+        self.trace_id = trace_id or uuid.uuid4().hex[:16]
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.spans: List[Dict[str, Any]] = []
+        self.dropped = 0
+
+    def add(self, span: Span) -> None:
+        if len(self.spans) >= MAX_SPANS_PER_TRACE:
+            self.dropped += 1
+            return
+        self.spans.append({
+            "name": span.name,
+            "parent": span.parent.name if span.parent is not None else None,
+            "depth": span.depth,
+            "offset_s": span.start - self.start,
+            "duration_s": span.duration,
+            "error": span.error,
+        })
+
+    def to_dict(self) -> Dict[str, Any]:
+        spans = sorted(self.spans, key=lambda s: s["offset_s"])
+        root = next((s for s in spans if s["depth"] == 0), None)
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "started_at": self.started_at,
+            "duration_s": root["duration_s"] if root else None,
+            "spans": spans,
+            "dropped_spans": self.dropped,
+        }
+
+
+_SPAN: ContextVar[Optional[Span]] = ContextVar("support_span", default=None)
+_TRACE: ContextVar[Optional[Trace]] = ContextVar("support_trace", default=None)
+_RECENT: Deque[Trace] = deque(maxlen=max(1, TRACE_BUFFER))
+_RECENT_LOCK = threading.Lock()
+
+
+def enabled() -> bool:
+    return _ENABLED
+
+
+def set_enabled(on: bool) -> None:
+    global _ENABLED
+    _ENABLED = bool(on)
+
+
+def current_trace_id() -> Optional[str]:
+    t = _TRACE.get()
+    return t.trace_id if t is not None else None
+
+
+def start_span(name: str) -> Optional[Span]:
+    """Open a span under the current one and make it current; None when tracing is off."""
+    if not _ENABLED:
+        return None
+    parent = _SPAN.get()
+    s = Span(name, parent, _TRACE.get())
+    s._token = _SPAN.set(s)
+    return s
+
+
+@contextmanager
+def span(name: str) -> Iterator[Optional[Span]]:
+    s = start_span(name)
+    if s is None:
+        yield None
+        return
+    try:
+        yield s
+    except BaseException as e:
+        s.end(e)
+        raise
+    s.end()
+
+
+def traced(name: str) -> Callable[[F], F]:
+    """Decorator form of span(name)."""
+    def wrap(fn: F) -> F:
+        @functools.wraps(fn)
+        def inner(*args: Any, **kwargs: Any) -> Any:
+            if not _ENABLED:
+                return fn(*args, **kwargs)
+            with span(name):
+                return fn(*args, **kwargs)
+        return inner  # type: ignore[return-value]
+    return wrap
+
+
+@contextmanager
+def trace(name: str, trace_id: Optional[str] = None) -> Iterator[str]:
+    """
+    Root span for one request; yields its trace id. Log rows written inside carry the id even
+    when tracing is disabled, so a submit can always be followed through app_logs.
+    """
+    t = Trace(name, trace_id)
+    t_token = _TRACE.set(t)
+    s_token = _SPAN.set(None)
+    root = start_span(name)
+    try:
+        yield t.trace_id
+    except BaseException as e:
+        if root is not None:
+            root.end(e)
+        raise
+    finally:
+        if root is not None:
+            root.end()
+            with _RECENT_LOCK:
+                _RECENT.append(t)
+        _SPAN.reset(s_token)
+        _TRACE.reset(t_token)
+
+
+def recent_traces(limit: int = 20) -> List[Dict[str, Any]]:
+    """Newest-first summaries of the last `limit` finished traces."""
+    with _RECENT_LOCK:
+        traces = list(_RECENT)[-limit:]
+    return [t.to_dict() for t in reversed(traces)]
+
+
+def get_trace(trace_id: str) -> Optional[Dict[str, Any]]:
+    with _RECENT_LOCK:
+        for t in reversed(_RECENT):
+            if t.trace_id == trace_id:
+                return t.to_dict()
+    return None
+
+
+def span_summary() -> Dict[str, Dict[str, float]]:
+    """Per span name: count, errors, mean/p50/p95/p99/max seconds."""
+    snap = metrics.snapshot()
+    errors = snap["counters"]
+    out: Dict[str, Dict[str, float]] = {}
+    for key, h in snap["histograms"].items():
+        if key.startswith("span."):
+            name = key[len("span."):]
+            out[name] = {**h, "errors": errors.get(f"span.{name}.errors", 0)}
+    return out
+
+
+# ---------- Periodic snapshots ----------
+
+class SnapshotWriter:
+    """Appends a JSON snapshot (metrics + recent traces) every `interval_s`; optionally a .prom textfile."""
+
+    def __init__(self, path: str, *, interval_s: float = 60.0, prom_path: Optional[str] = None,
+                 traces: int = 20):
+        self.path = path
+        self.prom_path = prom_path
+        self.interval_s = max(1.0, interval_s)
+        self.traces = traces
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics-snapshot", daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def write(self) -> None:
+        doc = {"ts": time.time(), "metrics": metrics.snapshot(), "traces": recent_traces(self.traces)}
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as fh:
+            fh.write(json.dumps(doc) + "\n")
+        if self.prom_path:
+            tmp = self.prom_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as fh:
+                fh.write(metrics.to_prometheus())
+            os.replace(tmp, self.prom_path)  # node_exporter textfile collectors need atomic swaps
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_s):
+            try:
+                self.write()
+            except OSError:
+                metrics.incr("tracing.snapshot_errors")
+
+    def stop(self) -> None:
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        try:
+            self.write()  # final snapshot
+        except OSError:
+            pass
+
+
+_SNAPSHOTS: Optional[SnapshotWriter] = None
+
+
+def start_snapshots(path: str, **options: Any) -> SnapshotWriter:
+    """Start (or restart) the process-wide snapshot writer. Options: interval_s, prom_path, traces."""
+    global _SNAPSHOTS
+    if _SNAPSHOTS is not None:
+        _SNAPSHOTS.stop()
+    _SNAPSHOTS = SnapshotWriter(path, **options)
+    return _SNAPSHOTS
+
+
+def _snapshots_from_env() -> None:
+    path = os.getenv("SUPPORT_METRICS_SNAPSHOT_PATH")
+    if not path or _SNAPSHOTS is not None:
+        return
+    start_snapshots(
+        path,
+        interval_s=float(os.getenv("SUPPORT_METRICS_SNAPSHOT_S", "60")),
+        prom_path=os.getenv("SUPPORT_METRICS_PROM_PATH") or None,
+    )
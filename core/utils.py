@@ -1,11 +1,28 @@
 # core/utils.py
 from __future__ import annotations
-import random
 import re
+import unicodedata
 from typing import Optional
 
-# Matches: "ticket 123456", "ticket#123456", "Ticket #123456"
-TICKET_RE = re.compile(r"(?:ticket\s*#?)(\d{6})", re.IGNORECASE)
+# Matches: "ticket 123456", "ticket#123456", "Ticket #123456" (and wider IDs once the 6-digit space fills)
+TICKET_RE = re.compile(r"(?:ticket\s*#?)(\d{6,9})", re.IGNORECASE)
+
+# --- Keyword tables (shared with agents.matcher, which scans for all of them at once) ---
+LOST_CARD_WORDS = ["lost my debit card", "lost debit", "lost my card", "stolen card", "debit card lost", "debit card stolen"]
+NOT_ARRIVED_WORDS = ["card hasn't arrived", "card hasnt arrived", "replacement still hasn’t", "replacement still hasnt", "where is my card", "tracking for my card"]
+PIN_ACTION_WORDS = ["reset", "forgot", "change"]
+LOGIN_WORDS = ["login", "log in", "password", "locked out", "2fa", "otp"]
+
+QUERY_RE = re.compile(r"\bticket\b|status|check|track|update")
+POS_WORDS = [
+    "thank you", "thanks", "great", "appreciate",
+    "resolved", "helpful", "awesome", "excellent",
+]
+NEG_WORDS = [
+    "not working", "isn't working", "hasn't", "hasnt", "still", "issue",
+    "problem", "late", "angry", "frustrated", "unhappy", "poor", "bad",
+    "missing", "failed", "declined", "error",
+]
 
 # --- Intent heuristics for richer replies ---
 def infer_issue_type(text: str) -> str:
@@ -16,30 +33,57 @@ def infer_issue_type(text: str) -> str:
     t = (text or "").lower()
 
     # Lost / stolen debit card
-    if any(k in t for k in ["lost my debit card", "lost debit", "lost my card", "stolen card", "debit card lost", "debit card stolen"]):
+    if any(k in t for k in LOST_CARD_WORDS):
         return "lost_debit_card"
 
     # Card not arrived / replacement delay
-    if any(k in t for k in ["card hasn't arrived", "card hasnt arrived", "replacement still hasn’t", "replacement still hasnt", "where is my card", "tracking for my card"]):
+    if any(k in t for k in NOT_ARRIVED_WORDS):
         return "debit_card_not_arrived"
 
     # PIN / login
-    if "pin" in t and any(k in t for k in ["reset", "forgot", "change"]):
+    if "pin" in t and any(k in t for k in PIN_ACTION_WORDS):
         return "pin_reset"
-    if any(k in t for k in ["login", "log in", "password", "locked out", "2fa", "otp"]):
+    if any(k in t for k in LOGIN_WORDS):
         return "login_issue"
 
     return "generic"
 
 def extract_ticket_number(text: str) -> Optional[str]:
-    """Extract a 6-digit ticket number from free text."""
+    """Extract a 6-digit (or widened) ticket number from free text."""
     m = TICKET_RE.search(text or "")
     return m.group(1) if m else None
 
 
+def normalize_phone(p: str) -> str:
+    """Keep digits only; tolerant of formats like (206) 555-0199 ext 123."""
+    return re.sub(r"[^\d]", "", p or "")
+
+
+# Stand-ins the UI and agents use when no name was given; never matched to a customer
+PLACEHOLDER_NAMES = {"customer", "unknown"}
+
+
+def normalize_name(name: str) -> str:
+    """Case-, width- and whitespace-insensitive key: "Alex  Chen " and "alex chen" → "alex chen"."""
+    return " ".join(unicodedata.normalize("NFKC", name or "").casefold().split())
+
+
+def customer_name_key(name: str) -> Optional[str]:
+    """normalize_name, or None for blank/placeholder names that must not identify a customer."""
+    key = normalize_name(name)
+    return key if key and key not in PLACEHOLDER_NAMES else None
+
+
+def customer_phone_key(phone: str) -> Optional[str]:
+    """normalize_phone when it looks like a full number (10+ digits), else None."""
+    digits = normalize_phone(phone)
+    return digits if len(digits) >= 10 else None
+
+
 def generate_ticket_number() -> str:
-    """Generate a zero-padded 6-digit ticket number."""
-    return f"{random.randint(0, 999_999):06d}"
+    """Allocate a unique, zero-padded ticket number (6 digits until that space runs low)."""
+    from core.ticket_ids import allocate_ticket_id  # local import: core.db is heavier than this module
+    return allocate_ticket_id()
 
 
 def rule_based_classify(text: str) -> str:
@@ -50,24 +94,15 @@ def rule_based_classify(text: str) -> str:
     t = (text or "").lower()
 
     # If it looks like a status request or references a ticket, treat as query.
-    if re.search(r"\bticket\b|status|check|track|update", t):
+    if QUERY_RE.search(t):
         return "query"
 
     # Positive cues
-    pos_words = [
-        "thank you", "thanks", "great", "appreciate",
-        "resolved", "helpful", "awesome", "excellent",
-    ]
-    if any(w in t for w in pos_words):
+    if any(w in t for w in POS_WORDS):
         return "positive_feedback"
 
     # Negative cues
-    neg_words = [
-        "not working", "isn't working", "hasn't", "hasnt", "still", "issue",
-        "problem", "late", "angry", "frustrated", "unhappy", "poor", "bad",
-        "missing", "failed", "declined", "error",
-    ]
-    if any(w in t for w in neg_words):
+    if any(w in t for w in NEG_WORDS):
         return "negative_feedback"
 
     # Default to query if unsure (safer for support flows)
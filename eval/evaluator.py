@@ -6,10 +6,19 @@ Returns: (correct, total, rows)
   - correct: int
   - total: int
   - rows: list[dict] with keys: text, expected, predicted, correct
+
+run_cascade_benchmark() reports what the confidence cascade in ClassifierAgent saves:
+escalation rate, LLM calls and latency avoided, and accuracy against LLM-only and local-only.
+
+    python -m eval.evaluator --cascade [--use-model] [--rule-threshold 0.8] [--json]
 """
 
-from typing import List, Tuple, Dict
-from agents.classifier import ClassifierAgent
+import argparse
+import json
+import time
+from typing import Any, List, Optional, Tuple, Dict
+from agents.classifier import SYSTEM, ClassifierAgent, label_from_reply, user_prompt
+from core.llm import LLMClient
 
 # Canonical labels expected from your ClassifierAgent:
 #   "positive_feedback", "negative_feedback", "query"
@@ -35,14 +44,17 @@ TESTS: List[Dict[str, str]] = [
     {"text": "Great agent last time—can you also tell me my ticket status 123456?", "expected": "query"},
 ]
 
-def run_benchmark(use_llm: bool = False, limit: int = None) -> Tuple[int, int, List[Dict[str, str]]]:
+def run_benchmark(use_llm: bool = False, limit: int = None, use_model: bool = False,
+                  model_path: str = None) -> Tuple[int, int, List[Dict[str, str]]]:
     """
     Execute the benchmark.
     :param use_llm: If True, use LLM path in ClassifierAgent (if implemented in your repo).
     :param limit: Optional cap on number of test cases to run.
+    :param use_model: If True (and not use_llm), use the local text model instead of the rules.
+    :param model_path: Text model artifact (default SUPPORT_TEXT_MODEL_PATH).
     :return: (correct, total, rows)
     """
-    agent = ClassifierAgent(use_llm=use_llm)
+    agent = ClassifierAgent(use_llm=use_llm, use_model=use_model, model_path=model_path)
     cases = TESTS[:limit] if limit else TESTS
 
     correct = 0
@@ -67,3 +79,128 @@ def run_benchmark(use_llm: bool = False, limit: int = None) -> Tuple[int, int, L
 
     total = len(cases)
     return correct, total, rows
+
+
+def run_cascade_benchmark(limit: int = None, use_model: bool = False, model_path: str = None,
+                          rule_threshold: Optional[float] = None,
+                          model_threshold: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Score the cascade on the benchmark cases. Every case is also sent to the LLM (uncached) so
+    the run can compare against LLM-only; the cascade's label is the local one unless it was
+    escalated. Latency saved is the LLM time of the cases the cascade kept local, minus the
+    local tier's own time. Without an API key the LLM columns are None and escalated cases keep
+    their local label.
+    """
+    opts: Dict[str, Any] = {"use_model": use_model, "model_path": model_path}
+    if rule_threshold is not None:
+        opts["rule_threshold"] = rule_threshold
+    if model_threshold is not None:
+        opts["model_threshold"] = model_threshold
+    agent = ClassifierAgent(use_llm=True, cascade=True, **opts)
+    cases = TESTS[:limit] if limit else TESTS
+    llm = LLMClient()
+
+    rows: List[Dict[str, Any]] = []
+    local_s = llm_s = 0.0
+    for case in cases:
+        text, expected = case["text"], case["expected"]
+        start = time.perf_counter()
+        d = agent.local_decisions([text])[0]
+        local_s += time.perf_counter() - start
+
+        llm_label: Optional[str] = None
+        llm_latency: Optional[float] = None
+        if llm.enabled:
+            start = time.perf_counter()
+            try:
+                llm_label = label_from_reply(text, llm.chat(SYSTEM, user_prompt(text), temperature=0, cache=False))
+            except Exception as e:
+                llm_label = f"ERROR: {e}"
+            llm_latency = time.perf_counter() - start
+            llm_s += llm_latency
+        cascade_label = llm_label if d.escalated and llm_label is not None else d.label
+        rows.append({
+            "text": text, "expected": expected,
+            "local": d.label, "source": d.source, "confidence": d.confidence,
+            "escalated": d.escalated, "reason": d.reason,
+            "llm": llm_label, "llm_latency_s": llm_latency,
+            "cascade": cascade_label, "correct": cascade_label == expected,
+        })
+
+    total = len(rows)
+    escalated = [r for r in rows if r["escalated"]]
+    reasons: Dict[str, int] = {}
+    for r in escalated:
+        reasons[r["reason"]] = reasons.get(r["reason"], 0) + 1
+
+    def acc(key: str) -> Optional[float]:
+        if not total or any(r[key] is None for r in rows):
+            return None
+        return sum(r[key] == r["expected"] for r in rows) / total
+
+    accuracy = {"local": acc("local"), "llm": acc("llm"), "cascade": acc("cascade")}
+    kept_llm_s = sum(r["llm_latency_s"] for r in rows if not r["escalated"] and r["llm_latency_s"] is not None)
+    return {
+        "total": total,
+        "tier": rows[0]["source"] if rows else None,
+        "thresholds": {"rule": agent.rule_threshold, "model": agent.model_threshold},
+        "escalated": len(escalated),
+        "escalation_rate": len(escalated) / total if total else 0.0,
+        "escalation_reasons": reasons,
+        "llm_calls_saved": total - len(escalated),
+        "accuracy": accuracy,
+        "accuracy_delta_vs_llm": (accuracy["cascade"] - accuracy["llm"]) if accuracy["llm"] is not None else None,
+        "accuracy_delta_vs_local": accuracy["cascade"] - accuracy["local"] if total else None,
+        "latency_s": {
+            "llm_only": llm_s if llm.enabled else None,
+            "cascade": (local_s + llm_s - kept_llm_s) if llm.enabled else None,
+            "saved": (kept_llm_s - local_s) if llm.enabled else None,
+            "local": local_s,
+        },
+        "rows": rows,
+    }
+
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cascade", action="store_true", help="report the confidence cascade instead of accuracy")
+    parser.add_argument("--use-llm", action="store_true")
+    parser.add_argument("--use-model", action="store_true", help="local text model instead of the rules")
+    parser.add_argument("--model-path", default=None)
+    parser.add_argument("--rule-threshold", type=float, default=None)
+    parser.add_argument("--model-threshold", type=float, default=None)
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--json", action="store_true", help="print the full report as JSON")
+    args = parser.parse_args(argv)
+
+    if not args.cascade:
+        correct, total, rows = run_benchmark(use_llm=args.use_llm, limit=args.limit,
+                                             use_model=args.use_model, model_path=args.model_path)
+        if args.json:
+            print(json.dumps({"correct": correct, "total": total, "rows": rows}, indent=2))
+        else:
+            print(f"accuracy {correct}/{total}")
+        return 0
+
+    report = run_cascade_benchmark(limit=args.limit, use_model=args.use_model, model_path=args.model_path,
+                                   rule_threshold=args.rule_threshold, model_threshold=args.model_threshold)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return 0
+    fmt = lambda v: "n/a" if v is None else f"{v:.1%}"
+    lat = report["latency_s"]
+    print(f"tier={report['tier']} thresholds={report['thresholds']}")
+    print(f"escalated {report['escalated']}/{report['total']} ({report['escalation_rate']:.1%}) "
+          f"{report['escalation_reasons']}; LLM calls saved: {report['llm_calls_saved']}")
+    print(f"accuracy local={fmt(report['accuracy']['local'])} llm={fmt(report['accuracy']['llm'])} "
+          f"cascade={fmt(report['accuracy']['cascade'])}")
+    if lat["llm_only"] is not None:
+        print(f"latency llm-only={lat['llm_only'] * 1e3:.1f}ms cascade={lat['cascade'] * 1e3:.1f}ms "
+              f"saved={lat['saved'] * 1e3:.1f}ms")
+    else:
+        print("LLM unavailable (no API key): latency and LLM accuracy not measured")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
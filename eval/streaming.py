@@ -0,0 +1,355 @@
+# eval/streaming.py
+"""
+Streaming evaluation engine for the classifier.
+
+Cases are read lazily from JSONL or CSV (columns `text` and `expected`, or
+`label`), classified in parallel, and folded into an `EvalStats` as they come
+back, so memory stays flat however large the corpus is:
+
+  - rules mode: chunks of cases fan out over a process pool (or threads)
+  - model mode: like rules, but each chunk is one batched call to the local text model
+                (core.text_model); per-case latency is the chunk's time divided evenly
+  - llm mode:   chunks go through AsyncLLMClient with bounded concurrency
+
+    python -m eval.streaming cases.jsonl --mode rules --mode model --mode llm --workers 8
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import concurrent.futures
+import csv
+import functools
+import io
+import json
+import os
+import time
+from collections import Counter
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+from core.metrics import Histogram
+
+MODES = ("rules", "model", "llm")
+ERROR_LABEL = "ERROR"
+
+Case = Dict[str, str]
+# (predicted label, seconds, error message or None)
+Outcome = Tuple[str, float, Optional[str]]
+ProgressFn = Callable[[Dict[str, Any]], None]
+
+
+# ---------- Input ----------
+
+def _case(row: Dict[str, Any]) -> Optional[Case]:
+    text = row.get("text")
+    expected = row.get("expected", row.get("label"))
+    if text is None or expected is None:
+        return None
+    return {"text": str(text), "expected": str(expected).strip()}
+
+
+def iter_cases(source: Union[str, os.PathLike, io.TextIOBase, Iterable[Dict[str, Any]]],
+               fmt: Optional[str] = None) -> Iterator[Case]:
+    """
+    Yield {text, expected} cases one at a time from a .jsonl/.csv path, an open text stream
+    (fmt='jsonl' | 'csv'), or any iterable of dicts. Rows without text or label are skipped.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        path = os.fspath(source)
+        fmt = fmt or ("csv" if path.lower().endswith(".csv") else "jsonl")
+        with open(path, encoding="utf-8", newline="") as fh:
+            yield from iter_cases(fh, fmt)
+        return
+    if fmt is None and hasattr(source, "read"):
+        fmt = "jsonl"
+    if fmt == "csv":
+        rows: Iterable[Dict[str, Any]] = csv.DictReader(source)  # type: ignore[arg-type]
+    elif fmt == "jsonl":
+        rows = (json.loads(line) for line in source if line.strip())  # type: ignore[union-attr]
+    else:
+        rows = source  # type: ignore[assignment]
+    for row in rows:
+        case = _case(row)
+        if case is not None:
+            yield case
+
+
+def count_cases(path: Union[str, os.PathLike]) -> int:
+    """Cheap line count for progress bars (CSV header excluded); never parses the rows."""
+    path = os.fspath(path)
+    with open(path, "rb") as fh:
+        n = sum(1 for line in fh if line.strip())
+    return max(0, n - 1) if path.lower().endswith(".csv") else n
+
+
+# ---------- Incremental statistics ----------
+
+class EvalStats:
+    """Running accuracy, confusion counts and latency histogram; O(labels²) memory."""
+
+    def __init__(self, mode: str = "rules", keep_mismatches: int = 50):
+        self.mode = mode
+        self.total = 0
+        self.correct = 0
+        self.errors = 0
+        self.confusion: Counter = Counter()  # (expected, predicted) -> n
+        self.latency = Histogram()
+        self.keep_mismatches = keep_mismatches
+        self.mismatches: List[Dict[str, Any]] = []
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+
+    def update(self, case: Case, outcome: Outcome) -> None:
+        predicted, seconds, error = outcome
+        expected = case["expected"]
+        self.total += 1
+        self.correct += int(predicted == expected)
+        self.errors += int(error is not None)
+        self.confusion[(expected, predicted)] += 1
+        self.latency.observe(seconds)
+        if predicted != expected and len(self.mismatches) < self.keep_mismatches:
+            self.mismatches.append({"text": case["text"], "expected": expected, "predicted": predicted,
+                                    "error": error})
+
+    def finish(self) -> "EvalStats":
+        self.finished = time.perf_counter()
+        return self
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished or time.perf_counter()) - self.started
+
+    def labels(self) -> List[str]:
+        return sorted({label for pair in self.confusion for label in pair})
+
+    def per_label(self) -> Dict[str, Dict[str, float]]:
+        out: Dict[str, Dict[str, float]] = {}
+        for label in self.labels():
+            tp = self.confusion[(label, label)]
+            predicted = sum(n for (_, p), n in self.confusion.items() if p == label)
+            actual = sum(n for (e, _), n in self.confusion.items() if e == label)
+            precision = tp / predicted if predicted else 0.0
+            recall = tp / actual if actual else 0.0
+            f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+            out[label] = {"precision": precision, "recall": recall, "f1": f1, "support": actual}
+        return out
+
+    def confusion_matrix(self) -> Dict[str, Dict[str, int]]:
+        """expected -> predicted -> count, over every label seen on either side."""
+        labels = self.labels()
+        return {e: {p: self.confusion[(e, p)] for p in labels} for e in labels}
+
+    def report(self) -> Dict[str, Any]:
+        lat = self.latency.summary()
+        return {
+            "mode": self.mode,
+            "total": self.total,
+            "correct": self.correct,
+            "accuracy": self.correct / self.total if self.total else 0.0,
+            "errors": self.errors,
+            "elapsed_s": self.elapsed,
+            "throughput_per_s": self.total / self.elapsed if self.elapsed > 0 else 0.0,
+            "latency_s": {k: lat[k] for k in ("mean", "p50", "p95", "p99", "max")},
+            "per_label": self.per_label(),
+            "confusion": self.confusion_matrix(),
+            "mismatches": list(self.mismatches),
+        }
+
+
+# ---------- Classification backends ----------
+
+def _classify_rules_chunk(texts: List[str]) -> List[Outcome]:
+    """Process-pool task: rule-based labels with per-case timing."""
+    from core.utils import rule_based_classify
+    out: List[Outcome] = []
+    for t in texts:
+        start = time.perf_counter()
+        try:
+            label, error = rule_based_classify(t), None
+        except Exception as e:  # keep one bad row from failing the whole chunk
+            label, error = ERROR_LABEL, str(e)
+        out.append((label, time.perf_counter() - start, error))
+    return out
+
+
+def _classify_model_chunk(texts: List[str], model_path: Optional[str] = None) -> List[Outcome]:
+    """Process-pool task: one vectorized predict per chunk (the artifact loads once per worker)."""
+    from core.text_model import load_model
+    start = time.perf_counter()
+    model = load_model(model_path)
+    if model is None:
+        return [(ERROR_LABEL, 0.0, "no text model artifact")] * len(texts)
+    try:
+        labels = model.predict(texts)
+    except Exception as e:
+        return [(ERROR_LABEL, 0.0, str(e))] * len(texts)
+    per_case = (time.perf_counter() - start) / max(1, len(texts))
+    return [(label, per_case, None) for label in labels]
+
+
+async def _classify_llm_one(llm: Any, text: str) -> Outcome:
+    from agents.classifier import SYSTEM, label_from_reply, user_prompt
+    start = time.perf_counter()
+    try:
+        out = await llm.achat(SYSTEM, user_prompt(text), temperature=0)
+        return label_from_reply(text, out), time.perf_counter() - start, None
+    except Exception as e:
+        return ERROR_LABEL, time.perf_counter() - start, str(e)
+
+
+def _chunks(cases: Iterable[Case], size: int) -> Iterator[List[Case]]:
+    it = iter(cases)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _run_pool(cases: Iterable[Case], stats: EvalStats, *, workers: int, chunk_size: int, executor: str,
+              on_chunk: Callable[[], None], task: Callable[[List[str]], List[Outcome]] = _classify_rules_chunk) -> None:
+    pool_cls = concurrent.futures.ProcessPoolExecutor if executor == "process" else concurrent.futures.ThreadPoolExecutor
+    with pool_cls(max_workers=workers) as pool:
+        # At most 2 chunks per worker in flight, so the reader never runs ahead of the pool
+        pending: Dict[concurrent.futures.Future, List[Case]] = {}
+        chunks = _chunks(cases, chunk_size)
+        for chunk in chunks:
+            pending[pool.submit(task, [c["text"] for c in chunk])] = chunk
+            if len(pending) >= workers * 2:
+                done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for fut in done:
+                    for case, outcome in zip(pending.pop(fut), fut.result()):
+                        stats.update(case, outcome)
+                    on_chunk()
+        for fut in concurrent.futures.as_completed(list(pending)):
+            for case, outcome in zip(pending.pop(fut), fut.result()):
+                stats.update(case, outcome)
+            on_chunk()
+
+
+async def _run_llm(cases: Iterable[Case], stats: EvalStats, *, max_concurrency: int, chunk_size: int,
+                   on_chunk: Callable[[], None], **client_options: Any) -> None:
+    from core.llm_async import AsyncLLMClient
+    llm = AsyncLLMClient(max_concurrency=max_concurrency, **client_options)
+    if not llm.enabled:
+        raise RuntimeError("LLM mode needs a valid OPENAI_API_KEY and the openai SDK.")
+    # Sliding window of max_concurrency calls: a slow call only holds its own slot, and per-case
+    # latency measures the call rather than time queued behind the semaphore
+    window = max_concurrency
+    pending: Dict[asyncio.Task, Case] = {}
+    since_progress = 0
+
+    async def drain(return_when: str) -> None:
+        nonlocal since_progress
+        done, _ = await asyncio.wait(pending, return_when=return_when)
+        for task in done:
+            stats.update(pending.pop(task), task.result())
+            since_progress += 1
+        if since_progress >= chunk_size or not pending:
+            since_progress = 0
+            on_chunk()
+
+    try:
+        for case in cases:
+            pending[asyncio.ensure_future(_classify_llm_one(llm, case["text"]))] = case
+            if len(pending) >= window:
+                await drain(asyncio.FIRST_COMPLETED)
+        while pending:
+            await drain(asyncio.FIRST_COMPLETED)
+    finally:
+        for task in pending:
+            task.cancel()
+        await llm.aclose()
+
+
+# ---------- Entry points ----------
+
+def run_stream(
+    cases: Union[str, os.PathLike, Iterable[Dict[str, Any]]],
+    *,
+    mode: str = "rules",
+    workers: int = os.cpu_count() or 4,
+    executor: str = "process",
+    chunk_size: Optional[int] = None,
+    max_concurrency: int = 8,
+    model_path: Optional[str] = None,
+    limit: Optional[int] = None,
+    on_progress: Optional[ProgressFn] = None,
+    keep_mismatches: int = 50,
+    **client_options: Any,
+) -> EvalStats:
+    """
+    Evaluate one classifier mode over a stream of cases and return the finished EvalStats.
+    `on_progress(stats.report())` is called after every completed chunk. LLM options
+    (requests_per_minute, tokens_per_minute, deadline, ...) pass through to AsyncLLMClient.
+    """
+    if mode not in MODES:
+        raise ValueError(f"mode must be one of {MODES}, got {mode!r}")
+    if executor not in ("process", "thread"):
+        raise ValueError("executor must be 'process' or 'thread'")
+    stream: Iterable[Case] = iter_cases(cases)
+    if limit:
+        stream = islice(stream, limit)
+    stats = EvalStats(mode, keep_mismatches=keep_mismatches)
+
+    def on_chunk() -> None:
+        if on_progress is not None:
+            on_progress(stats.report())
+
+    if mode == "rules":
+        _run_pool(stream, stats, workers=max(1, workers), chunk_size=chunk_size or 512,
+                  executor=executor, on_chunk=on_chunk)
+    elif mode == "model":
+        _run_pool(stream, stats, workers=max(1, workers), chunk_size=chunk_size or 2048,
+                  executor=executor, on_chunk=on_chunk,
+                  task=functools.partial(_classify_model_chunk, model_path=model_path))
+    else:
+        from agents.classifier import _run_sync
+        _run_sync(_run_llm(stream, stats, max_concurrency=max(1, max_concurrency),
+                           chunk_size=chunk_size or max_concurrency * 4, on_chunk=on_chunk, **client_options))
+    return stats.finish()
+
+
+def compare_modes(cases: Union[str, os.PathLike, Sequence[Dict[str, Any]]], modes: Sequence[str] = MODES,
+                  **options: Any) -> List[Dict[str, Any]]:
+    """Run each mode over the same cases (a path or a re-iterable sequence) and return their reports."""
+    return [run_stream(cases, mode=m, **options).report() for m in modes]
+
+
+def _print_report(report: Dict[str, Any]) -> None:
+    lat = report["latency_s"]
+    print(f"[{report['mode']}] {report['correct']}/{report['total']} correct "
+          f"({report['accuracy']:.1%}), {report['errors']} errors, "
+          f"{report['throughput_per_s']:.0f} cases/s, "
+          f"p50={lat['p50'] * 1e3:.3f}ms p95={lat['p95'] * 1e3:.3f}ms p99={lat['p99'] * 1e3:.3f}ms")
+    for label, m in report["per_label"].items():
+        print(f"  {label:<20} precision={m['precision']:.3f} recall={m['recall']:.3f} "
+              f"f1={m['f1']:.3f} n={m['support']}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Streaming classifier evaluation over a JSONL/CSV corpus")
+    ap.add_argument("path", help="cases file (.jsonl or .csv) with text + expected|label")
+    ap.add_argument("--mode", action="append", choices=MODES, help="repeat to compare modes (default: rules)")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 4)
+    ap.add_argument("--executor", choices=("process", "thread"), default="process")
+    ap.add_argument("--chunk-size", type=int, default=None)
+    ap.add_argument("--concurrency", type=int, default=8, help="concurrent LLM requests")
+    ap.add_argument("--model-path", default=None, help="text model artifact for --mode model")
+    ap.add_argument("--limit", type=int, default=None)
+    ap.add_argument("--json", action="store_true", help="print full reports as JSON")
+    args = ap.parse_args(argv)
+
+    reports = compare_modes(args.path, args.mode or ["rules"], workers=args.workers, executor=args.executor,
+                            chunk_size=args.chunk_size, max_concurrency=args.concurrency, model_path=args.model_path,
+                            limit=args.limit)
+    if args.json:
+        print(json.dumps(reports, indent=2))
+    else:
+        for r in reports:
+            _print_report(r)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
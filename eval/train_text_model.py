@@ -0,0 +1,132 @@
+# eval/train_text_model.py
+"""
+Train the local text model (core.text_model) from labeled JSONL/CSV and report how it compares.
+
+    python -m eval.train_text_model train.jsonl --out data/text_model.npz
+    python -m eval.train_text_model train.jsonl more.csv --test held_out.jsonl --epochs 30 --bits 20
+
+Cases are read with eval.streaming.iter_cases (text + expected|label). A seeded
+--valid fraction is held out for early reporting and to fit the probability
+temperature. The report covers validation accuracy, per-label precision/recall,
+calibration (expected calibration error before/after temperature scaling),
+artifact size, load time and batch throughput, then the bundled
+eval.evaluator cases with rules vs model, and --test if given.
+"""
+from __future__ import annotations
+import argparse
+import json
+import random
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from core.text_model import HashedNgramModel, _softmax
+from eval.evaluator import run_benchmark
+from eval.streaming import EvalStats, iter_cases
+
+
+def expected_calibration_error(proba: np.ndarray, y: np.ndarray, bins: int = 10) -> float:
+    """Mean |accuracy − confidence| over equal-width confidence bins, weighted by bin size."""
+    conf = proba.max(axis=1)
+    correct = (proba.argmax(axis=1) == y).astype(float)
+    edges = np.linspace(0.0, 1.0, bins + 1)
+    ece = 0.0
+    for lo, hi in zip(edges[:-1], edges[1:]):
+        mask = (conf > lo) & (conf <= hi)
+        if mask.any():
+            ece += mask.mean() * abs(correct[mask].mean() - conf[mask].mean())
+    return float(ece)
+
+
+def _stats(model: HashedNgramModel, cases: Sequence[Dict[str, str]], mode: str = "model") -> EvalStats:
+    stats = EvalStats(mode)
+    start = time.perf_counter()
+    labels = model.predict([c["text"] for c in cases])
+    per_case = (time.perf_counter() - start) / max(1, len(cases))
+    for case, label in zip(cases, labels):
+        stats.update(case, (label, per_case, None))
+    return stats.finish()
+
+
+def train_and_report(paths: Sequence[str], *, out: str, valid: float = 0.2, test: Optional[str] = None,
+                     seed: int = 0, **train_options: Any) -> Dict[str, Any]:
+    cases: List[Dict[str, str]] = [c for p in paths for c in iter_cases(p)]
+    if len(cases) < 10:
+        raise SystemExit(f"need at least 10 labeled cases, got {len(cases)}")
+    random.Random(seed).shuffle(cases)
+    n_valid = int(len(cases) * valid)
+    valid_cases, train_cases = cases[:n_valid], cases[n_valid:]
+
+    start = time.perf_counter()
+    model = HashedNgramModel.train([c["text"] for c in train_cases], [c["expected"] for c in train_cases],
+                                   valid_texts=[c["text"] for c in valid_cases],
+                                   valid_labels=[c["expected"] for c in valid_cases], seed=seed, **train_options)
+    report: Dict[str, Any] = {"train_cases": len(train_cases), "valid_cases": len(valid_cases),
+                              "train_s": time.perf_counter() - start, "labels": model.labels,
+                              "temperature": model.temperature}
+
+    if valid_cases:
+        index = {label: i for i, label in enumerate(model.labels)}
+        known = [c for c in valid_cases if c["expected"] in index]
+        y = np.array([index[c["expected"]] for c in known])
+        logits = model._logits(model.featurize([c["text"] for c in known]))
+        report["ece_uncalibrated"] = expected_calibration_error(_softmax(logits), y)
+        report["ece_calibrated"] = expected_calibration_error(_softmax(logits / model.temperature), y)
+        report["valid"] = _stats(model, valid_cases).report()
+
+    report["artifact_bytes"] = model.save(out)
+    start = time.perf_counter()
+    model = HashedNgramModel.load(out)
+    report["load_ms"] = (time.perf_counter() - start) * 1e3
+    sample = [c["text"] for c in (cases * (1 + 5000 // len(cases)))[:5000]]
+    model.predict(sample[:100])  # warm the per-word hash cache, as a long-running process would be
+    start = time.perf_counter()
+    model.predict(sample)
+    report["batch_throughput_per_s"] = len(sample) / (time.perf_counter() - start)
+
+    # The bundled regression cases, with the saved artifact as a real caller would load it
+    for name, use_model in (("rules", False), ("model", True)):
+        correct, total, _ = run_benchmark(use_llm=False, use_model=use_model, model_path=out)
+        report[f"evaluator_{name}"] = f"{correct}/{total}"
+    if test:
+        report["test"] = _stats(model, list(iter_cases(test))).report()
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("paths", nargs="+", help="labeled .jsonl/.csv files")
+    ap.add_argument("--out", default="data/text_model.npz")
+    ap.add_argument("--valid", type=float, default=0.2, help="held-out fraction for reporting and calibration")
+    ap.add_argument("--test", default=None, help="separate labeled file to score the saved model on")
+    ap.add_argument("--epochs", type=int, default=20)
+    ap.add_argument("--bits", type=int, default=18, help="hash space is 2**bits features")
+    ap.add_argument("--lr", type=float, default=0.05)
+    ap.add_argument("--l2", type=float, default=1e-6)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--json", action="store_true", help="print the full report as JSON")
+    args = ap.parse_args(argv)
+
+    report = train_and_report(args.paths, out=args.out, valid=args.valid, test=args.test, seed=args.seed,
+                              epochs=args.epochs, n_features=1 << args.bits, learning_rate=args.lr, l2=args.l2)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return 0
+    print(f"trained on {report['train_cases']} cases in {report['train_s']:.1f}s → {args.out} "
+          f"({report['artifact_bytes'] / 1024:.0f} KiB, loads in {report['load_ms']:.1f} ms, "
+          f"{report['batch_throughput_per_s']:,.0f} msgs/s batched)")
+    if "valid" in report:
+        v = report["valid"]
+        print(f"validation: {v['accuracy']:.1%} of {v['total']}; ECE {report['ece_uncalibrated']:.3f} → "
+              f"{report['ece_calibrated']:.3f} (temperature {report['temperature']:.2f})")
+        for label, m in v["per_label"].items():
+            print(f"  {label:<20} precision={m['precision']:.3f} recall={m['recall']:.3f} n={m['support']}")
+    print(f"eval.evaluator cases: rules {report['evaluator_rules']}, model {report['evaluator_model']}")
+    if "test" in report:
+        print(f"test: {report['test']['accuracy']:.1%} of {report['test']['total']}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
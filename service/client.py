@@ -0,0 +1,81 @@
+# service/client.py
+"""
+Small stdlib client for service.server (used by app.py when SUPPORT_API_URL is set).
+
+429 and 503 answers are retried after their Retry-After, up to `retries` times;
+anything else that is not 2xx raises ServiceError.
+"""
+from __future__ import annotations
+import json
+import os
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from typing import Any, Dict, List, Optional
+
+API_URL = os.getenv("SUPPORT_API_URL", "")
+TIMEOUT_S = float(os.getenv("SUPPORT_API_CLIENT_TIMEOUT", "30"))
+
+
+class ServiceError(RuntimeError):
+    def __init__(self, status: int, message: str):
+        super().__init__(f"HTTP {status}: {message}")
+        self.status = status
+
+
+class ServiceClient:
+    def __init__(self, base_url: str = API_URL, *, timeout: float = TIMEOUT_S, retries: int = 2):
+        if not base_url:
+            raise ValueError("no service URL (set SUPPORT_API_URL)")
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.retries = retries
+
+    def _call(self, method: str, path: str, body: Optional[Dict[str, Any]] = None) -> Any:
+        data = json.dumps(body).encode("utf-8") if body is not None else None
+        for attempt in range(self.retries + 1):
+            req = urllib.request.Request(self.base_url + path, data=data, method=method,
+                                         headers={"Content-Type": "application/json"})
+            try:
+                with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                    return json.loads(resp.read() or b"null")
+            except urllib.error.HTTPError as e:
+                try:
+                    message = json.loads(e.read() or b"{}").get("error", e.reason)
+                except (json.JSONDecodeError, AttributeError):
+                    message = str(e.reason)
+                if e.code in (429, 503) and attempt < self.retries:
+                    time.sleep(float(e.headers.get("Retry-After") or 1))
+                    continue
+                raise ServiceError(e.code, message) from None
+        raise AssertionError("unreachable")
+
+    def health(self) -> Dict[str, Any]:
+        try:
+            return self._call("GET", "/healthz")
+        except ServiceError as e:
+            return {"status": "unavailable", "error": str(e)}
+
+    def classify(self, text: str) -> Dict[str, Any]:
+        return self._call("POST", "/v1/classify", {"text": text})
+
+    def classify_many(self, texts: List[str]) -> List[str]:
+        return self._call("POST", "/v1/classify", {"texts": list(texts)})["labels"]
+
+    def submit(self, text: str, customer_name: str = "", ticket_id: str = "", phone: str = "") -> Dict[str, Any]:
+        """Same fields as agents.orchestrator.OrchestratorResult.to_dict()."""
+        return self._call("POST", "/v1/messages", {"text": text, "customer_name": customer_name,
+                                                   "ticket_id": ticket_id, "phone": phone})
+
+    def ticket_status(self, ticket_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            return self._call("GET", f"/v1/tickets/{urllib.parse.quote(ticket_id, safe='')}")
+        except ServiceError as e:
+            if e.status == 404:
+                return None
+            raise
+
+    def followup(self, ticket_id: str, text: str, customer_name: str = "", phone: str = "") -> Dict[str, Any]:
+        return self._call("POST", f"/v1/tickets/{urllib.parse.quote(ticket_id, safe='')}/followups",
+                          {"text": text, "customer_name": customer_name, "phone": phone})
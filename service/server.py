@@ -0,0 +1,400 @@
+# service/server.py
+"""
+HTTP API over the agents, for the chat widget, IVR integrations and the Streamlit app.
+
+    POST /v1/classify                    {"text": ...} or {"texts": [...]}
+    POST /v1/messages                    {"text", "customer_name", "phone", "ticket_id"}  → submit flow
+    GET  /v1/tickets/<id>                ticket status
+    POST /v1/tickets/<id>/followups      {"text", "customer_name", "phone"}
+    GET  /healthz                        liveness + database probe (503 while draining)
+    GET  /metrics                        Prometheus text (core.metrics.to_prometheus)
+
+Connections are accepted on one thread and handed to a fixed pool of workers
+through a bounded queue (SUPPORT_API_WORKERS, SUPPORT_API_QUEUE). When the queue
+is full the acceptor answers 429 with Retry-After itself, so overload never
+reaches the agents; a request that waited longer than SUPPORT_API_QUEUE_TIMEOUT_S
+gets 503 instead of being processed late. SIGTERM/SIGINT stop accepting, finish
+the queued requests (up to SUPPORT_API_DRAIN_S), flush logs and close the pool.
+
+    python -m service.server --port 8080 --workers 8 --queue 64
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import queue
+import re
+import signal
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from core import metrics
+
+HOST = os.getenv("SUPPORT_API_HOST", "127.0.0.1")
+PORT = int(os.getenv("SUPPORT_API_PORT", "8080"))
+WORKERS = int(os.getenv("SUPPORT_API_WORKERS", "8"))
+QUEUE_SIZE = int(os.getenv("SUPPORT_API_QUEUE", "64"))
+QUEUE_TIMEOUT_S = float(os.getenv("SUPPORT_API_QUEUE_TIMEOUT_S", "5"))
+DRAIN_S = float(os.getenv("SUPPORT_API_DRAIN_S", "30"))
+MAX_BODY = int(os.getenv("SUPPORT_API_MAX_BODY", str(64 * 1024)))
+MAX_BATCH = int(os.getenv("SUPPORT_API_MAX_BATCH", "256"))
+USE_LLM = os.getenv("SUPPORT_API_USE_LLM", "0").strip().lower() in ("1", "true", "yes")
+RETRY_AFTER_S = 1
+
+_TICKET_PATH = re.compile(r"^/v1/tickets/([^/]+)(/followups)?$")
+_TICKET_FIELDS = ("ticket_id", "customer_name", "customer_id", "description", "status", "created_at", "updated_at")
+
+
+class ApiError(Exception):
+    """Client error with an HTTP status; rendered as {"error": message}."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def _raw_response(status: int, reason: str, body: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> bytes:
+    data = json.dumps(body).encode("utf-8")
+    head = [f"HTTP/1.0 {status} {reason}", "Content-Type: application/json",
+            f"Content-Length: {len(data)}", "Connection: close"]
+    head += [f"{k}: {v}" for k, v in (headers or {}).items()]
+    return ("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + data
+
+
+# ---------- Handlers ----------
+
+class _Handler(BaseHTTPRequestHandler):
+    server: "ApiServer"
+    # HTTP/1.0: one request per connection, so an idle keep-alive client never pins a worker
+    protocol_version = "HTTP/1.0"
+    timeout = 30  # seconds a slow client may take per read/write before its worker gives up
+
+    def log_message(self, *args: Any) -> None:  # requests are counted in core.metrics instead
+        pass
+
+    def _send(self, status: int, body: Any, content_type: str = "application/json",
+              headers: Optional[Dict[str, str]] = None) -> None:
+        data = body if isinstance(body, bytes) else json.dumps(body, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+        self._status = status
+
+    def _json(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY:
+            raise ApiError(413, f"body larger than {MAX_BODY} bytes")
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            raise ApiError(400, "invalid JSON body")
+        if not isinstance(body, dict):
+            raise ApiError(400, "body must be a JSON object")
+        return body
+
+    def _dispatch(self, method: str) -> None:
+        self._status = 500
+        start = time.perf_counter()
+        path = self.path.split("?", 1)[0].rstrip("/") or "/"
+        route = "unknown"
+        try:
+            route, handler = self.server.route(method, path)
+            handler(self, path)
+        except ApiError as e:
+            self._send(e.status, {"error": str(e)})
+        except Exception as e:
+            metrics.incr("api.exceptions")
+            self.server.log_error(route, e)
+            self._send(500, {"error": "internal error"})
+        finally:
+            metrics.observe(f"api.{route}", time.perf_counter() - start)
+            metrics.incr(f"api.status_{self._status}")
+
+    def do_GET(self) -> None:
+        self._dispatch("GET")
+
+    def do_POST(self) -> None:
+        self._dispatch("POST")
+
+    # ----- endpoints -----
+
+    def health(self, path: str) -> None:
+        status = self.server.health()
+        self._send(200 if status["status"] == "ok" else 503, status)
+
+    def prometheus(self, path: str) -> None:
+        self.server.publish_gauges()
+        self._send(200, metrics.to_prometheus().encode("utf-8"), "text/plain; version=0.0.4")
+
+    def classify(self, path: str) -> None:
+        body = self._json()
+        agent = self.server.orchestrator.classifier
+        if "texts" in body:
+            texts = body["texts"]
+            if not isinstance(texts, list) or not all(isinstance(t, str) for t in texts):
+                raise ApiError(400, "texts must be a list of strings")
+            if len(texts) > MAX_BATCH:
+                raise ApiError(413, f"at most {MAX_BATCH} texts per request")
+            self._send(200, {"labels": agent.classify_many(texts)})
+            return
+        text = _text(body)
+        d = agent.decide(text)
+        self._send(200, {"label": d.label, "source": d.source, "confidence": d.confidence,
+                         "escalated": d.escalated})
+
+    def submit(self, path: str) -> None:
+        body = self._json()
+        result = self.server.orchestrator.process(_text(body), customer_name=_str(body, "customer_name"),
+                                                  ticket_id=_str(body, "ticket_id"), phone=_str(body, "phone"))
+        self._send(200, result.to_dict())
+
+    def ticket(self, path: str) -> None:
+        ticket_id = _TICKET_PATH.match(path).group(1)  # type: ignore[union-attr]
+        rec = self.server.orchestrator.storage.get_ticket(ticket_id)
+        if rec is None:
+            raise ApiError(404, f"ticket {ticket_id} not found")
+        self._send(200, {k: rec.get(k) for k in _TICKET_FIELDS})
+
+    def followup(self, path: str) -> None:
+        ticket_id = _TICKET_PATH.match(path).group(1)  # type: ignore[union-attr]
+        body = self._json()
+        text = _text(body)
+        if self.server.orchestrator.storage.get_ticket(ticket_id) is None:
+            raise ApiError(404, f"ticket {ticket_id} not found")
+        result = self.server.orchestrator.process(text, customer_name=_str(body, "customer_name"),
+                                                  ticket_id=ticket_id, phone=_str(body, "phone"))
+        self._send(200, result.to_dict())
+
+
+def _str(body: Dict[str, Any], key: str) -> str:
+    value = body.get(key) or ""
+    if not isinstance(value, (str, int)):
+        raise ApiError(400, f"{key} must be a string")
+    return str(value)
+
+
+def _text(body: Dict[str, Any]) -> str:
+    text = _str(body, "text")
+    if not text.strip():
+        raise ApiError(400, "text is required")
+    return text
+
+
+# ---------- Server ----------
+
+class ApiServer(HTTPServer):
+    """
+    Single acceptor thread, `workers` handler threads and a queue of at most `queue_size`
+    waiting connections. Use start()/stop() or as a context manager; serve() blocks until
+    SIGTERM/SIGINT.
+    """
+
+    request_queue_size = 1024  # kernel accept backlog; the bounded queue below does the shedding
+
+    ROUTES: List[Tuple[str, str, str, Callable[[_Handler, str], None]]] = [
+        ("GET", "health", r"^/healthz$", _Handler.health),
+        ("GET", "metrics", r"^/metrics$", _Handler.prometheus),
+        ("POST", "classify", r"^/v1/classify$", _Handler.classify),
+        ("POST", "submit", r"^/v1/messages$", _Handler.submit),
+        ("GET", "ticket", r"^/v1/tickets/[^/]+$", _Handler.ticket),
+        ("POST", "followup", r"^/v1/tickets/[^/]+/followups$", _Handler.followup),
+    ]
+
+    def __init__(self, host: str = HOST, port: int = PORT, *, workers: int = WORKERS, queue_size: int = QUEUE_SIZE,
+                 queue_timeout: float = QUEUE_TIMEOUT_S, use_llm: bool = USE_LLM, orchestrator: Any = None):
+        super().__init__((host, port), _Handler)
+        if orchestrator is None:
+            from agents.orchestrator import Orchestrator
+            orchestrator = Orchestrator(use_llm=use_llm)  # shared; each worker uses its own pooled connection
+        self.orchestrator = orchestrator
+        self.queue_timeout = queue_timeout
+        self._routes = [(m, name, re.compile(p), fn) for m, name, p, fn in self.ROUTES]
+        self._queue: "queue.Queue[Optional[Tuple[socket.socket, Any, float]]]" = queue.Queue(max(1, queue_size))
+        self._workers = [threading.Thread(target=self._work, name=f"api-worker-{i}", daemon=True)
+                         for i in range(max(1, workers))]
+        self._busy = 0
+        self._busy_lock = threading.Lock()
+        # Rejections are written by their own thread: replying politely means reading the rest of the
+        # request, which must not stall the acceptor. Past this backlog, shed connections are just closed.
+        self._shed: "queue.Queue[Tuple[socket.socket, int, str, str]]" = queue.Queue(1024)
+        self._shedder = threading.Thread(target=self._shed_loop, name="api-shedder", daemon=True)
+        self._acceptor: Optional[threading.Thread] = None
+        self.draining = False
+        for t in self._workers + [self._shedder]:
+            t.start()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def route(self, method: str, path: str) -> Tuple[str, Callable[[_Handler, str], None]]:
+        allowed = False
+        for m, name, pattern, fn in self._routes:
+            if pattern.match(path):
+                if m == method:
+                    return name, fn
+                allowed = True
+        raise ApiError(405 if allowed else 404, "method not allowed" if allowed else "not found")
+
+    # ----- acceptor side -----
+
+    def process_request(self, request: socket.socket, client_address: Any) -> None:  # type: ignore[override]
+        """Runs on the acceptor thread: enqueue, or shed the connection without touching the agents."""
+        if self.draining:
+            self._reject(request, 503, "Service Unavailable", "shutting down")
+            return
+        try:
+            self._queue.put_nowait((request, client_address, time.monotonic()))
+        except queue.Full:
+            self._reject(request, 429, "Too Many Requests", "server busy, retry later")
+
+    def _reject(self, request: socket.socket, status: int, reason: str, message: str) -> None:
+        metrics.incr(f"api.status_{status}")
+        metrics.incr("api.shed")
+        try:
+            self._shed.put_nowait((request, status, reason, message))
+        except queue.Full:
+            self.shutdown_request(request)
+
+    def _shed_loop(self) -> None:
+        while True:
+            request, status, reason, message = self._shed.get()
+            try:
+                request.settimeout(1.0)
+                request.sendall(_raw_response(status, reason, {"error": message},
+                                              {"Retry-After": str(RETRY_AFTER_S)}))
+                request.shutdown(socket.SHUT_WR)
+                # read the unread request until the client closes, so our close doesn't reset the connection
+                for _ in range(16):
+                    if not request.recv(MAX_BODY):
+                        break
+            except OSError:
+                pass
+            request.close()
+
+    # ----- worker side -----
+
+    def _work(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            request, client_address, queued_at = item
+            waited = time.monotonic() - queued_at
+            metrics.observe("api.queue_wait", waited)
+            if waited > self.queue_timeout:
+                self._reject(request, 503, "Service Unavailable", "request timed out in queue")
+                continue
+            with self._busy_lock:
+                self._busy += 1
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                with self._busy_lock:
+                    self._busy -= 1
+                self.shutdown_request(request)
+
+    def handle_error(self, request: Any, client_address: Any) -> None:
+        metrics.incr("api.connection_errors")  # client went away mid-response; nothing to report to it
+
+    def log_error(self, route: str, exc: Exception) -> None:
+        try:
+            self.orchestrator.storage.log_event(level="ERROR", agent="API", event="request_failed",
+                      details={"route": route, "error": repr(exc)})
+        except Exception:
+            pass
+
+    # ----- health / lifecycle -----
+
+    def publish_gauges(self) -> None:
+        metrics.set_gauge("api.queue_depth", self._queue.qsize())
+        metrics.set_gauge("api.busy_workers", self._busy)
+        metrics.set_gauge("api.workers", len(self._workers))
+
+    def health(self) -> Dict[str, Any]:
+        db_ok = True
+        try:
+            self.orchestrator.storage.ping()
+        except Exception:
+            db_ok = False
+        return {
+            "status": "draining" if self.draining else ("ok" if db_ok else "degraded"),
+            "db": db_ok,
+            "workers": len(self._workers),
+            "busy_workers": self._busy,
+            "queue_depth": self._queue.qsize(),
+            "queue_capacity": self._queue.maxsize,
+        }
+
+    def start(self) -> "ApiServer":
+        self._acceptor = threading.Thread(target=self.serve_forever, name="api-acceptor", daemon=True)
+        self._acceptor.start()
+        return self
+
+    def stop(self, timeout: float = DRAIN_S) -> bool:
+        """
+        Graceful shutdown: stop accepting, let workers finish what is queued (up to `timeout`),
+        then flush the async log writer. Returns False if some workers were still busy.
+        """
+        self.draining = True
+        if self._acceptor is not None:
+            self.shutdown()  # acceptor loop exits; connections still in the kernel backlog are dropped
+            self._acceptor = None
+        self.server_close()
+        for _ in self._workers:
+            self._queue.put(None)  # after the queued requests, so they are served first
+        deadline = time.monotonic() + timeout
+        for t in self._workers:
+            t.join(max(0.0, deadline - time.monotonic()))
+        drained = not any(t.is_alive() for t in self._workers)
+        from core import db
+        db.flush_logs(5.0)
+        return drained
+
+    def serve(self) -> None:
+        """Block until SIGTERM/SIGINT, then stop()."""
+        stop = threading.Event()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(sig, lambda *_: stop.set())
+        self.start()
+        stop.wait()
+        self.stop()
+
+    def __enter__(self) -> "ApiServer":
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
+
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--queue", type=int, default=QUEUE_SIZE, help="waiting requests before answering 429")
+    parser.add_argument("--queue-timeout", type=float, default=QUEUE_TIMEOUT_S, help="max queue wait before 503")
+    parser.add_argument("--use-llm", action="store_true", default=USE_LLM, help="classify through the LLM (see SUPPORT_CLASSIFIER_CASCADE)")
+    args = parser.parse_args(argv)
+
+    from core.storage import get_storage
+    get_storage().init()  # migrate before taking traffic (SQLite; nothing to do in memory)
+    server = ApiServer(args.host, args.port, workers=args.workers, queue_size=args.queue,
+                       queue_timeout=args.queue_timeout, use_llm=args.use_llm)
+    print(f"support API on {server.base_url} ({args.workers} workers, queue {args.queue}); Ctrl+C to stop")
+    server.serve()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,128 @@
+# tools/batch_process.py
+"""
+Push a JSONL stream of messages through the orchestration pipeline without Streamlit.
+
+    python -m tools.batch_process inbox.jsonl -o results.jsonl --workers 8
+    cat inbox.jsonl | python -m tools.batch_process - --use-llm
+
+Each input line is {"text", "customer_name", "ticket_id", "phone"} (only "text" is
+required). Each output line echoes the input plus the pipeline result. Output
+order matches input order. Throughput and per-stage latency go to stderr.
+"""
+from __future__ import annotations
+import argparse
+import json
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Deque, Dict, Iterator, Optional, TextIO
+
+from agents.orchestrator import STAGES, Orchestrator
+from core.metrics import Histogram
+
+
+def iter_records(fh: TextIO) -> Iterator[Dict[str, Any]]:
+    for lineno, line in enumerate(fh, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            rec = json.loads(line)
+        except json.JSONDecodeError as e:
+            rec = {"_error": f"line {lineno}: {e}"}
+        yield rec
+
+
+class BatchRunner:
+    """Runs records on a thread pool with one Orchestrator (and DB connection) per worker."""
+
+    def __init__(self, workers: int = 4, use_llm: bool = False):
+        self.workers = max(1, workers)
+        self.use_llm = use_llm
+        self._local = threading.local()
+        self.stage_hist: Dict[str, Histogram] = {s: Histogram() for s in (*STAGES, "total")}
+        self.processed = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+
+    def _orchestrator(self) -> Orchestrator:
+        orch = getattr(self._local, "orch", None)
+        if orch is None:
+            orch = self._local.orch = Orchestrator(use_llm=self.use_llm)
+        return orch
+
+    def process_one(self, rec: Dict[str, Any]) -> Dict[str, Any]:
+        if "_error" in rec:
+            with self._lock:
+                self.failed += 1
+            return {"input": rec, "error": rec["_error"]}
+        start = time.perf_counter()
+        try:
+            result = self._orchestrator().process(
+                str(rec.get("text") or ""),
+                customer_name=str(rec.get("customer_name") or ""),
+                ticket_id=str(rec.get("ticket_id") or ""),
+                phone=str(rec.get("phone") or ""),
+            )
+        except Exception as e:
+            with self._lock:
+                self.failed += 1
+            return {"input": rec, "error": str(e)}
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.processed += 1
+            for stage, seconds in result.timings.items():
+                self.stage_hist[stage].observe(seconds)
+            self.stage_hist["total"].observe(elapsed)
+        return {"input": rec, "result": result.to_dict()}
+
+    def run(self, records: Iterator[Dict[str, Any]], out: TextIO) -> None:
+        """Stream records through the pool, keeping at most 2×workers in flight."""
+        window: Deque[Future] = deque()
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="batch") as pool:
+            for rec in records:
+                window.append(pool.submit(self.process_one, rec))
+                if len(window) >= self.workers * 2:
+                    out.write(json.dumps(window.popleft().result(), ensure_ascii=False) + "\n")
+            while window:
+                out.write(json.dumps(window.popleft().result(), ensure_ascii=False) + "\n")
+
+
+def _report(runner: BatchRunner, wall: float, err: TextIO) -> None:
+    total = runner.processed + runner.failed
+    rate = (total / wall) if wall > 0 else 0.0
+    err.write(f"processed={runner.processed} failed={runner.failed} wall={wall:.2f}s throughput={rate:.1f} msg/s\n")
+    err.write(f"{'stage':<10} {'count':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}\n")
+    for stage, h in runner.stage_hist.items():
+        s = h.summary()
+        err.write(f"{stage:<10} {s['count']:>7} {s['p50'] * 1000:>9.2f} {s['p95'] * 1000:>9.2f} "
+                  f"{s['p99'] * 1000:>9.2f} {s['max'] * 1000:>9.2f}\n")
+
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="JSONL file, or - for stdin")
+    parser.add_argument("-o", "--output", default="-", help="JSONL results file (default stdout)")
+    parser.add_argument("-w", "--workers", type=int, default=4, help="concurrent workers (default 4)")
+    parser.add_argument("--use-llm", action="store_true", help="classify with the LLM instead of rules")
+    args = parser.parse_args(argv)
+
+    runner = BatchRunner(workers=args.workers, use_llm=args.use_llm)
+    fin = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    fout = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    start = time.perf_counter()
+    try:
+        runner.run(iter_records(fin), fout)
+    finally:
+        if fin is not sys.stdin:
+            fin.close()
+        if fout is not sys.stdout:
+            fout.close()
+    _report(runner, time.perf_counter() - start, sys.stderr)
+    return 0 if runner.failed == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
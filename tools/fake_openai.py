@@ -0,0 +1,205 @@
+# tools/fake_openai.py
+"""
+Local stand-in for the OpenAI chat completions API, for load tests and offline CI.
+
+Speaks POST /v1/chat/completions (and GET /v1/models) closely enough for the
+openai SDK. Classification prompts get a deterministic label (the rule-based
+classifier applied to the message), other prompts a canned reply. Latency,
+5xx and 429 rates are configurable; with a fixed --seed the sequence of
+latencies and injected failures is reproducible.
+
+    python -m tools.fake_openai --port 8765 --latency lognormal:120,0.5 --error-rate 0.01 --rate-limit 0.02
+    OPENAI_API_KEY=sk-fake OPENAI_BASE_URL=http://127.0.0.1:8765/v1 streamlit run app.py
+"""
+from __future__ import annotations
+import argparse
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from core.utils import rule_based_classify
+
+LABELS = ("positive_feedback", "negative_feedback", "query")
+_MESSAGE_RE = re.compile(r"^Message:\s*(.*?)\s*(?:\nRespond with one label only\.)?$", re.S)
+
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """
+    Latency distribution in milliseconds → sampler returning seconds:
+      fixed:MS | uniform:LO,HI | lognormal:MEDIAN,SIGMA | exp:MEAN
+    """
+    kind, _, args = spec.partition(":")
+    vals = [float(v) for v in args.split(",") if v.strip()] if args else []
+    if kind == "fixed":
+        ms = vals[0] if vals else 0.0
+        return lambda rng: ms / 1000.0
+    if kind == "uniform":
+        lo, hi = vals
+        return lambda rng: rng.uniform(lo, hi) / 1000.0
+    if kind == "lognormal":
+        median, sigma = vals
+        return lambda rng: rng.lognormvariate(math.log(median), sigma) / 1000.0
+    if kind == "exp":
+        mean = vals[0]
+        return lambda rng: rng.expovariate(1.0 / mean) / 1000.0
+    raise ValueError(f"unknown latency spec {spec!r}")
+
+
+def reply_for(messages: Any) -> str:
+    """Deterministic completion text for a chat request."""
+    msgs = messages if isinstance(messages, list) else []
+    system = next((str(m.get("content") or "") for m in msgs if m.get("role") == "system"), "")
+    user = next((str(m.get("content") or "") for m in reversed(msgs) if m.get("role") == "user"), "")
+    if "classif" in system.lower() or any(label in system for label in LABELS):
+        m = _MESSAGE_RE.match(user)
+        return rule_based_classify(m.group(1) if m else user)
+    return "Thanks for reaching out. Our team is on it and will follow up shortly."
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: "FakeOpenAIServer"
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+
+    def log_message(self, *args: Any) -> None:  # quiet
+        pass
+
+    def _send(self, status: int, body: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> None:
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("content-type", "application/json")
+        self.send_header("content-length", str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self) -> None:
+        if self.path.rstrip("/").endswith("/models"):
+            self._send(200, {"object": "list", "data": [{"id": self.server.model, "object": "model"}]})
+        else:
+            self._send(404, {"error": {"message": "not found", "type": "invalid_request_error"}})
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get("content-length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send(404, {"error": {"message": "not found", "type": "invalid_request_error"}})
+            return
+        try:
+            req = json.loads(raw or b"{}")
+        except json.JSONDecodeError:
+            self._send(400, {"error": {"message": "invalid JSON", "type": "invalid_request_error"}})
+            return
+
+        delay, outcome = self.server.draw()
+        time.sleep(delay)
+        if outcome == "rate_limited":
+            self._send(429, {"error": {"message": "Rate limit reached (fake)", "type": "rate_limit_error"}},
+                       {"retry-after": f"{self.server.retry_after:g}"})
+            return
+        if outcome == "error":
+            self._send(500, {"error": {"message": "Injected server error (fake)", "type": "server_error"}})
+            return
+
+        content = reply_for(req.get("messages"))
+        prompt_tokens = sum(len(str(m.get("content") or "")) for m in req.get("messages") or []) // 4 + 1
+        self._send(200, {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:24]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": req.get("model") or self.server.model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": 2, "total_tokens": prompt_tokens + 2},
+        })
+
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    """Threaded fake API server; use as a context manager or call start()/stop()."""
+
+    daemon_threads = True
+    request_queue_size = 1024  # large accept backlog so load tests measure latency, not SYN drops
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, *, latency: str = "fixed:0",
+                 error_rate: float = 0.0, rate_limit_rate: float = 0.0, retry_after: float = 0.5,
+                 seed: Optional[int] = None, model: str = "gpt-4o-mini"):
+        super().__init__((host, port), _Handler)
+        self.sample_latency = parse_latency(latency)
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.model = model
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.stats: Dict[str, int] = {"requests": 0, "ok": 0, "rate_limited": 0, "error": 0}
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def draw(self) -> Tuple[float, str]:
+        """Next (delay seconds, outcome) from the seeded stream."""
+        with self._lock:
+            delay = self.sample_latency(self._rng)
+            roll = self._rng.random()
+            if roll < self.rate_limit_rate:
+                outcome = "rate_limited"
+            elif roll < self.rate_limit_rate + self.error_rate:
+                outcome = "error"
+            else:
+                outcome = "ok"
+            self.stats["requests"] += 1
+            self.stats[outcome] += 1
+        return delay, outcome
+
+    def start(self) -> "FakeOpenAIServer":
+        self._thread = threading.Thread(target=self.serve_forever, name="fake-openai", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join(5)
+
+    def __enter__(self) -> "FakeOpenAIServer":
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
+
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", default="lognormal:80,0.4", help="fixed:MS | uniform:LO,HI | lognormal:MEDIAN,SIGMA | exp:MEAN")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 500")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="fraction of requests answered with 429")
+    parser.add_argument("--retry-after", type=float, default=0.5, help="Retry-After seconds on 429")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    server = FakeOpenAIServer(args.host, args.port, latency=args.latency, error_rate=args.error_rate,
+                              rate_limit_rate=args.rate_limit, retry_after=args.retry_after, seed=args.seed)
+    print(f"fake OpenAI API on {server.base_url} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(server.stats))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
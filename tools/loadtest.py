@@ -0,0 +1,229 @@
+# tools/loadtest.py
+"""
+End-to-end load test of the orchestration flow (classify → follow-up → ticket → route).
+
+N virtual customers each send their messages in order; arrivals follow a seeded
+Poisson schedule at --qps (or back-to-back with --qps 0). Latency is measured
+from the scheduled arrival, so queueing shows up in the tail instead of being
+hidden. With --use-llm --fake, classification goes through a local
+tools.fake_openai server, so no API key or network is needed.
+
+    python -m tools.loadtest --customers 16 --qps 50 --duration 30
+    python -m tools.loadtest --use-llm --fake --latency lognormal:120,0.5 --rate-limit 0.02 --report perf.json
+    python -m tools.loadtest --storage memory      # agents over core.storage.MemoryStorage, no SQLite
+
+The JSON report (config, environment, throughput, latency percentiles, per-stage
+latency, DB lock waits, commits and error rates) is reproducible for a given
+--seed, up to timing noise.
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import platform
+import queue
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from core.metrics import Histogram
+
+POSITIVE = ["Thanks for resolving my credit card issue!", "Great support today, really happy!",
+            "Appreciate the quick help on my loan question."]
+NEGATIVE = ["My debit card replacement still hasn't arrived.", "Terrible experience with net banking again.",
+            "I'm frustrated, charges are incorrect and no one responded."]
+QUERIES = ["How long does a wire transfer take?", "What's the balance on my savings account?",
+           "Can you check the status of my request?"]
+FOLLOWUPS = ["I lost my card, please freeze it", "There is an unauthorized charge I want to dispute",
+             "I'm traveling abroad next week", "I moved, please update my address", "Any update on this?"]
+
+
+def _message(rng: random.Random, followup_rate: float, has_ticket: bool) -> Dict[str, str]:
+    if has_ticket and rng.random() < followup_rate:
+        msg = {"text": rng.choice(FOLLOWUPS), "followup": "1"}
+        if rng.random() < 0.3:
+            msg["phone"] = f"(206) 555-{rng.randrange(10000):04d}"
+        return msg
+    return {"text": rng.choice(rng.choice([POSITIVE, NEGATIVE, QUERIES]))}
+
+
+class LoadTest:
+    def __init__(self, *, customers: int, qps: float, requests: int, duration: float, use_llm: bool,
+                 followup_rate: float, seed: int):
+        self.customers = max(1, customers)
+        self.qps = qps
+        self.requests = requests
+        self.duration = duration
+        self.use_llm = use_llm
+        self.followup_rate = followup_rate
+        self.seed = seed
+        self.latency = Histogram()   # scheduled arrival → done
+        self.service = Histogram()   # start of processing → done
+        self.stages: Dict[str, Histogram] = {}
+        self.errors: Dict[str, int] = {"exception": 0, "classifier_error": 0, "followup_error": 0, "db_locked": 0}
+        self.completed = 0
+        self._lock = threading.Lock()
+
+    def _customer(self, idx: int, jobs: "queue.Queue[Optional[tuple]]", orchestrator: Any) -> None:
+        name = f"Load Customer {idx:04d}"
+        ticket: Optional[str] = None
+        while True:
+            job = jobs.get()
+            if job is None:
+                return
+            due, msg = job
+            now = time.perf_counter()
+            if due is not None and due > now:
+                time.sleep(due - now)
+            start = time.perf_counter()
+            due = start if due is None else due  # closed loop: no schedule to fall behind
+            err: Optional[str] = None
+            result = None
+            try:
+                result = orchestrator.process(msg["text"], customer_name=name,
+                                              ticket_id=(ticket or "") if msg.get("followup") else "",
+                                              phone=msg.get("phone", ""))
+                ticket = result.ticket_id or ticket
+            except sqlite3.OperationalError as e:
+                err = "db_locked" if "locked" in str(e) else "exception"
+            except Exception:
+                err = "exception"
+            end = time.perf_counter()
+            with self._lock:
+                self.completed += 1
+                self.latency.observe(end - due)
+                self.service.observe(end - start)
+                if err:
+                    self.errors[err] += 1
+                if result is not None:
+                    if result.classifier_error:
+                        self.errors["classifier_error"] += 1
+                    if result.followup_error:
+                        self.errors["followup_error"] += 1
+                    for stage, seconds in result.timings.items():
+                        self.stages.setdefault(stage, Histogram()).observe(seconds)
+
+    def run(self) -> float:
+        from agents.orchestrator import Orchestrator
+        orchestrator = Orchestrator(use_llm=self.use_llm)  # shared; each thread uses its own pooled connection
+        rng = random.Random(self.seed)
+        queues: List["queue.Queue[Optional[tuple]]"] = [queue.Queue() for _ in range(self.customers)]
+        threads = [threading.Thread(target=self._customer, args=(i, q, orchestrator), daemon=True,
+                                    name=f"customer-{i}") for i, q in enumerate(queues)]
+        for t in threads:
+            t.start()
+
+        # Precompute the whole schedule from the seed, then release it in real time
+        start = time.perf_counter() + 0.05
+        due, sent, has_ticket = start, 0, [False] * self.customers
+        closed_loop = self.qps <= 0
+        while sent < self.requests and (closed_loop or due - start < self.duration):
+            c = rng.randrange(self.customers)
+            queues[c].put((None if closed_loop else due, _message(rng, self.followup_rate, has_ticket[c])))
+            has_ticket[c] = True  # every message except positive feedback leaves the customer a ticket
+            sent += 1
+            if not closed_loop:
+                due += rng.expovariate(self.qps)
+        for q in queues:
+            q.put(None)
+        for t in threads:
+            t.join()
+        return time.perf_counter() - start
+
+
+def _summary(h: Histogram) -> Dict[str, float]:
+    return {k: v for k, v in h.summary().items() if k != "sum"}
+
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--customers", type=int, default=8, help="concurrent virtual customers (threads)")
+    parser.add_argument("--qps", type=float, default=20.0, help="target arrival rate; 0 = closed loop")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of arrivals (open loop)")
+    parser.add_argument("--requests", type=int, default=100_000, help="hard cap on requests")
+    parser.add_argument("--followup-rate", type=float, default=0.3)
+    parser.add_argument("--use-llm", action="store_true", help="classify through the LLM path")
+    parser.add_argument("--fake", action="store_true", help="serve the LLM from an in-process tools.fake_openai")
+    parser.add_argument("--latency", default="lognormal:80,0.4", help="fake server latency spec")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fake server 500 rate")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="fake server 429 rate")
+    parser.add_argument("--llm-cache", action="store_true", help="keep the LLM response cache on")
+    parser.add_argument("--db", default=None, help="SQLite file (default: fresh temp file)")
+    parser.add_argument("--storage", choices=("sqlite", "memory"), default=os.getenv("SUPPORT_STORAGE", "sqlite"),
+                        help="storage engine for the agents (core.storage)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--report", default=None, help="write the JSON report here (default stdout)")
+    args = parser.parse_args(argv)
+
+    # Configure before core.* reads its environment
+    os.environ["SUPPORT_DB_PATH"] = args.db or os.path.join(tempfile.mkdtemp(prefix="loadtest-"), "support.db")
+    os.environ["SUPPORT_STORAGE"] = args.storage
+    if not args.llm_cache:
+        os.environ["SUPPORT_LLM_CACHE"] = "0"
+    server = None
+    if args.fake:
+        from tools.fake_openai import FakeOpenAIServer
+        server = FakeOpenAIServer(latency=args.latency, error_rate=args.error_rate,
+                                  rate_limit_rate=args.rate_limit, seed=args.seed).start()
+        os.environ["OPENAI_BASE_URL"] = server.base_url
+        os.environ["OPENAI_API_KEY"] = "sk-fake-loadtest"
+
+    from core import db, metrics
+    if args.storage == "sqlite":
+        db.get_conn()  # migrate before the clock starts
+    metrics.reset()
+
+    test = LoadTest(customers=args.customers, qps=args.qps, requests=args.requests, duration=args.duration,
+                    use_llm=args.use_llm, followup_rate=args.followup_rate, seed=args.seed)
+    try:
+        wall = test.run()
+        db.flush_logs(5.0)
+    finally:
+        if server is not None:
+            server.stop()
+
+    snap = metrics.snapshot()
+    hist, counters = snap["histograms"], snap["counters"]
+    failed = sum(v for k, v in test.errors.items() if k in ("exception", "db_locked"))
+    report = {
+        "config": {k: v for k, v in vars(args).items() if k not in ("report",)},
+        "environment": {"python": sys.version.split()[0], "platform": platform.platform(),
+                        "sqlite": sqlite3.sqlite_version, "cpus": os.cpu_count()},
+        "requests": test.completed,
+        "wall_s": wall,
+        "throughput_rps": test.completed / wall if wall > 0 else 0.0,
+        "offered_qps": args.qps,
+        "latency_s": _summary(test.latency),
+        "service_s": _summary(test.service),
+        "stages_s": {k: _summary(h) for k, h in test.stages.items()},
+        "errors": dict(test.errors),
+        "error_rate": failed / test.completed if test.completed else 0.0,
+        "db": {
+            "lock_wait_s": hist.get("db.lock_wait"),
+            "statements_per_commit": (counters.get("db.statements_committed", 0) / counters["db.commits"]
+                                      if counters.get("db.commits") else 0.0),
+            "commits": counters.get("db.commits", 0),
+            "rollbacks": counters.get("db.rollbacks", 0),
+        },
+        "llm": {k: v for k, v in counters.items() if k.startswith("llm")},
+        "fake_server": server.stats if server is not None else None,
+    }
+    text = json.dumps(report, indent=2, default=float)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as fh:
+            fh.write(text + "\n")
+        lat = report["latency_s"]
+        print(f"{test.completed} requests in {wall:.1f}s → {report['throughput_rps']:.1f} req/s; "
+              f"p50={lat['p50'] * 1e3:.1f}ms p95={lat['p95'] * 1e3:.1f}ms p99={lat['p99'] * 1e3:.1f}ms; "
+              f"errors={report['errors']} → {args.report}")
+    else:
+        print(text)
+    return 0 if failed == 0 else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,183 @@
+# tools/reshard.py
+"""
+Move tickets (with their notes and actions) and logs into a new shard layout.
+
+    python -m tools.reshard --to 4                 # data/support.db → 4 ticket shards + a log file
+    python -m tools.reshard --to 1                 # back to a single file
+    python -m tools.reshard --to 8 --db /path/to/support.db
+
+Stop the app, service and workers first and keep a backup: the tool rewrites the
+files in place. New shard files are built next to the old ones (*.reshard) and
+only swapped in once every row is copied, so an interrupted run leaves the old
+layout intact. Afterwards start everything with SUPPORT_DB_SHARDS set to the new
+count. Customers and the ticket-ID allocator stay in the main file. Ticket,
+note and action row ids are renumbered into each shard's id range (core.shards);
+log ids are kept.
+"""
+from __future__ import annotations
+import argparse
+import os
+import sqlite3
+import time
+from typing import Dict, List, Optional
+
+from core import shards
+from core.db import DB_PATH, _configure_conn
+from core.migrations import migrate
+
+LOG_TABLES = ("app_logs", "log_archives")
+BATCH = 1000
+
+
+def _open(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, timeout=30)
+    _configure_conn(conn)
+    migrate(conn)
+    return conn
+
+
+def _remove(path: str) -> None:
+    for p in (path, path + "-wal", path + "-shm"):
+        if os.path.exists(p):
+            os.remove(p)
+
+
+def _copy_tickets(src: sqlite3.Connection, targets: List[sqlite3.Connection]) -> Dict[str, int]:
+    """Route every row of the sharded tables by ticket_id; ids are reassigned by the target."""
+    counts: Dict[str, int] = {}
+    for table in shards.SHARDED_TABLES:
+        cur = src.execute(f"SELECT * FROM {table} ORDER BY id")
+        columns = [d[0] for d in cur.description if d[0] != "id"]
+        sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+        pos = columns.index("ticket_id")
+        counts[table] = 0
+        while True:
+            rows = cur.fetchmany(BATCH)
+            if not rows:
+                break
+            groups: Dict[int, list] = {}
+            for row in rows:
+                values = row[1:]  # SELECT * starts with id
+                groups.setdefault(shards.shard_of(values[pos], len(targets)), []).append(values)
+            for index, group in groups.items():
+                targets[index].executemany(sql, group)
+            counts[table] += len(rows)
+    return counts
+
+
+def _copy_logs(src: sqlite3.Connection, dst: sqlite3.Connection) -> int:
+    moved = 0
+    for table in LOG_TABLES:
+        dst.execute(f"DELETE FROM {table}")  # leftovers of an interrupted run
+        cur = src.execute(f"SELECT * FROM {table} ORDER BY id")
+        columns = [d[0] for d in cur.description]
+        sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+        while True:
+            rows = cur.fetchmany(BATCH)
+            if not rows:
+                break
+            dst.executemany(sql, rows)
+            if table == "app_logs":
+                moved += len(rows)
+    return moved
+
+
+def reshard(db_path: str, to: int, log_path: Optional[str] = None) -> Dict[str, int]:
+    """Rewrite `db_path`'s files from their recorded layout to `to` shards. Returns rows moved per table."""
+    to = max(1, to)
+    main = _open(db_path)
+    old = int(shards.get_layout(main, "shards") or 1)
+    if old == to:
+        main.close()
+        return {}
+    old_paths, new_paths = shards.shard_paths(db_path, old), shards.shard_paths(db_path, to)
+    old_log, new_log = log_path or shards.log_path(db_path, old), log_path or shards.log_path(db_path, to)
+
+    # 1) Build the new shards beside the old files (to == 1 writes into main, in one transaction)
+    if to == 1:
+        targets = [main]
+        main.execute("BEGIN IMMEDIATE")
+    else:
+        targets = []
+        for i, path in enumerate(new_paths):
+            _remove(path + ".reshard")
+            conn = _open(path + ".reshard")
+            shards.init_shard(conn, i, to)
+            conn.execute("BEGIN")
+            targets.append(conn)
+    counts: Dict[str, int] = {}
+    for path in old_paths:
+        if path == db_path and to == 1:
+            continue
+        src = main if path == db_path else _open(path)
+        for table, n in _copy_tickets(src, targets).items():
+            counts[table] = counts.get(table, 0) + n
+        if src is not main:
+            src.close()
+    if to > 1:
+        for conn in targets:
+            conn.commit()
+            conn.close()
+
+    # 2) Logs, unless they already live where the new layout wants them
+    if old_log != new_log:
+        src = main if old_log == db_path else _open(old_log)
+        dst = main if new_log == db_path else _open(new_log)
+        if dst is not main:
+            dst.execute("BEGIN")
+        counts["app_logs"] = _copy_logs(src, dst)
+        if dst is not main:
+            dst.commit()
+            dst.close()
+        if src is main:
+            if not main.in_transaction:
+                main.execute("BEGIN IMMEDIATE")
+            for table in LOG_TABLES:
+                main.execute(f"DELETE FROM {table}")
+        else:
+            src.close()
+
+    # 3) Swap the new shard files in, then record the layout and drop what moved out of main
+    if to > 1:
+        for path in new_paths:
+            if path in old_paths:
+                _remove(path)
+            os.replace(path + ".reshard", path)
+    if not main.in_transaction:
+        main.execute("BEGIN IMMEDIATE")
+    if old == 1:
+        for table in shards.SHARDED_TABLES:
+            main.execute(f"DELETE FROM {table}")
+    shards.set_layout(main, role="main", shards=to)
+    main.commit()
+    main.close()
+    for path in old_paths:
+        if path != db_path and path not in new_paths:
+            _remove(path)
+    if old_log != new_log and old_log != db_path:
+        _remove(old_log)
+    return counts
+
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--to", type=int, required=True, help="new shard count (1 = single file)")
+    parser.add_argument("--db", default=DB_PATH, help="main database file (default SUPPORT_DB_PATH)")
+    parser.add_argument("--log-path", default=os.getenv("SUPPORT_DB_LOG_PATH") or None,
+                        help="log file, when SUPPORT_DB_LOG_PATH pins it (logs are then left in place)")
+    args = parser.parse_args(argv)
+    if not os.path.exists(args.db):
+        print(f"{args.db} does not exist")
+        return 1
+    start = time.perf_counter()
+    counts = reshard(args.db, args.to, args.log_path)
+    if not counts:
+        print(f"{args.db} already has {max(1, args.to)} shard(s)")
+        return 0
+    print(f"resharded {args.db} to {max(1, args.to)} shard(s) in {time.perf_counter() - start:.1f}s: {counts}")
+    print(f"start the app with SUPPORT_DB_SHARDS={max(1, args.to)}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,59 @@
+# tools/search_index.py
+"""
+Maintain and query the FTS5 ticket search index.
+
+    python -m tools.search_index rebuild             # (re)create tables/triggers, re-index all rows
+    python -m tools.search_index check               # integrity-check against the base tables
+    python -m tools.search_index query "wire transfer" --status Open --limit 10
+
+Uses SUPPORT_DB_PATH like the app. Rebuild holds the write lock while it runs.
+"""
+from __future__ import annotations
+import argparse
+import json
+import time
+from typing import Optional
+
+from core import db
+
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    rebuild = sub.add_parser("rebuild", help="re-index every ticket description and note")
+    rebuild.add_argument("--no-optimize", action="store_true", help="skip merging index segments afterwards")
+    sub.add_parser("check", help="verify the index matches the base tables")
+    query = sub.add_parser("query", help="run a search and print JSON lines")
+    query.add_argument("text")
+    query.add_argument("--status", action="append", default=None)
+    query.add_argument("--limit", type=int, default=20)
+    query.add_argument("--offset", type=int, default=0)
+    query.add_argument("--no-notes", action="store_true", help="search descriptions only")
+    query.add_argument("--exact", action="store_true", help="no prefix matching")
+    args = parser.parse_args(argv)
+
+    conn = db.get_conn()
+    if args.command == "rebuild":
+        start = time.perf_counter()
+        counts = db.rebuild_search_index(conn, optimize=not args.no_optimize)
+        print(f"indexed {counts} in {time.perf_counter() - start:.1f}s")
+        return 0
+    if args.command == "check":
+        if not db.has_search_index(conn):
+            print("no search index (run `rebuild`)")
+            return 1
+        problems = {k: v for k, v in db.check_search_index(conn).items() if v}
+        print(json.dumps(problems) if problems else "ok")
+        return 1 if problems else 0
+    rows, next_offset = db.search_tickets(conn, args.text, limit=args.limit, offset=args.offset,
+                                          status=args.status, notes=not args.no_notes, prefix=not args.exact,
+                                          highlight=("[", "]"))
+    for r in rows:
+        print(json.dumps({k: r[k] for k in ("ticket_id", "status", "score", "matched", "snippet")}, ensure_ascii=False))
+    if next_offset is not None:
+        print(f"# more: --offset {next_offset}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
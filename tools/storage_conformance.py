@@ -0,0 +1,354 @@
+# tools/storage_conformance.py
+"""
+Check that the storage engines in core.storage behave the same.
+
+Every check runs against a fresh instance of each selected engine. The SQLite
+engine gets a temporary database file, so nothing in data/ is touched.
+
+    python -m tools.storage_conformance                 # both engines
+    python -m tools.storage_conformance --engine memory
+
+The exit status is 1 if any check fails. Run it after changing core.db or MemoryStorage.
+"""
+from __future__ import annotations
+import argparse
+import os
+import tempfile
+import threading
+import time
+import traceback
+from typing import Callable, Dict, List, Optional, Tuple
+
+from core.storage import IntegrityError, MemoryStorage, SQLiteStorage, Storage
+
+Check = Callable[[Storage], None]
+CHECKS: List[Tuple[str, Check]] = []
+
+
+def check(fn: Check) -> Check:
+    CHECKS.append((fn.__name__, fn))
+    return fn
+
+
+def _expect(cond: bool, message: str) -> None:
+    if not cond:
+        raise AssertionError(message)
+
+
+def _sharded(s: Storage) -> bool:
+    """Sharded SQLite commits customer and log rows outside the unit of work (core.db.transaction)."""
+    from core import db
+    return isinstance(s, SQLiteStorage) and db.SHARDS > 1
+
+
+def _next_second() -> None:
+    """created_at has one-second resolution on both engines; newest-first checks need distinct stamps."""
+    time.sleep(1.1 - (time.time() % 1.0))
+
+
+# ---------- Tickets ----------
+
+@check
+def unique_ticket_id(s: Storage) -> None:
+    s.insert_ticket(ticket_id="100001", customer_name="Alex Chen", description="card lost")
+    try:
+        s.insert_ticket(ticket_id="100001", customer_name="Sam Roe", description="dup")
+    except IntegrityError:
+        pass
+    else:
+        raise AssertionError("duplicate ticket_id was accepted")
+    _expect(s.get_ticket("100001")["customer_name"] == "Alex Chen", "duplicate overwrote the first ticket")
+
+
+@check
+def get_ticket_fields(s: Storage) -> None:
+    _expect(s.get_ticket("nope") is None, "unknown ticket should be None")
+    s.insert_ticket(ticket_id="100002", customer_name="Alex Chen", description="pin reset")
+    rec = s.get_ticket("100002")
+    for key in ("id", "ticket_id", "customer_name", "description", "status", "created_at", "updated_at", "customer_id"):
+        _expect(key in rec, f"ticket row lacks {key}")
+    _expect(rec["status"] == "Open" and rec["updated_at"] is None, f"fresh ticket: {rec}")
+    _expect(rec["customer_id"] is not None, "named ticket should be linked to a customer")
+    rec["status"] = "mutated"
+    _expect(s.get_ticket("100002")["status"] == "Open", "callers must get a copy")
+
+
+@check
+def status_update(s: Storage) -> None:
+    s.insert_ticket(ticket_id="100003", customer_name="Alex Chen", description="x")
+    s.update_ticket_status(ticket_id="100003", status="In-Progress")
+    rec = s.get_ticket("100003")
+    _expect(rec["status"] == "In-Progress" and rec["updated_at"] is not None, f"after update: {rec}")
+    s.update_ticket_status(ticket_id="missing", status="Closed")  # no-op, no error
+
+
+@check
+def newest_open_ticket(s: Storage) -> None:
+    _expect(s.find_open_ticket_by_customer("Nobody") is None, "unknown customer has no ticket")
+    s.insert_ticket(ticket_id="200001", customer_name="Alex Chen", description="first")
+    _next_second()
+    s.insert_ticket(ticket_id="200002", customer_name="alex  chen ", description="second")
+    _expect(s.find_open_ticket_by_customer("ALEX CHEN") == ("200002", "Open"), "newest open ticket, any spelling")
+    s.update_ticket_status(ticket_id="200002", status="Resolved")
+    _expect(s.find_open_ticket_by_customer("Alex Chen") == ("200001", "Open"), "resolved tickets are skipped")
+    s.update_ticket_status(ticket_id="200001", status="In-Progress")
+    _expect(s.find_open_ticket_by_customer("Alex Chen") == ("200001", "In-Progress"), "In-Progress counts as open")
+    s.update_ticket_status(ticket_id="200001", status="Closed")
+    _expect(s.find_open_ticket_by_customer("Alex Chen") is None, "no open tickets left")
+
+
+@check
+def placeholder_names(s: Storage) -> None:
+    s.insert_ticket(ticket_id="300001", customer_name="Unknown", description="x")
+    s.insert_ticket(ticket_id="300002", customer_name="Customer", description="y")
+    _expect(s.get_ticket("300001")["customer_id"] is None, "placeholder names link to no customer")
+    _expect(s.find_open_ticket_by_customer("Unknown") is None, "placeholder names match nobody")
+    _expect(s.resolve_customer(name="customer") is None, "placeholder names are never created")
+
+
+@check
+def customers_by_phone(s: Storage) -> None:
+    cid = s.resolve_customer(name="Alex Chen")
+    _expect(s.resolve_customer(name="alex chen", phone="(555) 123-4567") == cid, "name match gains the phone")
+    _expect(s.find_customer(phone="555.123.4567")["id"] == cid, "phone lookup ignores punctuation")
+    _expect(s.find_customer(name="Someone Else", phone="5551234567")["id"] == cid, "phone wins over name")
+    _expect(s.find_customer(phone="123") is None, "short numbers are not phones")
+    other = s.resolve_customer(name="Sam Roe", phone="5559876543")
+    _expect(other != cid, "new customer")
+    s.insert_ticket(ticket_id="400001", customer_name="S. Roe", description="x", phone="555-987-6543")
+    _expect(s.find_open_ticket_by_customer("whoever", phone="5559876543") == ("400001", "Open"), "lookup by phone")
+    _expect(s.find_open_ticket_by_customer("Alex Chen", customer_id=other) == ("400001", "Open"), "explicit id wins")
+
+
+@check
+def notes_and_actions(s: Storage) -> None:
+    s.insert_ticket(ticket_id="500001", customer_name="Alex Chen", description="x")
+    s.append_ticket_note(ticket_id="500001", note="first", author="Alex")
+    s.append_ticket_note(ticket_id="500001", note="second")
+    s.add_ticket_action_flag(ticket_id="500001", action="freeze_card_now")
+    notes = s.get_ticket_notes("500001")
+    _expect([(n["note"], n["author"]) for n in notes] == [("first", "Alex"), ("second", "customer")], f"notes: {notes}")
+    _expect([a["action"] for a in s.get_ticket_actions("500001")] == ["freeze_card_now"], "actions")
+    _expect(s.get_ticket_notes("nope") == [] and s.get_ticket_actions("nope") == [], "no rows for unknown tickets")
+
+
+# ---------- Transactions ----------
+
+@check
+def transaction_commit(s: Storage) -> None:
+    with s.transaction():
+        s.insert_ticket(ticket_id="600001", customer_name="Alex Chen", description="x")
+        s.append_ticket_note(ticket_id="600001", note="n")
+        s.update_ticket_status(ticket_id="600001", status="In-Progress")
+        _expect(s.get_ticket("600001")["status"] == "In-Progress", "writes are visible inside the block")
+    _expect(s.get_ticket("600001") is not None and len(s.get_ticket_notes("600001")) == 1, "committed")
+
+
+@check
+def transaction_rollback(s: Storage) -> None:
+    s.insert_ticket(ticket_id="600002", customer_name="Alex Chen", description="x")
+    try:
+        with s.transaction():
+            s.insert_ticket(ticket_id="600003", customer_name="Pat Doe", description="y")
+            s.append_ticket_note(ticket_id="600002", note="n")
+            s.add_ticket_action_flag(ticket_id="600002", action="a")
+            s.update_ticket_status(ticket_id="600002", status="Closed")
+            s.log_event(level="INFO", agent="Check", event="inside")
+            raise RuntimeError("boom")
+    except RuntimeError:
+        pass
+    _expect(s.get_ticket("600003") is None, "inserted ticket rolled back")
+    rec = s.get_ticket("600002")
+    _expect(rec["status"] == "Open" and rec["updated_at"] is None, f"status rolled back: {rec}")
+    _expect(s.get_ticket_notes("600002") == [] and s.get_ticket_actions("600002") == [], "notes/actions rolled back")
+    _expect(s.find_open_ticket_by_customer("Alex Chen") == ("600002", "Open"), "open index rolled back")
+    if not _sharded(s):
+        _expect(s.find_customer(name="Pat Doe") is None, "new customer rolled back")
+        _expect(not any(r["event"] == "inside" for r in s.list_logs(50)), "log row rolled back")
+
+
+@check
+def nested_savepoint(s: Storage) -> None:
+    with s.transaction():
+        s.insert_ticket(ticket_id="600004", customer_name="Alex Chen", description="outer")
+        try:
+            with s.transaction():
+                s.append_ticket_note(ticket_id="600004", note="inner")
+                raise ValueError("inner fails")
+        except ValueError:
+            pass
+        s.add_ticket_action_flag(ticket_id="600004", action="after")
+    _expect(s.get_ticket("600004") is not None, "outer write kept")
+    _expect(s.get_ticket_notes("600004") == [], "inner write undone")
+    _expect([a["action"] for a in s.get_ticket_actions("600004")] == ["after"], "later write kept")
+
+
+@check
+def transaction_isolation(s: Storage) -> None:
+    """A block's writes are not visible to other threads before it ends."""
+    seen: Dict[str, Optional[dict]] = {}
+    started = threading.Event()
+
+    def reader() -> None:
+        started.set()
+        seen["rec"] = s.get_ticket("600005")
+
+    with s.transaction():
+        s.insert_ticket(ticket_id="600005", customer_name="Alex Chen", description="x")
+        t = threading.Thread(target=reader)
+        t.start()
+        started.wait()
+        time.sleep(0.2)
+        s.update_ticket_status(ticket_id="600005", status="In-Progress")
+    t.join(10)
+    rec = seen.get("rec")
+    _expect(rec is None or rec["status"] == "In-Progress", f"reader saw a half-done block: {rec}")
+
+
+# ---------- Reads, paging & logs ----------
+
+@check
+def paging(s: Storage) -> None:
+    ids = [f"7000{i:02d}" for i in range(7)]
+    for i, tid in enumerate(ids):
+        s.insert_ticket(ticket_id=tid, customer_name=f"Page {i % 2}", description="x",
+                        status="Resolved" if i == 3 else "Open")
+    # newest first by (created_at, id); sharded ids don't follow insertion order within a second
+    recs = sorted((s.get_ticket(tid) for tid in ids), key=lambda r: (r["created_at"], r["id"]), reverse=True)
+    newest = [r["ticket_id"] for r in recs]
+    _expect([r["ticket_id"] for r in s.list_tickets(3)] == newest[:3], "list_tickets is newest first")
+    seen, cursor = [], None
+    while True:
+        rows, cursor = s.page_tickets(cursor=cursor, limit=3)
+        seen += [r["ticket_id"] for r in rows]
+        if cursor is None:
+            break
+    _expect(seen == newest, f"pages cover every ticket once, newest first: {seen}")
+    rows, _ = s.page_tickets(limit=10, status=["Open"], customer_name="Page 1")
+    _expect([r["ticket_id"] for r in rows] == [t for t in newest if t in (ids[1], ids[5])], f"filters: {rows}")
+    stamp = s.get_ticket(ids[0])["created_at"]
+    _expect(len(s.page_tickets(limit=10, since=stamp)[0]) == 7, "since is inclusive")
+    _expect(s.page_tickets(limit=10, until=stamp)[0] == [], "until is exclusive")
+
+
+@check
+def delta_fetch(s: Storage) -> None:
+    s.insert_ticket(ticket_id="800001", customer_name="Alex Chen", description="x")
+    s.insert_ticket(ticket_id="800002", customer_name="Sam Roe", description="y")
+    first = s.get_ticket("800001")
+    rows = s.tickets_since(last_id=first["id"])
+    _expect([r["ticket_id"] for r in rows] == ["800002"], f"rows after last_id: {rows}")
+    s.update_ticket_status(ticket_id="800001", status="In-Progress")
+    stamp = s.get_ticket("800001")["updated_at"]
+    rows = s.tickets_since(last_id=s.get_ticket("800002")["id"], updated_since=stamp)
+    _expect([r["ticket_id"] for r in rows] == ["800001"], f"updated rows come back: {rows}")
+    _expect(s.tickets_since(last_id=0, status="Closed") == [], "status filter")
+
+
+@check
+def row_id_marks(s: Storage) -> None:
+    _expect(max(s.max_row_ids("tickets").values(), default=0) == 0, "empty engine: no ticket ids")
+    s.insert_ticket(ticket_id="810001", customer_name="Alex Chen", description="x")
+    rid = s.get_ticket("810001")["id"]
+    _expect(max(s.max_row_ids("tickets").values()) == rid, "high-water mark is the newest row id")
+    _expect(s.tickets_since(last_id=s.max_row_ids("tickets")) == [], "nothing after the high-water mark")
+
+
+@check
+def search(s: Storage) -> None:
+    s.insert_ticket(ticket_id="820001", customer_name="Alex Chen", description="Wire transfer stuck")
+    s.insert_ticket(ticket_id="820002", customer_name="Sam Roe", description="card declined abroad")
+    s.append_ticket_note(ticket_id="820002", note="customer says the wire never arrived")
+    rows, more = s.search_tickets("wire", limit=10)
+    _expect(sorted(r["ticket_id"] for r in rows) == ["820001", "820002"] and more is None, f"description + notes: {rows}")
+    for r in rows:
+        _expect(r["matched"] in ("description", "note") and "wire" in r["snippet"].lower(), f"snippet: {r}")
+    rows, _ = s.search_tickets("wire", limit=10, notes=False)
+    _expect([r["ticket_id"] for r in rows] == ["820001"], f"notes=False: {rows}")
+    rows, _ = s.search_tickets("card abroad", limit=10)
+    _expect([r["ticket_id"] for r in rows] == ["820002"], f"every word must match: {rows}")
+    first, next_offset = s.search_tickets("wire", limit=1)
+    _expect(len(first) == 1 and next_offset == 1, f"paged: {first} {next_offset}")
+    rest, _ = s.search_tickets("wire", limit=1, offset=next_offset)
+    _expect({first[0]["ticket_id"], rest[0]["ticket_id"]} == {"820001", "820002"}, "offset continues")
+    _expect(s.search_tickets("wire", limit=10, status="Closed")[0] == [], "status filter")
+    _expect(s.search_tickets("  ", limit=10) == ([], None), "blank query")
+
+
+@check
+def data_version(s: Storage) -> None:
+    before = s.data_version()
+    _expect(s.data_version() == before, "reads leave the version alone")
+    s.insert_ticket(ticket_id="830001", customer_name="Alex Chen", description="x")
+    after_insert = s.data_version()
+    _expect(after_insert > before, "an insert moves the version")
+    s.update_ticket_status(ticket_id="830001", status="Closed")
+    _expect(s.data_version() > after_insert, "a status change moves the version")
+
+
+@check
+def logs(s: Storage) -> None:
+    s.log_event(level="INFO", agent="A", event="one", details={"k": 1}, trace_id="t-1")
+    s.log_event(level="WARN", agent="B", event="two")
+    if hasattr(s, "conn"):
+        from core import db
+        db.flush_logs(5.0)
+    recent = s.list_logs(2)
+    _expect([r["event"] for r in recent] == ["two", "one"], f"newest first: {recent}")
+    _expect(recent[1]["details"] == '{"k": 1}' and recent[1]["trace_id"] == "t-1", "details as JSON, trace id kept")
+    rows, _ = s.page_logs(limit=10, level="WARN")
+    _expect([r["event"] for r in rows] == ["two"], "page_logs filters")
+    rows, _ = s.page_logs(limit=10, trace_id="t-1")
+    _expect([r["event"] for r in rows] == ["one"], "trace filter")
+    after = s.logs_since(last_id=recent[1]["id"], agent=["B"])
+    _expect([r["event"] for r in after] == ["two"], "logs_since")
+
+
+@check
+def ticket_ids(s: Storage) -> None:
+    s.reserve_ticket_ids(3)
+    ids = {s.next_ticket_id() for _ in range(50)}
+    _expect(len(ids) == 50, "ticket ids are unique")
+    _expect(all(len(i) >= 6 and i.isdigit() for i in ids), f"zero-padded digits: {sorted(ids)[:3]}")
+
+
+# ---------- Runner ----------
+
+def _sqlite() -> Storage:
+    from core import db
+    db.close_all()
+    db.DB_PATH = os.path.join(tempfile.mkdtemp(prefix="conformance-"), "support.db")
+    db.init_db()
+    return SQLiteStorage()
+
+
+ENGINES: Dict[str, Callable[[], Storage]] = {"sqlite": _sqlite, "memory": MemoryStorage}
+
+
+def run(engines: List[str], only: Optional[str] = None) -> int:
+    failures = 0
+    for name, fn in CHECKS:
+        if only and only not in name:
+            continue
+        for engine in engines:
+            try:
+                fn(ENGINES[engine]())
+                print(f"ok    {engine:<7} {name}")
+            except Exception:
+                failures += 1
+                print(f"FAIL  {engine:<7} {name}\n{traceback.format_exc()}")
+    return failures
+
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--engine", choices=("all", *ENGINES), default="all")
+    parser.add_argument("-k", dest="only", default=None, help="run checks whose name contains this")
+    args = parser.parse_args(argv)
+    failures = run(list(ENGINES) if args.engine == "all" else [args.engine], args.only)
+    print(f"{failures} failure(s)" if failures else "all checks passed")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())